@@ -0,0 +1,18 @@
+-- Per region stats for regional criteria when the audit
+-- fans out one SQS message per (audit_criterion, region)
+CREATE TABLE IF NOT EXISTS public.audit_criterion_region (
+    id SERIAL NOT NULL PRIMARY KEY,
+    audit_criterion_id integer NOT NULL REFERENCES public.audit_criterion(id),
+    region character varying(255) NOT NULL,
+    regions integer NOT NULL DEFAULT 0,
+    resources integer NOT NULL DEFAULT 0,
+    tested integer NOT NULL DEFAULT 0,
+    passed integer NOT NULL DEFAULT 0,
+    failed integer NOT NULL DEFAULT 0,
+    ignored integer NOT NULL DEFAULT 0,
+    processed boolean NOT NULL DEFAULT FALSE,
+    attempted boolean NOT NULL DEFAULT FALSE,
+    check_passed boolean NOT NULL DEFAULT FALSE,
+    CONSTRAINT audit_criterion_region_audit_criterion_id_and_region UNIQUE (audit_criterion_id, region)
+);
+
@@ -0,0 +1,12 @@
+-- API responses cached per account audit so that criteria
+-- making the same API calls in the same audit share the data
+CREATE TABLE IF NOT EXISTS public.cached_data_response (
+    id SERIAL NOT NULL PRIMARY KEY,
+    criterion_id integer NOT NULL REFERENCES public.criterion(id),
+    account_audit_id integer NOT NULL REFERENCES public.account_audit(id),
+    invoke_class_name character varying(255) NOT NULL,
+    invoke_class_get_data_method character varying(255) NOT NULL,
+    cache_key character varying(64),
+    response text NOT NULL,
+    CONSTRAINT cached_data_response_account_audit_id_and_cache_key UNIQUE (account_audit_id, cache_key)
+);
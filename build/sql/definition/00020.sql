@@ -0,0 +1,32 @@
+-- Count evaluated criteria against the audit with an atomic
+-- UPDATE ... RETURNING rather than re-aggregating audit_criterion
+ALTER TABLE public.account_audit
+ADD COLUMN criteria_attempted INTEGER DEFAULT 0;
+
+ALTER TABLE public.audit_criterion
+ADD COLUMN aggregated BOOLEAN DEFAULT FALSE;
+
+-- Bring audits which are still running up to date
+UPDATE public.audit_criterion
+SET aggregated = audit_criterion.attempted
+FROM public.account_audit
+WHERE account_audit.id = audit_criterion.account_audit_id
+AND NOT account_audit.finished;
+
+UPDATE public.account_audit
+SET criteria_attempted = (
+    SELECT COUNT(*)
+    FROM public.audit_criterion
+    WHERE audit_criterion.account_audit_id = account_audit.id
+    AND audit_criterion.attempted
+)
+WHERE NOT finished;
+
+-- Keep only the latest record per account so that it can be upserted
+DELETE FROM public.account_latest_audit AS duplicate
+USING public.account_latest_audit AS latest
+WHERE duplicate.account_subscription_id = latest.account_subscription_id
+AND duplicate.id < latest.id;
+
+ALTER TABLE public.account_latest_audit
+ADD CONSTRAINT account_latest_audit_account_subscription_id UNIQUE (account_subscription_id);
@@ -0,0 +1,17 @@
+-- Resources which are unchanged since the previous audit reuse its
+-- compliance result and reference the row holding the resource_data
+-- rather than storing it again
+ALTER TABLE public.audit_resource
+ADD COLUMN resource_hash VARCHAR(64);
+
+ALTER TABLE public.audit_resource
+ADD COLUMN reference_audit_resource_id INTEGER REFERENCES public.audit_resource(id);
+
+ALTER TABLE public.audit_resource
+ALTER COLUMN resource_data DROP NOT NULL;
+
+-- Find the previous audit's results for a criterion
+CREATE INDEX IF NOT EXISTS audit_resource_account_audit_criterion ON public.audit_resource (account_audit_id, criterion_id);
+
+-- Find the references to a row before it is deleted
+CREATE INDEX IF NOT EXISTS audit_resource_reference_audit_resource_id ON public.audit_resource (reference_audit_resource_id);
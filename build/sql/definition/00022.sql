@@ -0,0 +1,15 @@
+-- The API response for each resource is stored compressed out of row
+-- and deduplicated by content hash. Existing audit_resource.resource_data
+-- is moved across in batches by invoking the manual_migrate_resource_data
+-- admin lambda until it reports that it has completed.
+CREATE TABLE IF NOT EXISTS public.resource_data (
+    id SERIAL PRIMARY KEY,
+    content_hash VARCHAR(64) NOT NULL UNIQUE,
+    data BYTEA NOT NULL
+);
+
+ALTER TABLE public.audit_resource
+ADD COLUMN resource_data_id INTEGER REFERENCES public.resource_data(id);
+
+-- Find whether resource_data is still used when audits are deleted
+CREATE INDEX IF NOT EXISTS audit_resource_resource_data_id ON public.audit_resource (resource_data_id);
@@ -0,0 +1,16 @@
+-- The AWS API calls made evaluating each criterion
+-- per (region, service, operation) so that expensive checks can be found
+CREATE TABLE IF NOT EXISTS public.audit_criterion_api_usage (
+    id SERIAL NOT NULL PRIMARY KEY,
+    audit_criterion_id integer NOT NULL REFERENCES public.audit_criterion(id),
+    region character varying(255),
+    service character varying(255) NOT NULL,
+    operation character varying(255) NOT NULL,
+    calls integer NOT NULL DEFAULT 0,
+    retries integer NOT NULL DEFAULT 0,
+    throttles integer NOT NULL DEFAULT 0,
+    bytes bigint NOT NULL DEFAULT 0,
+    duration_ms integer NOT NULL DEFAULT 0
+);
+
+CREATE INDEX IF NOT EXISTS audit_criterion_api_usage_audit_criterion_id ON public.audit_criterion_api_usage (audit_criterion_id);
@@ -0,0 +1,17 @@
+-- Spans recording the time an audit spends in each SQS stage
+-- see chalicelib/tracing.py
+CREATE TABLE IF NOT EXISTS public.audit_trace_span (
+    id SERIAL NOT NULL PRIMARY KEY,
+    trace_id character varying(32) NOT NULL,
+    span_id character varying(16) NOT NULL,
+    parent_span_id character varying(16),
+    account_audit_id integer NOT NULL REFERENCES public.account_audit(id),
+    audit_criterion_id integer REFERENCES public.audit_criterion(id),
+    stage character varying(255) NOT NULL,
+    name character varying(255) NOT NULL,
+    region character varying(255),
+    date_started timestamp without time zone NOT NULL,
+    duration_ms integer NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS audit_trace_span_account_audit_id ON public.audit_trace_span (account_audit_id);
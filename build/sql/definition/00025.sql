@@ -0,0 +1,7 @@
+-- Progress saved when a criterion evaluation runs out of lambda time
+-- so that the continuation message resumes where it stopped
+ALTER TABLE public.audit_criterion
+ADD COLUMN checkpoint TEXT;
+
+ALTER TABLE public.audit_criterion_region
+ADD COLUMN checkpoint TEXT;
@@ -0,0 +1,11 @@
+-- Idempotency ledger for SQS messages
+-- Rows older than the 14 day maximum SQS retention are deleted by delete_expired_audits
+CREATE TABLE IF NOT EXISTS public.processed_message (
+    id SERIAL NOT NULL PRIMARY KEY,
+    message_id character varying(255) NOT NULL,
+    work_unit character varying(255) NOT NULL,
+    date_processed timestamp without time zone NOT NULL DEFAULT now(),
+    CONSTRAINT processed_message_message_id_and_work_unit UNIQUE (message_id, work_unit)
+);
+
+CREATE INDEX IF NOT EXISTS processed_message_date_processed ON public.processed_message (date_processed);
@@ -0,0 +1,7 @@
+-- Assume role credential cache lookups counted against sts AssumeRole
+-- Each hit is an STS call saved
+ALTER TABLE public.audit_criterion_api_usage
+ADD COLUMN cache_hits integer NOT NULL DEFAULT 0;
+
+ALTER TABLE public.audit_criterion_api_usage
+ADD COLUMN cache_misses integer NOT NULL DEFAULT 0;
@@ -0,0 +1,4 @@
+-- Time AWS calls were held back by the API governor's token buckets
+-- and throttling backoff
+ALTER TABLE public.audit_criterion_api_usage
+ADD COLUMN wait_ms integer NOT NULL DEFAULT 0;
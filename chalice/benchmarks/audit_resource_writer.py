@@ -0,0 +1,85 @@
+"""
+Benchmark audit_resource / resource_compliance persistence
+
+Compares the original per-resource autocommitted
+AuditResource.create + ResourceCompliance.create calls
+with the AuditResourceWriter bulk writer.
+
+Run from the chalice directory:
+    python -m benchmarks.audit_resource_writer [--rows 5000]
+
+The benchmark runs against a temporary sqlite file so that each commit
+pays a real sync cost. Sqlite has no RETURNING clause in this peewee
+version so the bulk path only gains from the single transaction; on
+postgres the multi-row INSERT also removes the per-row round trips.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+os.environ.setdefault("CSW_CRITERIA_UNIT_TESTING", "1")
+
+import peewee  # noqa: E402
+
+from chalicelib import models  # noqa: E402
+from chalicelib.database_handle import AuditResourceWriter  # noqa: E402
+from fixtures.sqlite_schema import (  # noqa: E402
+    attach_public_schema,
+    build_resource_pair,
+    create_audit_resource_tables,
+)
+
+
+def per_row(rows):
+    for index in range(rows):
+        item, compliance = build_resource_pair(index)
+        del item["resource_compliance"]
+        audit_resource = models.AuditResource.create(**item)
+        compliance["audit_resource_id"] = audit_resource
+        models.ResourceCompliance.create(**compliance)
+
+
+def bulk(rows, batch_size):
+    writer = AuditResourceWriter()
+    for index in range(rows):
+        writer.add(*build_resource_pair(index))
+        if (index + 1) % batch_size == 0:
+            writer.flush()
+    writer.flush()
+
+
+def timed(label, func, rows, *args):
+    start = time.perf_counter()
+    func(rows, *args)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<40} {rows:>7} rows {elapsed:8.3f}s {rows / elapsed:10.0f} rows/s")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    bound = [models.AuditResource, models.ResourceData, models.ResourceCompliance]
+    path = os.path.join(tempfile.mkdtemp(), "benchmark.db")
+    db = peewee.SqliteDatabase(path)
+
+    with db.bind_ctx(bound):
+        attach_public_schema(db, f"{path}.public")
+        create_audit_resource_tables(db)
+
+        before = timed("per row create (autocommit)", per_row, args.rows)
+        after = timed(
+            f"AuditResourceWriter (batch {args.batch_size})",
+            bulk,
+            args.rows,
+            args.batch_size,
+        )
+        print(f"speed up: {before / after:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Benchmark boto3 client acquisition
+
+Compares creating a boto3 client for every call, as the per-item loops
+over S3 buckets, KMS keys and load balancers used to, with getting the
+client from the GdsAwsClient client pool.
+
+Run from the chalice directory:
+    python -m benchmarks.client_pool [--calls 200]
+
+No AWS calls are made; only client construction is timed.
+"""
+import argparse
+import time
+from datetime import datetime, timedelta, timezone
+
+import boto3
+
+from chalicelib.aws.gds_aws_client import GdsAwsClient
+
+SERVICES = ["s3", "kms", "elb", "ec2"]
+
+
+def get_session():
+    return {
+        "AccessKeyId": "AKIABENCHMARK",
+        "SecretAccessKey": "secret",
+        "SessionToken": "token",
+        "Expiration": datetime.now(timezone.utc) + timedelta(hours=1),
+    }
+
+
+def unpooled(calls, session):
+    for index in range(calls):
+        boto3.client(
+            SERVICES[index % len(SERVICES)],
+            aws_access_key_id=session["AccessKeyId"],
+            aws_secret_access_key=session["SecretAccessKey"],
+            aws_session_token=session["SessionToken"],
+            region_name="eu-west-2",
+        )
+
+
+def pooled(calls, session):
+    client = GdsAwsClient()
+    for index in range(calls):
+        client.get_boto3_session_client(
+            SERVICES[index % len(SERVICES)], session, "eu-west-2"
+        )
+
+
+def timed(label, func, calls, *args):
+    start = time.perf_counter()
+    func(calls, *args)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<40} {calls:>7} calls {elapsed:8.3f}s {elapsed / calls * 1000:8.2f}ms/call")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=200)
+    args = parser.parse_args()
+
+    session = get_session()
+    before = timed("boto3.client per call", unpooled, args.calls, session)
+    after = timed("GdsAwsClient client pool", pooled, args.calls, session)
+    print(f"speed up: {before / after:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
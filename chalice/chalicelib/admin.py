@@ -165,6 +165,25 @@ def database_list_models(event, context):
     return list(tables)
 
 
+@app.lambda_function()
+def audit_trace_report(event, context):
+    """
+    Break down the duration of an audit by stage
+    Requires CSW_AUDIT_TRACING when the audit ran
+    event: {"AuditId": 1}
+    """
+    try:
+        dbh = DatabaseHandle(app)
+        db = dbh.get_handle()
+        db.connect()
+        report = models.AuditTraceSpan.get_stage_durations(event["AuditId"])
+        db.close()
+    except Exception as err:
+        app.log.error(str(err))
+        report = None
+    return report
+
+
 def criteria_finder(parent_module_name="chalicelib.criteria"):
     """
     A helper function returning a set with all classes in the chalicelib.criteria submodules
@@ -263,6 +282,14 @@ def delete_expired_audits():
             ORDER BY id
             LIMIT {remove_count} OFFSET 0;
             """
+        # SQS keeps messages for at most 14 days
+        delete_processed_messages = """
+            DELETE
+            FROM public.processed_message
+            WHERE date_processed < CURRENT_TIMESTAMP - INTERVAL '14 days';
+            """
+        dbh.execute_commands([delete_processed_messages], "csw")
+
         audit_cursor = db.execute_sql(select_expired_audit_ids)
         delete_statements = []
         for audit_row in audit_cursor.fetchall():
@@ -279,13 +306,95 @@ def delete_expired_audits():
                 """
             delete_statements.append(delete_compliance)
 
+            # unchanged resources in later audits reference the rows
+            # holding their resource_data so before deleting them
+            # point the references at the first reference instead
+            repoint_references = f"""
+                UPDATE public.audit_resource AS reference
+                SET reference_audit_resource_id = first_reference.id
+                FROM (
+                    SELECT original.id AS original_id, MIN(referencing.id) AS id
+                    FROM public.audit_resource AS original
+                    JOIN public.audit_resource AS referencing
+                    ON referencing.reference_audit_resource_id = original.id
+                    WHERE original.account_audit_id = {account_audit_id}
+                    GROUP BY original.id
+                ) AS first_reference
+                WHERE reference.reference_audit_resource_id = first_reference.original_id
+                AND reference.id <> first_reference.id;
+                """
+            delete_statements.append(repoint_references)
+
+            # and move the resource_data to the first reference
+            move_resource_data = f"""
+                UPDATE public.audit_resource AS reference
+                SET resource_data = original.resource_data,
+                    resource_data_id = original.resource_data_id,
+                    reference_audit_resource_id = NULL
+                FROM public.audit_resource AS original
+                WHERE reference.reference_audit_resource_id = original.id
+                AND original.account_audit_id = {account_audit_id};
+                """
+            delete_statements.append(move_resource_data)
+
+            # resource_data is shared by content so is only deleted
+            # if no other audit's resources use it. The outer DELETE
+            # still sees the rows deleted in the WITH clause.
             delete_resource = f"""
+                WITH deleted AS (
+                    DELETE
+                    FROM public.audit_resource
+                    WHERE account_audit_id = {account_audit_id}
+                    RETURNING resource_data_id
+                )
                 DELETE
-                FROM public.audit_resource
-                WHERE account_audit_id = {account_audit_id};
+                FROM public.resource_data
+                WHERE id IN (SELECT resource_data_id FROM deleted)
+                AND NOT EXISTS (
+                    SELECT 1
+                    FROM public.audit_resource AS other
+                    WHERE other.resource_data_id = resource_data.id
+                    AND other.account_audit_id <> {account_audit_id}
+                );
                 """
             delete_statements.append(delete_resource)
 
+            delete_cached_response = f"""
+                DELETE
+                FROM public.cached_data_response
+                WHERE account_audit_id = {account_audit_id};
+                """
+            delete_statements.append(delete_cached_response)
+
+            delete_trace_spans = f"""
+                DELETE
+                FROM public.audit_trace_span
+                WHERE account_audit_id = {account_audit_id};
+                """
+            delete_statements.append(delete_trace_spans)
+
+            delete_api_usage = f"""
+                DELETE
+                FROM public.audit_criterion_api_usage
+                WHERE audit_criterion_id IN (
+                    SELECT id
+                    FROM public.audit_criterion
+                    WHERE account_audit_id = {account_audit_id}
+                );
+                """
+            delete_statements.append(delete_api_usage)
+
+            delete_criterion_region = f"""
+                DELETE
+                FROM public.audit_criterion_region
+                WHERE audit_criterion_id IN (
+                    SELECT id
+                    FROM public.audit_criterion
+                    WHERE account_audit_id = {account_audit_id}
+                );
+                """
+            delete_statements.append(delete_criterion_region)
+
             delete_criterion = f"""
                 DELETE
                 FROM public.audit_criterion
@@ -329,3 +438,60 @@ def manual_delete_expired_audits(event, context):
 @app.schedule(Rate(5, unit=Rate.MINUTES))
 def scheduled_delete_expired_audits(event):
     return delete_expired_audits()
+
+
+def migrate_resource_data():
+    """
+    Move the resource_data of audit_resource rows written before the
+    resource_data table was introduced into it in batches.
+    Invoked manually until it reports that it has completed. Each batch
+    starts after the last id so rows already migrated aren't scanned again.
+    """
+    start_time = time()
+    status = 0
+    migrated = 0
+    completed = False
+    batch_size = 500
+    last_id = 0
+    # run for 4 minutes
+    # (lambda timeout is set to 5)
+    execution_limit = 240
+    try:
+        dbh = DatabaseHandle(app)
+        db = dbh.get_handle()
+        while time() - start_time < execution_limit:
+            with db.atomic():
+                rows = list(
+                    models.AuditResource.select(
+                        models.AuditResource.id, models.AuditResource.resource_data
+                    )
+                    .where(
+                        models.AuditResource.id > last_id,
+                        models.AuditResource.resource_data.is_null(False),
+                    )
+                    .order_by(models.AuditResource.id)
+                    .limit(batch_size)
+                    .for_update()
+                    .dicts()
+                )
+                if len(rows) == 0:
+                    completed = True
+                    break
+                models.AuditResource.store_resource_data(rows)
+                for row in rows:
+                    models.AuditResource.update(
+                        resource_data=None, resource_data_id=row["resource_data_id"]
+                    ).where(models.AuditResource.id == row["id"]).execute()
+            migrated += len(rows)
+            last_id = rows[-1]["id"]
+            app.log.debug(f"Migrated {migrated} resources so far")
+        status = 1
+    except Exception as err:
+        status = 0
+        app.log.error(str(err))
+    return {"status": status, "migrated_resources": migrated, "completed": completed}
+
+
+@app.lambda_function()
+def manual_migrate_resource_data(event, context):
+    return migrate_resource_data()
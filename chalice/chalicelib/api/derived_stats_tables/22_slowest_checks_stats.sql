@@ -0,0 +1,26 @@
+-- AWS API usage per check over the recent audits
+-- ordered by the mean API time per evaluation
+-- Regional calls run concurrently so the API time is more than the elapsed time
+DROP TABLE IF EXISTS public._slowest_checks_stats;
+
+CREATE TABLE public._slowest_checks_stats AS
+SELECT
+  audit_criterion.criterion_id,
+  COUNT(DISTINCT api_usage.audit_criterion_id) AS evaluations,
+  SUM(api_usage.calls) AS calls,
+  SUM(api_usage.retries) AS retries,
+  SUM(api_usage.throttles) AS throttles,
+  SUM(api_usage.bytes) AS bytes,
+  SUM(api_usage.duration_ms) AS duration_ms,
+  SUM(api_usage.wait_ms) AS wait_ms,
+  SUM(api_usage.duration_ms) / COUNT(DISTINCT api_usage.audit_criterion_id) AS mean_duration_ms,
+  MAX(api_usage.duration_ms) AS max_operation_duration_ms
+FROM public.audit_criterion_api_usage AS api_usage
+INNER JOIN public.audit_criterion AS audit_criterion
+ON api_usage.audit_criterion_id = audit_criterion.id
+INNER JOIN public._recent_audits AS audit
+ON audit_criterion.account_audit_id = audit.id
+GROUP BY
+  audit_criterion.criterion_id
+ORDER BY
+  mean_duration_ms DESC;
@@ -0,0 +1,24 @@
+-- AWS API usage per account over the recent audits
+-- ordered by the mean API time per audit
+DROP TABLE IF EXISTS public._slowest_accounts_stats;
+
+CREATE TABLE public._slowest_accounts_stats AS
+SELECT
+  audit.account_subscription_id,
+  COUNT(DISTINCT audit.id) AS audits,
+  SUM(api_usage.calls) AS calls,
+  SUM(api_usage.retries) AS retries,
+  SUM(api_usage.throttles) AS throttles,
+  SUM(api_usage.bytes) AS bytes,
+  SUM(api_usage.duration_ms) AS duration_ms,
+  SUM(api_usage.wait_ms) AS wait_ms,
+  SUM(api_usage.duration_ms) / COUNT(DISTINCT audit.id) AS mean_duration_ms
+FROM public.audit_criterion_api_usage AS api_usage
+INNER JOIN public.audit_criterion AS audit_criterion
+ON api_usage.audit_criterion_id = audit_criterion.id
+INNER JOIN public._recent_audits AS audit
+ON audit_criterion.account_audit_id = audit.id
+GROUP BY
+  audit.account_subscription_id
+ORDER BY
+  mean_duration_ms DESC;
@@ -0,0 +1,22 @@
+-- Assume role credential cache lookups per recent audit
+-- Each hit is an STS call saved
+DROP TABLE IF EXISTS public._credential_cache_stats;
+
+CREATE TABLE public._credential_cache_stats AS
+SELECT
+  audit.id AS account_audit_id,
+  audit.account_subscription_id,
+  SUM(api_usage.cache_hits) AS cache_hits,
+  SUM(api_usage.cache_misses) AS cache_misses,
+  SUM(api_usage.calls) AS assume_role_calls
+FROM public.audit_criterion_api_usage AS api_usage
+INNER JOIN public.audit_criterion AS audit_criterion
+ON api_usage.audit_criterion_id = audit_criterion.id
+INNER JOIN public._recent_audits AS audit
+ON audit_criterion.account_audit_id = audit.id
+WHERE
+  api_usage.service = 'sts'
+  AND api_usage.operation = 'AssumeRole'
+GROUP BY
+  audit.id,
+  audit.account_subscription_id;
@@ -1,21 +1,32 @@
 """
 AUDIT LAMBDAS
 """
+import copy
+import itertools
 import os
 import json
 from datetime import datetime
-from peewee import Case, fn
+from time import time
 
 from botocore.exceptions import ClientError
 from chalice import Rate
 
 from app import app
+from chalicelib.aws.api_usage import ApiUsageRecorder, recording
 from chalicelib.aws.gds_aws_client import GdsAwsClient
 from chalicelib.aws.gds_ssm_client import GdsSsmClient
 from chalicelib.aws.gds_sqs_client import GdsSqsClient
 from chalicelib.aws.gds_ec2_client import GdsEc2Client
 from chalicelib.aws.gds_organizations_client import GdsOrganizationsClient
-from chalicelib import models
+from chalicelib import models, messages
+from chalicelib.aws.gds_support_client import GdsSupportClient
+from chalicelib.bounded_executor import BoundedExecutor
+from chalicelib.claim_check import check_in, get_claim_check_store
+from chalicelib.database_handle import AuditResourceWriter
+from chalicelib.sqs_batch import SqsBatch, get_message_id, get_sqs_batch_size
+from chalicelib.tracing import Tracer, get_trace_exporter
+from chalicelib.criteria.criteria_default import TrustedAdvisorCriterion
+from chalicelib.trusted_advisor import TrustedAdvisorOrchestrator, get_refresh_delay
 from chalicelib.criteria.aws_ec2_security_group_ingress_open import (
     AwsEc2SecurityGroupIngressOpen,
 )
@@ -28,6 +39,238 @@ from chalicelib.criteria.aws_iam_validate_inspector_policy import (
 from chalicelib.criteria.aws_support_root_mfa import AwsSupportRootMfa
 
 
+def get_region_concurrency():
+    """
+    The maximum number of regions to call get_data for concurrently
+    """
+    return int(os.environ.get("CSW_REGION_CONCURRENCY", 8))
+
+
+def get_evaluate_concurrency():
+    """
+    The maximum number of resources to evaluate concurrently
+    Only worth raising for criteria whose evaluate makes API or DB calls
+    """
+    return int(os.environ.get("CSW_EVALUATE_CONCURRENCY", 1))
+
+
+def get_checkpoint_threshold():
+    """
+    Checkpoint and continue in a new message when the lambda has
+    less than this many milliseconds left. 0 disables checkpoints.
+    """
+    return int(os.environ.get("CSW_CHECKPOINT_THRESHOLD", 60000))
+
+
+def get_out_of_time(context):
+    """
+    :param context: the lambda context
+    :return: callable returning whether to checkpoint or None if there's no time limit
+    """
+    threshold = get_checkpoint_threshold()
+    get_remaining_time = getattr(context, "get_remaining_time_in_millis", None)
+    if threshold <= 0 or get_remaining_time is None:
+        return None
+    return lambda: get_remaining_time() < threshold
+
+
+class EvaluationSuspended(Exception):
+    """
+    Raised once the progress of an evaluation has been checkpointed
+    """
+
+
+def get_checkpoint(stats_record):
+    """
+    :param stats_record: the AuditCriterion or AuditCriterionRegion
+    :return dict|None: {
+        "request": index of the request being evaluated,
+        "page": number of its pages already evaluated,
+        "summary": the summary so far,
+        "check_passed": bool,
+        "status": whether any request has been processed
+    }
+    """
+    if stats_record.checkpoint is None:
+        return None
+    return json.loads(stats_record.checkpoint)
+
+
+def is_any_short_circuit():
+    """
+    Whether "any" criteria stop fetching and evaluating resources
+    once a resource has passed
+    """
+    return os.environ.get("CSW_ANY_SHORT_CIRCUIT", "false").lower() == "true"
+
+
+def is_resource_hash_reuse():
+    """
+    Whether the compliance of resources which haven't changed since
+    the previous audit is reused rather than evaluated again
+    """
+    return os.environ.get("CSW_RESOURCE_HASH_REUSE", "false").lower() == "true"
+
+
+def is_regional_fan_out():
+    """
+    Whether regional criteria are audited as one SQS message per region
+    rather than one message covering every region
+    """
+    return os.environ.get("CSW_REGIONAL_FAN_OUT", "false").lower() == "true"
+
+
+def is_trusted_advisor_orchestrated():
+    """
+    Whether TA refreshes are requested at the start of the audit and
+    polled by delayed SQS messages rather than waited for by each criterion
+    """
+    return os.environ.get("CSW_TA_ORCHESTRATION", "false").lower() == "true"
+
+
+def is_grouped_criteria():
+    """
+    Whether criteria with the same data source are evaluated as one
+    work unit which fetches the data once per region
+    """
+    return os.environ.get("CSW_GROUPED_CRITERIA", "false").lower() == "true"
+
+
+def get_criterion_group_key(criterion):
+    """
+    Criteria with the same key can share the data returned by get_data
+    :return tuple|None: None if the criterion can't be grouped
+    """
+    CheckClass = app.utilities.get_class_by_name(criterion.invoke_class_name)
+    if CheckClass.data_source is None:
+        return None
+    params = sorted(
+        (param.param_name, param.param_value) for param in criterion.criterion_params
+    )
+    return CheckClass.data_source, criterion.is_regional, tuple(params)
+
+
+def get_work_unit_message(unit, region=None):
+    """
+    :param unit: [(criterion, audit_criterion)]
+    :param region: region name if the unit is fanned out per region
+    """
+    audit_criteria = [audit_criterion for criterion, audit_criterion in unit]
+    if len(audit_criteria) == 1:
+        return messages.audit_criterion_message(audit_criteria[0], region=region)
+    return messages.audit_criteria_message(audit_criteria, region=region)
+
+
+def get_trusted_advisor_check_id(criterion):
+    """
+    The TA check id for a criterion or None if it doesn't use TA
+    """
+    CheckClass = app.utilities.get_class_by_name(criterion.invoke_class_name)
+    if issubclass(CheckClass, TrustedAdvisorCriterion):
+        return CheckClass(app).check_id
+    return None
+
+
+def start_trusted_advisor_orchestration(
+    sqs, queue_url, audit, pending, trace=None, message_id=None
+):
+    """
+    Request the TA refreshes for the audit and queue the first poll
+    If the account can't be assumed the criteria are sent straight away
+    so that they record the failed assume as normal
+    A redelivered account message doesn't start the orchestration again
+    :param message_id: the id of the account message
+    """
+    work_unit = f"trusted_advisor_orchestration:{audit.id}"
+    if message_id is not None and models.ProcessedMessage.is_processed(
+        message_id, work_unit
+    ):
+        app.log.debug("TA orchestration already started")
+        return
+    client = GdsSupportClient(app)
+    session = client.get_chained_session(audit.account_subscription_id.account_id)
+    if session is None:
+        for check_id, audit_criterion_ids in pending.items():
+            send_trusted_advisor_criteria(
+                sqs, queue_url, audit_criterion_ids, None, trace, message_id
+            )
+    else:
+        orchestrator = TrustedAdvisorOrchestrator(app, client)
+        orchestration = orchestrator.start(session, audit.id, pending)
+        message_body = messages.encode(
+            {"trusted_advisor_orchestration": orchestration}, trace
+        )
+        if (
+            sqs.send_message(queue_url, message_body, delay_seconds=get_refresh_delay())
+            is None
+        ):
+            raise Exception(f"Failed to send the TA orchestration for audit {audit.id}")
+    record_processed(message_id, work_unit)
+
+
+def poll_trusted_advisor_orchestration(sqs, orchestration, trace=None, message_id=None):
+    """
+    Send the criteria for the TA checks which are fresh and
+    re-queue the poll for the rest without blocking the lambda
+    The trace context is passed on unchanged so the polls count
+    as queue wait for the criteria
+    :param message_id: the id of the poll message
+    """
+    queue_url = sqs.get_queue_url(f"{app.prefix}-audit-account-metric-queue")
+    audit = models.AccountAudit.get_by_id(orchestration["account_audit_id"])
+    client = GdsSupportClient(app)
+    session = client.get_chained_session(audit.account_subscription_id.account_id)
+    orchestrator = TrustedAdvisorOrchestrator(app, client)
+    if session is None:
+        # dispatch everything and let the criteria record the failed assume
+        ready = {check_id: None for check_id in orchestration["pending"]}
+        next_poll = None
+    else:
+        ready, next_poll = orchestrator.poll(session, orchestration)
+    for check_id, summary in ready.items():
+        audit_criterion_ids = orchestration["pending"][check_id]
+        send_trusted_advisor_criteria(
+            sqs, queue_url, audit_criterion_ids, summary, trace, message_id
+        )
+    if next_poll is not None:
+        app.log.debug(f"Waiting for TA checks: {', '.join(next_poll['pending'])}")
+        message_body = messages.encode(
+            {"trusted_advisor_orchestration": next_poll}, trace
+        )
+        if (
+            sqs.send_message(queue_url, message_body, delay_seconds=get_refresh_delay())
+            is None
+        ):
+            raise Exception(f"Failed to send the TA poll for audit {audit.id}")
+
+
+def send_trusted_advisor_criteria(
+    sqs, queue_url, audit_criterion_ids, summary, trace=None, message_id=None
+):
+    """
+    Criteria sent by an earlier delivery of the message are skipped
+    :param message_id: the id of the account or poll message
+    """
+    for audit_criterion_id in audit_criterion_ids:
+        work_unit = get_dispatch_key(audit_criterion_id)
+        if message_id is not None and models.ProcessedMessage.is_processed(
+            message_id, work_unit
+        ):
+            continue
+        audit_criterion = models.AuditCriterion.get_by_id(audit_criterion_id)
+        message_data = messages.audit_criterion_message(audit_criterion)
+        if summary is not None:
+            message_data["trusted_advisor_summary"] = summary
+        if sqs.send_message(queue_url, messages.encode(message_data, trace)) is None:
+            raise Exception(f"Failed to send the TA audit criterion {audit_criterion_id}")
+        record_processed(message_id, work_unit)
+
+
+def get_region_names():
+    ec2 = GdsEc2Client(app)
+    return [region["RegionName"] for region in ec2.describe_regions()]
+
+
 def get_audit_criteria(app):
     criteria = [
         AwsIamValidateInspectorPolicy,
@@ -49,32 +292,45 @@ def execute_on_audit_accounts_event(event, context):
         active_accounts = models.AccountSubscription.select().where(
             models.AccountSubscription.active == True
         )
-        app.log.debug("Found active accounts: " + str(len(list(active_accounts))))
-        items = []
+        accounts = list(active_accounts)
+        app.log.debug("Found active accounts: " + str(len(accounts)))
         # create SQS message
         sqs = GdsSqsClient(app)
         app.log.debug("Invoke SQS client")
         app.log.debug("Set prefix: " + app.prefix)
         queue_url = sqs.get_queue_url(f"{app.prefix}-audit-account-queue")
         app.log.debug("Retrieved queue url: " + queue_url)
-        for account in active_accounts:
-            app.log.debug("Audit account: " + account.account_name)
-            items.append(account.serialize())
-            # create a new empty account audit record
-            audit = models.AccountAudit.create(account_subscription_id=account)
-            app.log.debug("Created audit record")
-            message_body = app.utilities.to_json(audit.serialize())
-            app.log.debug("Sending SQS message with body: " + message_body)
-            message_id = sqs.send_message(queue_url, message_body)
-            if message_id is not None:
-                app.log.debug("Sent SQS message: " + message_id)
-            else:
-                raise Exception("Message ID empty from SQS send_message")
+        # create the new empty account audit records in one statement
+        started = time()
+        audit_ids = models.AccountAudit.insert_rows(
+            [{"account_subscription_id": account.id} for account in accounts],
+            ["account_subscription_id"],
+        )
+        app.log.debug(f"Created {len(audit_ids)} audit records")
+        # each audit starts a new trace
+        exporter = get_trace_exporter(app)
+        tracers = []
+        for audit_id in audit_ids:
+            tracer = Tracer("audit_account_schedule", audit_id, exporter=exporter)
+            tracer.add_span("persist", started, time())
+            tracers.append(tracer)
+        message_bodies = [
+            messages.encode(
+                messages.audit_message(tracer.account_audit_id), tracer.get_context()
+            )
+            for tracer in tracers
+        ]
+        message_ids = sqs.send_message_batch(queue_url, message_bodies)
+        for tracer in tracers:
+            tracer.finish()
+        unsent = message_ids.count(None)
+        if unsent > 0:
+            raise Exception(f"Failed to send {unsent} of {len(message_ids)} SQS messages")
+        app.log.debug(f"Sent {len(message_ids)} SQS messages")
         status = True
     except Exception as err:
         app.log.error("Failed to start audit: " + str(err))
         status = False
-        items = []
     return status
 
 
@@ -88,319 +344,885 @@ def audit_account(event, context):
     return execute_on_audit_accounts_event(event, context)
 
 
-@app.on_sqs_message(queue=f"{app.prefix}-audit-account-queue")
+@app.on_sqs_message(
+    queue=f"{app.prefix}-audit-account-queue", batch_size=get_sqs_batch_size()
+)
 def account_audit_criteria(event):
     status = False
+    # messages which fail are redelivered without the rest of the batch
+    sqs = GdsSqsClient(app)
+    batch = SqsBatch(app, sqs, f"{app.prefix}-audit-account-queue", event)
     try:
-        sqs = GdsSqsClient(app)
         app.log.debug("Invoke SQS client")
         app.log.debug("Set prefix: " + app.prefix)
         queue_url = sqs.get_queue_url(f"{app.prefix}-audit-account-metric-queue")
         app.log.debug("Retrieved queue url: " + queue_url)
-        active_criteria = models.Criterion.select().where(
-            models.Criterion.active == True
+        active_criteria = list(
+            models.Criterion.select().where(models.Criterion.active == True)
         )
-        messages = []
-        for message in event:
-            audit_data = json.loads(message.body)
-            app.log.debug(message.body)
-            audit = models.AccountAudit.get_by_id(audit_data["id"])
-            audit.active_criteria = len(list(active_criteria))
-            audit.save()
-            for criterion in active_criteria:
-                # catch KeyErrors for duplicate compound keys if SQS messages
-                # are processed twice
-                # (account_audit_id, criterion_id) should be unique
-                try:
-                    audit_criterion = models.AuditCriterion.create(
-                        account_audit_id=audit, criterion_id=criterion
+        # describe the regions once for all the regional criteria
+        region_names = get_region_names() if is_regional_fan_out() else []
+        ta_orchestrated = is_trusted_advisor_orchestrated()
+        grouped = is_grouped_criteria()
+        exporter = get_trace_exporter(app)
+        for message in batch:
+            with batch.process(message):
+                audit_data = messages.decode(message.body)
+                app.log.debug(message.body)
+                tracer = Tracer(
+                    "account_audit_criteria",
+                    audit_data["audit_id"],
+                    audit_data.get("trace"),
+                    exporter,
+                )
+                trace = tracer.get_context()
+                message_id = get_message_id(message)
+                audit = models.AccountAudit.get_by_id(audit_data["audit_id"])
+                audit.active_criteria = len(active_criteria)
+                audit.save()
+
+                # (account_audit_id, criterion_id) should be unique so
+                # skip criteria created by an earlier delivery of the message
+                existing = list(
+                    models.AuditCriterion.select(
+                        models.AuditCriterion.id,
+                        models.AuditCriterion.criterion_id,
+                        models.AuditCriterion.attempted,
+                    ).where(models.AuditCriterion.account_audit_id == audit)
+                )
+                existing_ids = [
+                    audit_criterion.criterion_id_id for audit_criterion in existing
+                ]
+                new_criteria = [
+                    criterion
+                    for criterion in active_criteria
+                    if criterion.id not in existing_ids
+                ]
+                # create the audit criterion records in one statement
+                with tracer.span("persist"):
+                    audit_criterion_ids = models.AuditCriterion.insert_rows(
+                        [
+                            {"account_audit_id": audit.id, "criterion_id": criterion.id}
+                            for criterion in new_criteria
+                        ],
+                        ["criterion_id"],
                     )
-                    message_body = app.utilities.to_json(audit_criterion.serialize())
-                    message_id = sqs.send_message(queue_url, message_body)
-                    messages.append(message_id)
-                except KeyError:
-                    app.log.error(app.utilities.get_typed_exception())
-            audit.date_updated = datetime.now()
-            audit.save()
+
+                message_bodies = []
+                # the dispatch keys of the criteria in each message
+                message_keys = []
+                region_rows = []
+                # {check_id: [audit_criterion_id]} for orchestrated TA criteria
+                ta_pending = {}
+                # each work unit is a list of [(criterion, audit_criterion)]
+                # grouped criteria share a unit so their data is fetched once
+                units = []
+                grouped_units = {}
+                # an earlier delivery records the messages it sent in the
+                # ledger so only the criteria it failed to send are sent again
+                dispatched = models.ProcessedMessage.get_work_units(message_id)
+                criteria_by_id = {criterion.id: criterion for criterion in active_criteria}
+                unsent_criteria = [
+                    (criteria_by_id[audit_criterion.criterion_id_id], audit_criterion.id)
+                    for audit_criterion in existing
+                    if not audit_criterion.attempted
+                    and audit_criterion.criterion_id_id in criteria_by_id
+                    and get_dispatch_key(audit_criterion.id) not in dispatched
+                ]
+                for criterion, audit_criterion_id in (
+                    list(zip(new_criteria, audit_criterion_ids)) + unsent_criteria
+                ):
+                    audit_criterion = models.AuditCriterion(
+                        id=audit_criterion_id,
+                        account_audit_id=audit.id,
+                        criterion_id=criterion.id,
+                    )
+                    check_id = (
+                        get_trusted_advisor_check_id(criterion) if ta_orchestrated else None
+                    )
+                    group_key = get_criterion_group_key(criterion) if grouped else None
+                    if check_id:
+                        # sent once the TA check has been refreshed
+                        ta_pending.setdefault(check_id, []).append(audit_criterion_id)
+                    elif group_key in grouped_units:
+                        grouped_units[group_key].append((criterion, audit_criterion))
+                    else:
+                        unit = [(criterion, audit_criterion)]
+                        if group_key is not None:
+                            grouped_units[group_key] = unit
+                        units.append(unit)
+
+                for unit in units:
+                    if unit[0][0].is_regional and region_names:
+                        # one message per region so that a slow region doesn't
+                        # hold up the others and retries only repeat one region
+                        # the results are merged by complete_from_regions
+                        for region in region_names:
+                            keys = [
+                                get_dispatch_key(audit_criterion.id, region)
+                                for criterion, audit_criterion in unit
+                            ]
+                            if all(key in dispatched for key in keys):
+                                continue
+                            for criterion, audit_criterion in unit:
+                                region_rows.append(
+                                    {
+                                        "audit_criterion_id": audit_criterion.id,
+                                        "region": region,
+                                    }
+                                )
+                            message_data = get_work_unit_message(unit, region)
+                            message_bodies.append(messages.encode(message_data, trace))
+                            message_keys.append(keys)
+                    else:
+                        message_data = get_work_unit_message(unit)
+                        message_bodies.append(messages.encode(message_data, trace))
+                        message_keys.append(
+                            [
+                                get_dispatch_key(audit_criterion.id)
+                                for criterion, audit_criterion in unit
+                            ]
+                        )
+
+                if region_rows:
+                    with tracer.span("persist"):
+                        # rows for resent criteria already exist
+                        models.AuditCriterionRegion.insert_many(
+                            region_rows
+                        ).on_conflict_ignore().execute()
+                message_ids = sqs.send_message_batch(queue_url, message_bodies)
+                if message_id is not None:
+                    models.ProcessedMessage.record_many(
+                        message_id,
+                        [
+                            key
+                            for keys, sent_id in zip(message_keys, message_ids)
+                            if sent_id is not None
+                            for key in keys
+                        ],
+                    )
+                unsent = message_ids.count(None)
+                if unsent > 0:
+                    # the message is redelivered and resends the unsent criteria
+                    raise Exception(
+                        f"Failed to send {unsent} of {len(message_ids)} SQS messages"
+                    )
+                if ta_pending:
+                    start_trusted_advisor_orchestration(
+                        sqs, queue_url, audit, ta_pending, trace, message_id
+                    )
+                audit.date_updated = datetime.now()
+                audit.save()
+                tracer.finish()
     except Exception:
         app.log.error(app.utilities.get_typed_exception())
-    return status
+    return batch.get_response(status)
 
 
-# TODO break down into multiple steps
-@app.on_sqs_message(queue=f"{app.prefix}-audit-account-metric-queue")
-def account_evaluate_criteria(event):
+def get_criterion_requests(criterion, region=None):
+    """
+    The get_data kwargs for each region the criterion is evaluated in
+    :param criterion: Criterion
+    :param region: the region name if the criterion is fanned out per region
+    :return list: [dict]
+    """
+    params = {}
+    for param in criterion.criterion_params:
+        params[param.param_name] = param.param_value
+    app.log.debug("params: " + app.utilities.to_json(params))
+    if region is not None:
+        region_names = [region]
+    elif criterion.is_regional:
+        region_names = get_region_names()
+    else:
+        return [params]
+    requests = []
+    for region_name in region_names:
+        region_params = params.copy()
+        region_params["region"] = region_name
+        app.log.debug("Create request from region: " + region_params["region"])
+        requests.append(region_params)
+    return requests
+
+
+def fetch_criterion_data(check, session, requests, lazy=False):
+    """
+    Fetch the data for each region concurrently
+    Results are returned in request order
+    Catch access denied type errors from out-of-date policies
+    per region so one denied region doesn't abort the others
+    :param lazy: fetch each region only when it is iterated
+    :return list|generator: [(data, boto3_error)]
+    """
+    executor = BoundedExecutor(get_region_concurrency())
+
+    def fetch(request_params):
+        return check.get_data(session, **request_params)
+
+    if lazy:
+        return (executor.call(fetch, request, (ClientError,)) for request in requests)
+    return executor.map(fetch, requests, catch=(ClientError,))
+
+
+def get_pages(items, page_size):
+    """
+    Split the items returned by get_data into lists of page_size
+    so that generators are only held in memory one page at a time
+    """
+    page = []
+    for item in items:
+        page.append(item)
+        if len(page) == page_size:
+            yield page
+            page = []
+    if page:
+        yield page
+
+
+def get_previous_audit_id(check, audit):
+    """
+    The audit to reuse the results for unchanged resources from
+    Allowlist criteria are always evaluated since the allowlist may have changed
+    :return int|None:
+    """
+    if not is_resource_hash_reuse() or check.exception_type != "resource":
+        return None
+    latest = models.AccountLatestAudit.get_or_none(
+        models.AccountLatestAudit.account_subscription_id
+        == audit.account_subscription_id
+    )
+    if latest is None or latest.account_audit_id_id == audit.id:
+        return None
+    return latest.account_audit_id_id
+
+
+def get_page_evaluations(check, page, reused, lazy=False):
+    """
+    Yield the evaluation of each item in the page
+    :param reused: the (reference id, evaluation) of each unchanged item or None
+    :param lazy: evaluate one item at a time as the results are iterated
+    """
+    if lazy:
+        changed = (item for item, unchanged in zip(page, reused) if unchanged is None)
+        evaluations = (check.evaluate_item(item) for item in changed)
+    else:
+        changed = [item for item, unchanged in zip(page, reused) if unchanged is None]
+        evaluations = iter(
+            check.evaluate_batch(changed, max_workers=get_evaluate_concurrency())
+        )
+    for unchanged in reused:
+        if unchanged is None:
+            yield next(evaluations)
+        else:
+            # the audit adds to the evaluation so don't share it
+            yield dict(unchanged[1])
+
+
+def evaluate_criterion_data(
+    check,
+    audit,
+    criterion,
+    stats_record,
+    requests,
+    responses,
+    tracer=None,
+    out_of_time=None,
+):
+    """
+    Evaluate, record and summarize the resources returned by get_data
+    page by page so the resources are never all held in memory
+
+    If out_of_time returns true after a page is written the progress is
+    saved to stats_record.checkpoint and EvaluationSuspended is raised.
+    Evaluating again resumes after the last page written. Skipped pages
+    of paginated data are still fetched but not evaluated or written.
+    :param stats_record: the AuditCriterion or AuditCriterionRegion to update
+    :param requests: the get_data kwargs for each region
+    :param responses: the (data, boto3_error) for each request
+    :param tracer: Tracer recording the persist spans
+    :param out_of_time: see get_out_of_time
+    :return tuple: (processed, check_passed)
+    """
+    if tracer is None:
+        tracer = Tracer("evaluate_criterion_data", audit.id)
     status = False
-    try:
-        status = False
-        sqs = GdsSqsClient(app)
-        app.log.debug("Invoke SQS client")
-        app.log.debug("Set prefix: " + app.prefix)
-        queue_url = sqs.get_queue_url(f"{app.prefix}-evaluated-metric-queue")
-        app.log.debug("Retrieved queue url: " + queue_url)
-        for message in event:
-            app.log.debug("parse message body")
-            audit_criteria_data = json.loads(message.body)
-            audit_criterion = models.AuditCriterion.get_by_id(audit_criteria_data["id"])
-            app.log.debug("loaded audit criterion")
-            audit_data = audit_criteria_data["account_audit_id"]
-            audit = models.AccountAudit.get_by_id(audit_data["id"])
-            app.log.debug("loaded audit")
-            criterion_data = audit_criteria_data["criterion_id"]
-            criterion = models.Criterion.get_by_id(criterion_data["id"])
-            app.log.debug("criterion: " + criterion.title)
-            provider = criterion_data["criteria_provider_id"]
-            app.log.debug("provider: " + provider["provider_name"])
-            CheckClass = app.utilities.get_class_by_name(criterion.invoke_class_name)
-            check = CheckClass(app)
-            account_id = audit.account_subscription_id.account_id
-            check.set_account_subscription_id(audit.account_subscription_id.id)
-
-            # TODO figure out how to resolve the chain account and new role names
-            # TODO implement the check.get_chained_session method
-            # session = check.get_session(
-            #     account=account_id, role=f"{app.prefix}_CstSecurityInspectorRole"
-            # )
-            session = check.get_chained_session(account_id)
-
-            # check passed is set to true and and-equalsed for all
-            # or false and or-equalsed for any
-            check_passed = check.aggregation_type == "all"
-
-            # Mark audit_criterion record as attempted regardless of successful processing
-            # This means that we can tell when an audit is finished even if it did not complete
-            # Finished = every check was attempted
-            # Complete = every check was successfully processed (pass or fail)
-            audit_criterion.attempted = True
-
-            if session is not None:
-                params = {}
-                for param in criterion.criterion_params:
-                    params[param.param_name] = param.param_value
-                app.log.debug("params: " + app.utilities.to_json(params))
-                requests = []
-                if criterion.is_regional:
-                    ec2 = GdsEc2Client(app)
-                    regions = ec2.describe_regions()
-                    for region in regions:
-                        region_params = params.copy()
-                        region_params["region"] = region["RegionName"]
-                        app.log.debug(
-                            "Create request from region: " + region_params["region"]
+    summary = None
+
+    # check passed is set to true and and-equalsed for all
+    # or false and or-equalsed for any
+    check_passed = check.aggregation_type == "all"
+    is_all = check_passed
+    checkpoint = get_checkpoint(stats_record) or {"request": 0, "page": 0}
+    if "summary" in checkpoint:
+        summary = checkpoint["summary"]
+        check_passed = checkpoint["check_passed"]
+        status = checkpoint["status"]
+    # one passed resource is enough for an "any" check to pass
+    short_circuit = (not is_all) and is_any_short_circuit()
+    writer = AuditResourceWriter(app)
+    # load exceptions once rather than querying per failed resource
+    exception_index = models.ResourceException.get_active_exception_index(
+        criterion.id, audit.account_subscription_id.id
+    )
+    previous_audit_id = get_previous_audit_id(check, audit)
+    for index, (params, (data, boto3_error)) in enumerate(zip(requests, responses)):
+        if index < checkpoint["request"]:
+            # evaluated before the last checkpoint
+            continue
+        first_page = checkpoint["page"] if index == checkpoint["request"] else 0
+        if data is not None:
+            if summary is None:
+                summary = check.empty_summary()
+            try:
+                # paginated data is fetched as it is iterated
+                pages = get_pages(data, writer.max_rows)
+                for page_number, page in enumerate(pages):
+                    if page_number < first_page:
+                        continue
+                    app.log.debug(f"evaluating {len(page)} resources")
+                    evaluated = []
+                    resource_items = [None] * len(page)
+                    reused = [None] * len(page)
+                    if previous_audit_id is not None:
+                        # the resource hashes are needed before evaluating
+                        resource_items = [
+                            check.build_audit_resource_item(
+                                api_item=api_response_item,
+                                audit=audit,
+                                criterion=criterion,
+                                params=params,
+                            )
+                            for api_response_item in page
+                        ]
+                        unchanged = models.AuditResource.get_unchanged_compliance(
+                            previous_audit_id, criterion.id, resource_items
                         )
-                        requests.append(region_params)
-                else:
-                    requests.append(params)
-                summary = None
-
-                # check passed is set to true and and-equalsed for all
-                # or false and or-equalsed for any
-                check_passed = check.aggregation_type == "all"
-                is_all = check_passed
-                for params in requests:
-                    try:
-                        data = check.get_data(session, **params)
-                        # Set status to true only if data is returned successfully
-                        # AccessDenied remains unprocessed
-                        status = True
-                    except ClientError as boto3_error:
-                        # catch access denied type errors from out-of-date policies
-                        app.log.error(str(boto3_error))
-                        data = None
-                    if data is not None:
-                        app.log.debug("api response: " + app.utilities.to_json(data))
-                        evaluated = []
-                        for api_response_item in data:
-                            compliance = check.evaluate({}, api_response_item)
-                            app.log.debug(app.utilities.to_json(compliance))
-
-                            item_passed = compliance["status_id"] == 2
-
-                            # for "any" type checks only passed resources need to be recorded
-                            # individual failed resources are irrelevant for any checks.
-                            if is_all or item_passed:
+                        reused = [
+                            unchanged.get(item["resource_persistent_id"])
+                            for item in resource_items
+                        ]
+                        app.log.debug(f"{len(unchanged)} resources unchanged")
+                    # evaluate one at a time to stop "any" checks at the first pass
+                    evaluations = get_page_evaluations(
+                        check, page, reused, lazy=short_circuit
+                    )
+                    for api_response_item, audit_resource_item, unchanged, compliance in zip(
+                        page, resource_items, reused, evaluations
+                    ):
+                        app.log.debug(app.utilities.to_json(compliance))
+
+                        item_passed = compliance["status_id"] == 2
 
+                        # for "any" type checks only passed resources need to be recorded
+                        # individual failed resources are irrelevant for any checks.
+                        if is_all or item_passed:
+
+                            if audit_resource_item is None:
                                 audit_resource_item = check.build_audit_resource_item(
                                     api_item=api_response_item,
                                     audit=audit,
                                     criterion=criterion,
                                     params=params,
                                 )
-
-                                # only check exception status for failed resources
-                                if not item_passed:
-                                    # insert exception handling here so we catch failed exceptions before they
-                                    # change the status of the check
-                                    # potentially change the item_passed status before updating check_passed
-                                    exception = models.ResourceException.has_active_exception(
-                                        criterion.id,
-                                        audit_resource_item["resource_persistent_id"],
-                                        audit.account_subscription_id.id,
-                                    )
-
-                                    if exception is not None:
-                                        item_passed = True
-                                        compliance["status_id"] = 4
-                                        compliance["is_compliant"] = True
-                                        compliance["compliance_type"] = "COMPLIANT"
-                                        compliance[
-                                            "annotation"
-                                        ] += f"<p>[Passed by exception: {exception.reason}]</p>"
-
-                                # create an audit_resource record
-                                audit_resource = models.AuditResource.create(
-                                    **audit_resource_item
+                            if unchanged is not None:
+                                # reference the row holding the unchanged data
+                                audit_resource_item["resource_data"] = None
+                                audit_resource_item["reference_audit_resource_id"] = unchanged[0]
+
+                            # only check exception status for failed resources
+                            if not item_passed:
+                                # insert exception handling here so we catch failed exceptions before they
+                                # change the status of the check
+                                # potentially change the item_passed status before updating check_passed
+                                exception = exception_index.get(
+                                    audit_resource_item["resource_persistent_id"]
                                 )
 
-                                # populate foreign key for compliance record
-                                compliance["audit_resource_id"] = audit_resource
-                                audit_resource_item["resource_compliance"] = compliance
+                                if exception is not None:
+                                    item_passed = True
+                                    compliance["status_id"] = 4
+                                    compliance["is_compliant"] = True
+                                    compliance["compliance_type"] = "COMPLIANT"
+                                    compliance[
+                                        "annotation"
+                                    ] += f"<p>[Passed by exception: {exception.reason}]</p>"
+
+                            # queue the audit_resource and compliance records
+                            # the foreign key is populated when the batch is flushed
+                            audit_resource_item["resource_compliance"] = compliance
+                            writer.add(audit_resource_item, compliance)
+                            evaluated.append(audit_resource_item)
+
+                        # update check passed status
+                        check_passed = (
+                            (check_passed and item_passed)
+                            if is_all
+                            else (check_passed or item_passed)
+                        )
+                        if short_circuit and check_passed:
+                            break
+
+                    # write the page in one transaction
+                    with tracer.span("persist", region=params.get("region")):
+                        writer.flush()
+                    summary = check.summarize(evaluated, summary)
+                    if short_circuit and check_passed:
+                        # don't fetch the remaining pages
+                        break
+                    if out_of_time is not None and out_of_time():
+                        stats_record.checkpoint = json.dumps(
+                            {
+                                "request": index,
+                                "page": page_number + 1,
+                                "summary": summary,
+                                "check_passed": check_passed,
+                                "status": status,
+                            }
+                        )
+                        raise EvaluationSuspended()
+            except ClientError as error:
+                # a later page was denied or throttled
+                boto3_error = error
+
+        if boto3_error is None:
+            # Set status to true only if data is returned successfully
+            # AccessDenied remains unprocessed
+            status = True
+        else:
+            app.log.error(str(boto3_error))
 
-                                resource_compliance = models.ResourceCompliance.create(
-                                    **compliance
-                                )  # TODO: unecessary assignment?
-                                evaluated.append(audit_resource_item)
+        if short_circuit and check_passed:
+            app.log.debug("check passed: skipping the remaining regions")
+            break
 
-                            # update check passed status
-                            check_passed = (
-                                (check_passed and item_passed)
-                                if is_all
-                                else (check_passed or item_passed)
-                            )
+    if summary is not None:
+        app.log.debug(app.utilities.to_json(summary))
+        stats_record.resources = summary["all"]["display_stat"]
+        stats_record.tested = summary["applicable"]["display_stat"]
+        stats_record.passed = summary["compliant"]["display_stat"]
+        stats_record.failed = summary["non_compliant"]["display_stat"]
+        stats_record.ignored = summary["not_applicable"]["display_stat"]
+        stats_record.regions = summary["regions"]["count"]
+        stats_record.processed = status
+        # Only update the processed stat if the assume was successful
+    stats_record.checkpoint = None
+    return status, check_passed
 
-                        summary = check.summarize(evaluated, summary)
-                        app.log.debug(app.utilities.to_json(summary))
-                        audit_criterion.resources = summary["all"]["display_stat"]
-                        audit_criterion.tested = summary["applicable"]["display_stat"]
-                        audit_criterion.passed = summary["compliant"]["display_stat"]
-                        audit_criterion.failed = summary["non_compliant"][
-                            "display_stat"
-                        ]
-                        audit_criterion.ignored = summary["not_applicable"][
-                            "display_stat"
-                        ]
-                        audit_criterion.regions = summary["regions"]["count"]
-                        audit_criterion.processed = status
-                        # Only update the processed stat if the assume was successful
-
-            # Set the attempted status even if the criterion was not processed
-            audit_criterion.save()
-
-            message_data = audit_criterion.serialize()
-            message_data["processed"] = status
-            message_data["check_passed"] = check_passed
-            # It may be worth adding a field to the model
-            # to record where a check failed because of a failed assume role
-            # message_data['assume_failed'] = (session is None)
-            message_body = app.utilities.to_json(message_data)
-            message_id = sqs.send_message(
-                queue_url, message_body
-            )  # TODO: unecessary assignment?
 
-    except Exception:
-        app.log.error(app.utilities.get_typed_exception())
-    return status
+def record_processed(message_id, work_unit):
+    if message_id is not None:
+        models.ProcessedMessage.record(message_id, work_unit)
 
 
-@app.on_sqs_message(queue=f"{app.prefix}-evaluated-metric-queue")
-def audit_evaluated_metric(event):
-    status = False
+def record_api_usage(audit_criterion, api_usage):
+    """
+    Failing to record the API usage should not fail the evaluation
+    """
     try:
-        status = False
-        sqs = GdsSqsClient(app)
-        for message in event:
-            audit_criteria_data = json.loads(message.body)
-            audit = models.AccountAudit.get_by_id(
-                audit_criteria_data["account_audit_id"]["id"]
-            )
+        models.AuditCriterionApiUsage.record(
+            audit_criterion.id, api_usage.get_usage()
+        )
+    except Exception:
+        app.log.error(
+            "Failed to record API usage: " + app.utilities.get_typed_exception()
+        )
 
-            # Processed = count where processed = True
-            processed_case = Case(None, [(models.AuditCriterion.processed, 1)], 0)
 
-            # Attempted = count where attempted = True
-            attempted_case = Case(None, [(models.AuditCriterion.attempted, 1)], 0)
+def send_continuation(sqs, audit_criteria_data, members, trace):
+    """
+    Re-queue the criteria in a message which have not been evaluated
+    before the lambda ran out of time. A criterion which was part way
+    through resumes from its checkpoint.
+    :param members: the remaining [{audit_criterion_id, criterion_id}]
+    """
+    message_data = {
+        key: value
+        for key, value in audit_criteria_data.items()
+        if key not in ["v", "trace"]
+    }
+    if "audit_criteria" in message_data:
+        message_data["audit_criteria"] = members
+    queue_url = sqs.get_queue_url(f"{app.prefix}-audit-account-metric-queue")
+    # raise so the message is redelivered rather than acked without a continuation
+    if sqs.send_message(queue_url, messages.encode(message_data, trace)) is None:
+        raise Exception(f"Failed to send the continuation for audit {message_data['audit_id']}")
+
+
+def get_work_unit_key(member, region=None):
+    """
+    Identifies a criterion evaluation in the processed_message ledger
+    """
+    return f"audit_criterion:{member['audit_criterion_id']}:{region or 'all'}"
 
-            # Count where failed resources > 0
-            failed_case = Case(None, [(models.AuditCriterion.failed > 0, 1)], 0)
 
-            # Collate stats from audit criteria records
-            stats = (
-                models.AuditCriterion.select(
-                    fn.COUNT(models.AuditCriterion.id).alias("active_criteria"),
-                    fn.SUM(attempted_case).alias("attempted_criteria"),
-                    fn.SUM(processed_case).alias("processed_criteria"),
-                    fn.SUM(failed_case).alias("failed_criteria"),
-                    fn.SUM(models.AuditCriterion.failed).alias("failed_resources"),
-                )
-                .where(models.AuditCriterion.account_audit_id == audit)
-                .get()
-            )
+def get_dispatch_key(audit_criterion_id, region=None):
+    """
+    Identifies sending a criterion's message in the processed_message ledger
+    """
+    return "dispatch:" + get_work_unit_key(
+        {"audit_criterion_id": audit_criterion_id}, region
+    )
 
-            app.log.debug(
-                (
-                    f"Processed: {stats.processed_criteria} "
-                    f"Failed checks: {stats.failed_criteria} "
-                    f"Failed resources: {stats.failed_resources}"
-                )
+
+def evaluate_audit_criteria(
+    sqs, queue_url, audit_criteria_data, out_of_time=None, message_id=None
+):
+    """
+    Evaluate the criteria in an audit-account-metric-queue message
+
+    A grouped message contains several criteria with the same data
+    source. The data is fetched once per region using the session of
+    the first criterion and each criterion evaluates its own copy so
+    each still records a separate AuditCriterion result.
+
+    If the lambda runs out of time (see get_out_of_time) the remaining
+    criteria are sent in a continuation message.
+
+    Criteria which completed in an earlier delivery of the same message
+    are skipped rather than fetched and written again.
+    :param message_id: the SQS message id
+    :return bool: whether any of the criteria were processed
+    """
+    audit = models.AccountAudit.get_by_id(audit_criteria_data["audit_id"])
+    app.log.debug("loaded audit")
+    account_id = audit.account_subscription_id.account_id
+    region = audit_criteria_data.get("region")
+    tracer = Tracer(
+        "account_evaluate_criteria",
+        audit.id,
+        audit_criteria_data.get("trace"),
+        get_trace_exporter(app),
+    )
+    grouped = "audit_criteria" in audit_criteria_data
+    if grouped:
+        members = audit_criteria_data["audit_criteria"]
+    else:
+        members = [
+            {
+                "audit_criterion_id": audit_criteria_data["audit_criterion_id"],
+                "criterion_id": audit_criteria_data["criterion_id"],
+            }
+        ]
+
+    processed = False
+    session = None
+    requests = None
+    responses = None
+    for member_index, member in enumerate(members):
+        if out_of_time is not None and out_of_time():
+            app.log.debug("out of time: sending a continuation")
+            send_continuation(
+                sqs, audit_criteria_data, members[member_index:], tracer.get_context()
+            )
+            break
+        work_unit = get_work_unit_key(member, region)
+        if message_id is not None and models.ProcessedMessage.is_processed(
+            message_id, work_unit
+        ):
+            app.log.debug(f"skipping {work_unit}: already processed")
+            continue
+        audit_criterion = models.AuditCriterion.get_by_id(member["audit_criterion_id"])
+        app.log.debug("loaded audit criterion")
+        criterion = models.Criterion.get_by_id(member["criterion_id"])
+        app.log.debug("criterion: " + criterion.title)
+        # regional criteria may be fanned out to one message per region
+        # in which case the stats are recorded against the region record
+        audit_region = None
+        if region is not None:
+            audit_region = models.AuditCriterionRegion.get(
+                models.AuditCriterionRegion.audit_criterion_id == audit_criterion.id,
+                models.AuditCriterionRegion.region == region,
+            )
+            app.log.debug("region: " + audit_region.region)
+        stats_record = audit_criterion if audit_region is None else audit_region
+        CheckClass = app.utilities.get_class_by_name(criterion.invoke_class_name)
+        check = CheckClass(app)
+        check.set_account_subscription_id(audit.account_subscription_id.id)
+        if "trusted_advisor_summary" in audit_criteria_data:
+            check.set_trusted_advisor_summary(
+                audit_criteria_data["trusted_advisor_summary"]
             )
+        # share API responses with other criteria in the same audit
+        check.set_response_cache_context(audit.id, criterion.id)
+        api_usage = ApiUsageRecorder()
+        check.set_api_usage(api_usage)
+
+        # calls fetching grouped data are counted against the first criterion
+        with recording(api_usage):
+            if requests is None:
+                # TODO figure out how to resolve the chain account and new role names
+                # TODO implement the check.get_chained_session method
+                # session = check.get_session(
+                #     account=account_id, role=f"{app.prefix}_CstSecurityInspectorRole"
+                # )
+                with tracer.span("assume_role", audit_criterion.id, region):
+                    session = check.get_chained_session(account_id)
+                requests = []
+                responses = []
+                if session is not None:
+                    requests = get_criterion_requests(criterion, region)
+                    # fetch "any" regions on demand so that a pass skips the rest
+                    # grouped responses are iterated by every criterion
+                    lazy = (
+                        is_any_short_circuit()
+                        and not grouped
+                        and check.aggregation_type == "any"
+                    )
+                    # a resumed criterion only fetches the remaining regions
+                    # grouped data is fetched in full for the other criteria
+                    checkpoint = get_checkpoint(stats_record)
+                    skipped = 0 if grouped or checkpoint is None else checkpoint["request"]
+                    # lazy fetches and paginated get_data generators make
+                    # their calls during the evaluate span
+                    with tracer.span("fetch", audit_criterion.id, region):
+                        responses = fetch_criterion_data(
+                            check, session, requests[skipped:], lazy
+                        )
+                    if skipped > 0:
+                        # keep the responses aligned with the requests
+                        responses = itertools.chain([(None, None)] * skipped, responses)
 
-            audit.criteria_processed = stats.processed_criteria
-            audit.criteria_passed = stats.processed_criteria - stats.failed_criteria
-            audit.criteria_failed = stats.failed_criteria
-            audit.issues_found = stats.failed_resources
-            audit.finished = stats.active_criteria == stats.attempted_criteria
-
-            if audit.finished:
-                audit.date_completed = datetime.now()
-                message_data = audit.serialize()
-                audit_criteria = (
-                    models.AuditCriterion.select()
-                    .join(models.AccountAudit)
-                    .where(models.AccountAudit.id == audit.id)
-                )
-                criteria_data = []
-                for criteria in audit_criteria:
-                    criteria_data.append(criteria.serialize())
-                message_data["criteria"] = criteria_data
-                failed_resources = (
-                    models.ResourceCompliance.select()
-                    .join(models.AuditResource)
-                    .join(models.AccountAudit)
-                    .where(
-                        models.ResourceCompliance.status_id == 3,
-                        models.AccountAudit.id == audit.id,
+        # check passed is set to true and and-equalsed for all
+        # or false and or-equalsed for any
+        check_passed = check.aggregation_type == "all"
+        status = False
+
+        # Mark audit_criterion record as attempted regardless of successful processing
+        # This means that we can tell when an audit is finished even if it did not complete
+        # Finished = every check was attempted
+        # Complete = every check was successfully processed (pass or fail)
+        stats_record.attempted = True
+
+        if session is not None:
+            if grouped:
+                # evaluate may annotate the items so don't share them
+                # grouped data sources return lists rather than generators
+                member_responses = [
+                    (copy.deepcopy(data), boto3_error)
+                    for data, boto3_error in responses
+                ]
+            else:
+                member_responses = responses
+            try:
+                with tracer.span("evaluate", audit_criterion.id, region), recording(
+                    api_usage
+                ):
+                    status, check_passed = evaluate_criterion_data(
+                        check,
+                        audit,
+                        criterion,
+                        stats_record,
+                        requests,
+                        member_responses,
+                        tracer,
+                        out_of_time,
                     )
+            except EvaluationSuspended:
+                app.log.debug("out of time: checkpointed criterion " + criterion.title)
+                # attempted is set by the continuation which completes it
+                stats_record.attempted = False
+                stats_record.save()
+                record_api_usage(audit_criterion, api_usage)
+                send_continuation(
+                    sqs, audit_criteria_data, members[member_index:], tracer.get_context()
                 )
-                resources_data = []
-                for resource in failed_resources:
-                    resources_data.append(resource.serialize())
-                message_data["failed_resources"] = resources_data
-                # create SQS message
-                queue_url = sqs.get_queue_url(f"{app.prefix}-completed-audit-queue")
-                app.log.debug("Retrieved queue url: " + queue_url)
-                message_body = app.utilities.to_json(message_data)
-                try:
-                    latest = models.AccountLatestAudit.get(
-                        models.AccountLatestAudit.account_subscription_id
-                        == audit.account_subscription_id
+                break
+        processed = processed or status
+
+        # Set the attempted status even if the criterion was not processed
+        if audit_region is not None:
+            audit_region.check_passed = check_passed
+        stats_record.save()
+        record_api_usage(audit_criterion, api_usage)
+
+        if audit_region is not None:
+            # only the last region to report sends the evaluated message
+            check_passed = audit_criterion.complete_from_regions(
+                check.aggregation_type
+            )
+            if check_passed is None:
+                app.log.debug("waiting for remaining regions")
+                record_processed(message_id, work_unit)
+                continue
+            status = audit_criterion.processed
+
+        message_data = messages.audit_criterion_message(
+            audit_criterion, processed=status, check_passed=check_passed
+        )
+        # It may be worth adding a field to the model
+        # to record where a check failed because of a failed assume role
+        # message_data['assume_failed'] = (session is None)
+        message_body = messages.encode(message_data, tracer.get_context())
+        # raise so the redelivered message sends it rather than skipping the work unit
+        if sqs.send_message(queue_url, message_body) is None:
+            raise Exception(f"Failed to send the evaluated audit criterion {audit_criterion.id}")
+        record_processed(message_id, work_unit)
+    tracer.finish()
+    return processed
+
+
+@app.on_sqs_message(
+    queue=f"{app.prefix}-audit-account-metric-queue", batch_size=get_sqs_batch_size()
+)
+def account_evaluate_criteria(event):
+    status = False
+    # messages which fail are redelivered without the rest of the batch
+    sqs = GdsSqsClient(app)
+    batch = SqsBatch(app, sqs, f"{app.prefix}-audit-account-metric-queue", event)
+    try:
+        app.log.debug("Invoke SQS client")
+        app.log.debug("Set prefix: " + app.prefix)
+        queue_url = sqs.get_queue_url(f"{app.prefix}-evaluated-metric-queue")
+        app.log.debug("Retrieved queue url: " + queue_url)
+        out_of_time = get_out_of_time(event.context)
+        for message in batch:
+            with batch.process(message):
+                app.log.debug("parse message body")
+                audit_criteria_data = messages.decode(message.body)
+                if "trusted_advisor_orchestration" in audit_criteria_data:
+                    poll_trusted_advisor_orchestration(
+                        sqs,
+                        audit_criteria_data["trusted_advisor_orchestration"],
+                        audit_criteria_data.get("trace"),
+                        get_message_id(message),
                     )
-                    latest.account_audit_id = audit
-                    latest.save()
-                except models.AccountLatestAudit.DoesNotExist:
-                    latest = models.AccountLatestAudit.create(
-                        account_subscription_id=audit.account_subscription_id,
-                        account_audit_id=audit,
+                    continue
+                status = (
+                    evaluate_audit_criteria(
+                        sqs,
+                        queue_url,
+                        audit_criteria_data,
+                        out_of_time,
+                        get_message_id(message),
                     )
-                app.log.debug(
-                    "latest_audit: " + app.utilities.to_json(latest.serialize())
+                    or status
+                )
+
+    except Exception:
+        app.log.error(app.utilities.get_typed_exception())
+    return batch.get_response(status)
+
+
+@app.on_sqs_message(
+    queue=f"{app.prefix}-evaluated-metric-queue", batch_size=get_sqs_batch_size()
+)
+def audit_evaluated_metric(event):
+    status = False
+    # messages which fail are redelivered without the rest of the batch
+    sqs = GdsSqsClient(app)
+    batch = SqsBatch(app, sqs, f"{app.prefix}-evaluated-metric-queue", event)
+    try:
+        status = False
+        exporter = get_trace_exporter(app)
+        for message in batch:
+            with batch.process(message):
+                audit_criteria_data = messages.decode(message.body)
+                audit_criterion = models.AuditCriterion.get_by_id(
+                    audit_criteria_data["audit_criterion_id"]
+                )
+                tracer = Tracer(
+                    "audit_evaluated_metric",
+                    audit_criterion.account_audit_id_id,
+                    audit_criteria_data.get("trace"),
+                    exporter,
                 )
-                message_id = sqs.send_message(
-                    queue_url, message_body
-                )  # TODO: unecessary assignment?
-            audit.save()
+
+                # Atomically add the criterion to the audit stats
+                # attempted is only equal to active_criteria for the
+                # message which completes the audit
+                with tracer.span("persist", audit_criterion.id):
+                    counts = models.AccountAudit.record_criterion_evaluated(audit_criterion)
+                if counts is None:
+                    # completing the audit may have failed after the criterion
+                    # was counted in which case the redelivery completes it
+                    audit = models.AccountAudit.get_by_id(audit_criterion.account_audit_id_id)
+                    if audit.finished:
+                        app.log.debug(f"Audit criterion {audit_criterion.id} already counted")
+                        tracer.finish()
+                        continue
+                    counts = (audit.criteria_attempted, audit.active_criteria)
+                attempted_criteria, active_criteria = counts
+                app.log.debug(f"Attempted: {attempted_criteria} of {active_criteria}")
+
+                if attempted_criteria == active_criteria:
+                    audit = models.AccountAudit.get_by_id(audit_criterion.account_audit_id_id)
+                    complete_audit(sqs, audit, tracer)
+                tracer.finish()
     except Exception as err:
         app.log.error(str(err))
-    return status
+    return batch.get_response(status)
+
+
+def complete_audit(sqs, audit, tracer):
+    """
+    Send the completed audit report and record it as the latest audit
+    The audit is only marked finished once the report has been sent
+    so this can be repeated by a redelivered message if it fails
+    :param audit: AccountAudit whose criteria have all been attempted
+    """
+    app.log.debug(
+        (
+            f"Processed: {audit.criteria_processed} "
+            f"Failed checks: {audit.criteria_failed} "
+            f"Failed resources: {audit.issues_found}"
+        )
+    )
+    audit.finished = True
+    audit.date_completed = datetime.now()
+    message_data = audit.serialize()
+    audit_criteria = (
+        models.AuditCriterion.select()
+        .join(models.AccountAudit)
+        .where(models.AccountAudit.id == audit.id)
+    )
+    criteria_data = []
+    for criteria in audit_criteria:
+        criteria_data.append(criteria.serialize())
+    message_data["criteria"] = criteria_data
+    failed_resources = (
+        models.ResourceCompliance.select()
+        .join(models.AuditResource)
+        .join(models.AccountAudit)
+        .where(
+            models.ResourceCompliance.status_id == 3,
+            models.AccountAudit.id == audit.id,
+        )
+    )
+    resources_data = []
+    for resource in failed_resources:
+        resources_data.append(resource.serialize())
+    message_data["failed_resources"] = resources_data
+    # the cached API responses are only needed while the audit runs
+    models.CachedDataResponse.delete().where(
+        models.CachedDataResponse.account_audit_id == audit.id
+    ).execute()
+    # create SQS message
+    queue_url = sqs.get_queue_url(f"{app.prefix}-completed-audit-queue")
+    app.log.debug("Retrieved queue url: " + queue_url)
+    # the report can exceed the SQS size limit for large accounts
+    report_body = app.utilities.to_json(message_data)
+    report_reference = check_in(
+        get_claim_check_store(app),
+        f"completed-audit/{audit.id}.json",
+        report_body,
+    )
+    completed_message = messages.audit_message(audit.id)
+    if report_reference is None:
+        completed_message["report"] = json.loads(report_body)
+    else:
+        completed_message["report_reference"] = report_reference
+    message_body = messages.encode(completed_message, tracer.get_context())
+    models.AccountLatestAudit.insert(
+        account_subscription_id=audit.account_subscription_id,
+        account_audit_id=audit,
+    ).on_conflict(
+        conflict_target=[models.AccountLatestAudit.account_subscription_id],
+        preserve=[models.AccountLatestAudit.account_audit_id],
+    ).execute()
+    app.log.debug(f"latest_audit: {audit.id}")
+    if sqs.send_message(queue_url, message_body) is None:
+        raise Exception(f"Failed to send the completed audit {audit.id}")
+    audit.save(only=[models.AccountAudit.finished, models.AccountAudit.date_completed])
 
 
 def get_default_audit_account_list():
@@ -7,6 +7,7 @@ import jwt
 import google_auth_oauthlib.flow
 from chalicelib.aws.gds_ssm_client import GdsSsmClient
 from chalicelib import models
+from chalicelib.ttl_cache import invariant_cache
 
 
 class AuthHandler:
@@ -23,6 +24,9 @@ class AuthHandler:
     Google OAuth return code query string param
     """
 
+    # seconds to cache the SSM parameters for
+    params_ttl = 900
+
     def __init__(self, app):
 
         # app lets you use shared log method
@@ -57,38 +61,61 @@ class AuthHandler:
     def get_params(self):
         """
         Retrieve the secrets from SSM.
+        The secrets are cached in memory (not in the file tier) so SSM
+        isn't called on every request to a warm container
         """
 
         if "CSW_ENV" in os.environ:
 
             env = os.environ["CSW_ENV"]
 
-            params = {
-                "client_config": f"/csw/google/api-credentials",
-                "token_secret": f"/csw/{env}/auth/token_secret",
-            }
+            auth_params = invariant_cache.get(
+                self.get_params_cache_key(env),
+                lambda: self.fetch_params(env),
+                self.params_ttl,
+                persist=False,
+            )
+            self.token_secret = auth_params["token_secret"]
+            self.client_config = auth_params["client_config"]
 
-            # Get list of SSM parameter names from dict
-            param_list = list(params.values())
+        else:
+            self.app.log.debug("Environment variable CSW_ENV missing")
 
-            ssm = GdsSsmClient(self.app)
+    def get_params_cache_key(self, env):
+        return f"ssm:auth_params:{env}"
 
-            # Get all listed parameters in one API call
-            parameters = ssm.get_parameters(param_list, True)
+    def fetch_params(self, env):
 
-            self.token_secret = ssm.get_parameter_value(
-                parameters, params["token_secret"]
-            )
+        params = {
+            "client_config": f"/csw/google/api-credentials",
+            "token_secret": f"/csw/{env}/auth/token_secret",
+        }
 
-            # Because the google creds are JSON they get escaped in the API response
-            # and need to be parsed into a dict for use
-            google_config_param = ssm.get_parameter_value(
-                parameters, params["client_config"]
-            )
-            self.client_config = ssm.parse_escaped_json_parameter(google_config_param)
+        # Get list of SSM parameter names from dict
+        param_list = list(params.values())
 
-        else:
-            self.app.log.debug("Environment variable CSW_ENV missing")
+        ssm = GdsSsmClient(self.app)
+
+        # Get all listed parameters in one API call
+        parameters = ssm.get_parameters(param_list, True)
+
+        token_secret = ssm.get_parameter_value(parameters, params["token_secret"])
+
+        # Because the google creds are JSON they get escaped in the API response
+        # and need to be parsed into a dict for use
+        google_config_param = ssm.get_parameter_value(
+            parameters, params["client_config"]
+        )
+        client_config = ssm.parse_escaped_json_parameter(google_config_param)
+
+        return {"token_secret": token_secret, "client_config": client_config}
+
+    def invalidate_params(self):
+        """
+        Call after rotating the token secret or OAuth credentials
+        """
+        if "CSW_ENV" in os.environ:
+            invariant_cache.invalidate(self.get_params_cache_key(os.environ["CSW_ENV"]))
 
     def get_ssm_parameter(self, param_name):
         """
@@ -0,0 +1,182 @@
+"""
+Count the AWS API calls made by a criterion
+
+Handlers are registered once on the botocore event system of each
+pooled boto3 client (see register_client) so calls are counted whichever
+client method makes them and responses served from the response cache
+are not counted. Pooled clients are shared by every criterion so each
+call is counted against the recorder current on the calling thread
+(see recording). Totals are kept per (region, service, operation).
+
+Lookups in the assume role credential cache are counted against
+sts AssumeRole so that the STS calls saved can be seen per audit.
+"""
+import functools
+import threading
+from contextlib import contextmanager
+from time import perf_counter
+
+
+THROTTLING_CODES = {
+    "Throttling",
+    "ThrottlingException",
+    "ThrottledException",
+    "RequestThrottledException",
+    "TooManyRequestsException",
+    "ProvisionedThroughputExceededException",
+    "RequestLimitExceeded",
+    "RequestThrottled",
+    "SlowDown",
+}
+
+
+def is_throttled(http_response, parsed):
+    code = (parsed or {}).get("Error", {}).get("Code")
+    status = getattr(http_response, "status_code", None)
+    return code in THROTTLING_CODES or status == 429
+
+
+# the recorder of the criterion making calls on each thread
+local = threading.local()
+
+
+def get_current_recorder():
+    """
+    :return ApiUsageRecorder|None: the recorder for calls on this thread
+    """
+    return getattr(local, "recorder", None)
+
+
+def set_current_recorder(recorder):
+    local.recorder = recorder
+
+
+@contextmanager
+def recording(recorder):
+    """
+    Count the calls made on this thread against the recorder
+    :param recorder: ApiUsageRecorder or None to not count them
+    """
+    previous = get_current_recorder()
+    set_current_recorder(recorder)
+    try:
+        yield recorder
+    finally:
+        set_current_recorder(previous)
+
+
+def register_client(client):
+    """
+    Count the calls made by the client against the current recorder
+    :param client: boto3 client
+    """
+    region = client.meta.region_name
+    events = client.meta.events
+    events.register("before-call", before_call, unique_id="api-usage-before")
+    events.register(
+        "needs-retry",
+        functools.partial(needs_retry, region),
+        unique_id="api-usage-retry",
+    )
+    events.register(
+        "after-call",
+        functools.partial(after_call, region),
+        unique_id="api-usage-after",
+    )
+
+
+def before_call(context, **kwargs):
+    recorder = get_current_recorder()
+    if recorder is not None:
+        recorder.before_call(context, **kwargs)
+
+
+def needs_retry(region, **kwargs):
+    recorder = get_current_recorder()
+    if recorder is not None:
+        recorder.needs_retry(region, **kwargs)
+
+
+def after_call(region, **kwargs):
+    recorder = get_current_recorder()
+    if recorder is not None:
+        recorder.after_call(region, **kwargs)
+
+
+class ApiUsageRecorder:
+
+    def __init__(self):
+        self.usage = {}
+        self.lock = threading.Lock()
+
+    def get_totals(self, region, model):
+        return self.get_operation_totals(
+            region, model.service_model.service_name, model.name
+        )
+
+    def get_operation_totals(self, region, service, operation):
+        key = (region, service, operation)
+        if key not in self.usage:
+            self.usage[key] = {
+                "calls": 0,
+                "retries": 0,
+                "throttles": 0,
+                "bytes": 0,
+                "duration_ms": 0,
+                "wait_ms": 0,
+                "cache_hits": 0,
+                "cache_misses": 0,
+            }
+        return self.usage[key]
+
+    def record_wait(self, region, service, operation, wait_ms):
+        """
+        :param wait_ms: time the call was held back by the ApiGovernor
+        """
+        with self.lock:
+            self.get_operation_totals(region, service, operation)["wait_ms"] += wait_ms
+
+    def record_credential_cache(self, hit):
+        """
+        :param hit: whether cached credentials were used instead of
+        calling assume role
+        """
+        with self.lock:
+            totals = self.get_operation_totals(None, "sts", "AssumeRole")
+            totals["cache_hits" if hit else "cache_misses"] += 1
+
+    def before_call(self, context, **kwargs):
+        context["api_usage_start"] = perf_counter()
+
+    def needs_retry(self, region, operation=None, response=None, **kwargs):
+        # called after every attempt with (http_response, parsed)
+        # or None if the request raised an exception
+        if operation is None or response is None:
+            return
+        if is_throttled(*response):
+            with self.lock:
+                self.get_totals(region, operation)["throttles"] += 1
+
+    def after_call(self, region, model, context, http_response=None, parsed=None, **kwargs):
+        duration = perf_counter() - context.get("api_usage_start", perf_counter())
+        parsed = parsed or {}
+        retries = parsed.get("ResponseMetadata", {}).get("RetryAttempts", 0)
+        # the body of streaming responses has not been read yet
+        headers = getattr(http_response, "headers", None) or {}
+        size = int(headers.get("content-length", 0))
+        with self.lock:
+            totals = self.get_totals(region, model)
+            totals["calls"] += 1
+            totals["retries"] += retries
+            totals["bytes"] += size
+            totals["duration_ms"] += int(duration * 1000)
+
+    def get_usage(self):
+        """
+        :return list: [{region, service, operation, calls, ...}]
+        """
+        with self.lock:
+            return [
+                dict(totals, region=region, service=service, operation=operation)
+                for (region, service, operation), totals in self.usage.items()
+            ]
@@ -0,0 +1,81 @@
+"""
+Reuse boto3 clients across calls and warm invocations
+
+Creating a boto3 client loads the service model and builds the
+endpoint which takes tens of milliseconds. Clients are pooled by the
+credentials, service and region they were created with. The pool is
+bounded: the least recently used client is evicted when it is full and
+clients whose credentials have expired are evicted when they are next
+requested.
+"""
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+
+def get_client_pool_size():
+    return int(os.environ.get("CSW_CLIENT_POOL_SIZE", 64))
+
+
+class ClientPool:
+    def __init__(self, max_size=None):
+        # {key: (client, expiration)}
+        self.clients = OrderedDict()
+        self.max_size = max_size
+        self.lock = threading.Lock()
+
+    def get_max_size(self):
+        return self.max_size or get_client_pool_size()
+
+    def get_key(self, session, service_name, region=None):
+        """
+        Clients are shared by every criterion, API usage is counted
+        per call (see chalicelib.aws.api_usage)
+        :param session: credentials dict
+        """
+        return session["AccessKeyId"], service_name, region
+
+    def is_expired(self, expiration, now=None):
+        if expiration is None:
+            return False
+        # boto3 returns a UTC aware datetime
+        if expiration.tzinfo is None:
+            expiration = expiration.replace(tzinfo=timezone.utc)
+        return expiration <= (now or datetime.now(timezone.utc))
+
+    def get(self, key):
+        """
+        :return: the pooled client or None
+        """
+        with self.lock:
+            if key not in self.clients:
+                return None
+            client, expiration = self.clients[key]
+            if self.is_expired(expiration):
+                del self.clients[key]
+                return None
+            self.clients.move_to_end(key)
+            return client
+
+    def put(self, key, client, expiration=None):
+        """
+        :param expiration: when the client's credentials expire
+        :return: the pooled client which may have been added by
+        another thread in the meantime
+        """
+        with self.lock:
+            if key in self.clients:
+                self.clients.move_to_end(key)
+                return self.clients[key][0]
+            self.clients[key] = (client, expiration)
+            while len(self.clients) > self.get_max_size():
+                self.clients.popitem(last=False)
+            return client
+
+    def clear(self):
+        with self.lock:
+            self.clients.clear()
+
+    def __len__(self):
+        return len(self.clients)
@@ -0,0 +1,85 @@
+"""
+Cache the temporary credentials returned by sts assume-role
+
+The cache is shared by every GdsAwsClient in the process so chain and
+target sessions are reused across criteria and across warm invocations
+of the lambda. Credentials are refreshed once they are within the
+refresh margin of their Expiration so that a session is never handed
+out which could expire part way through an invocation.
+"""
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+
+
+def get_refresh_margin():
+    """
+    Seconds before expiry that credentials are refreshed
+    Defaults to the lambda timeout
+    """
+    return int(os.environ.get("CSW_CREDENTIAL_REFRESH_MARGIN", 300))
+
+
+class CredentialCache:
+    def __init__(self):
+        # {session_name: credentials}
+        self.credentials = dict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def is_valid(self, credentials, now=None):
+        """
+        :param credentials: the Credentials from an assume_role response
+        """
+        expiration = credentials["Expiration"]
+        # boto3 returns a UTC aware datetime
+        if expiration.tzinfo is None:
+            expiration = expiration.replace(tzinfo=timezone.utc)
+        now = now or datetime.now(timezone.utc)
+        return expiration - now > timedelta(seconds=get_refresh_margin())
+
+    def get(self, session_name):
+        """
+        :return dict|None: the credentials or None if they need refreshing
+        """
+        with self.lock:
+            credentials = self.credentials.get(session_name)
+            if credentials is not None and not self.is_valid(credentials):
+                del self.credentials[session_name]
+                credentials = None
+            if credentials is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return credentials
+
+    def peek(self, session_name):
+        """
+        Get the credentials without counting a hit or miss
+        """
+        with self.lock:
+            return self.credentials.get(session_name)
+
+    def put(self, session_name, credentials):
+        """
+        Expired credentials for other sessions are dropped so the
+        cache doesn't grow in containers which audit many accounts
+        """
+        with self.lock:
+            now = datetime.now(timezone.utc)
+            expired = [
+                name
+                for name, cached in self.credentials.items()
+                if not self.is_valid(cached, now)
+            ]
+            for name in expired:
+                del self.credentials[name]
+            self.credentials[session_name] = credentials
+
+    def get_stats(self):
+        """
+        :return dict: {hits, misses} since the container started
+        """
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses}
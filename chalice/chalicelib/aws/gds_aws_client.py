@@ -1,53 +1,251 @@
 # GdsAwsClient
 # Manage sts assume-role calls and temporary credentials
 import boto3
+import botocore.config
+import hashlib
+import itertools
+import json
 import os
 import re
+import threading
+from collections import OrderedDict
 from datetime import datetime
 
+from chalicelib.aws.api_usage import register_client
+from chalicelib.aws.client_pool import ClientPool
+from chalicelib.aws.credential_cache import CredentialCache
+from chalicelib.aws.governor import ApiGovernor, get_max_attempts
+from chalicelib.bounded_executor import BoundedExecutor
+from chalicelib.ttl_cache import invariant_cache
+
+
+def get_enrich_concurrency():
+    """
+    The maximum number of per item detail calls made concurrently
+    """
+    return int(os.environ.get("CSW_ENRICH_CONCURRENCY", 8))
+
 
 class GdsAwsClient:
 
-    # initialise empty dictionaries for clients and assume role sessions
+    # initialise empty dictionary for resources
     resources = dict()
-    clients = dict()
-    sessions = dict()
+    # boto3 clients and assume role sessions are shared
+    # by every client in the process
+    client_pool = ClientPool()
+    credential_cache = CredentialCache()
+    # every AWS call made by the clients is paced by the governor
+    governor = ApiGovernor()
+
+    # boto3.client uses a shared default session which is not
+    # thread-safe while a client is being created
+    client_lock = threading.Lock()
+
+    # API responses cached per account audit so that criteria
+    # calling the same API in the same audit reuse the response
+    # {account_audit_id: {cache_key: json encoded response}}
+    response_cache = OrderedDict()
+    max_cached_audits = 8
+    # the LRU order is updated by every lookup from any thread
+    response_cache_lock = threading.Lock()
+    datetime_format = "%Y-%m-%dT%H:%M:%S.%f"
 
     resource_type = "AWS::*::*"
     annotation = ""
 
+    chain_role_params_cache_key = "ssm:chain_role_params"
+    chain_role_params_ttl = 3600
+
     def __init__(self, app=None):
         self.app = app
         self.chain = {}
+        # response caching is only enabled once an audit is set
+        self.account_audit_id = None
+        self.criterion_id = None
+        # credential cache lookups are only counted once a recorder is set
+        self.api_usage = None
         # self.get_chain_role_params()
 
+    def set_response_cache_context(self, account_audit_id, criterion_id=None):
+        """
+        Cache API responses for the given account audit
+        The criterion_id is recorded against responses stored
+        in the cached_data_response table
+        """
+        self.account_audit_id = account_audit_id
+        self.criterion_id = criterion_id
+
+    def set_api_usage(self, recorder):
+        """
+        Count the assume role credential cache lookups
+        API calls are counted against the recorder current on the
+        calling thread, see chalicelib.aws.api_usage.recording
+        :param recorder: ApiUsageRecorder
+        """
+        self.api_usage = recorder
+
+    def get_response_cache_key(self, service_name, method_name, region=None, **kwargs):
+        key = json.dumps(
+            [self.account_audit_id, service_name, method_name, region, kwargs],
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def get_cached_response(self, fetch, service_name, method_name, region=None, **kwargs):
+        """
+        Return the response from an earlier identical API call in the same
+        account audit or call fetch() and cache the response.
+        Responses are looked up in-process first and then in the
+        cached_data_response table so that separate criterion lambdas
+        processing the same audit share the data.
+        A fresh copy is returned on each call so criteria can safely
+        modify the response.
+        :param fetch: callable making the API call
+        :param service_name: eg ec2
+        :param method_name: eg describe_security_groups
+        :param region: region name or None for global services
+        :param kwargs: any other arguments which change the response
+        :return: the API response
+        """
+        if self.account_audit_id is None:
+            return fetch()
+
+        cache_key = self.get_response_cache_key(
+            service_name, method_name, region, **kwargs
+        )
+        with self.response_cache_lock:
+            encoded = self.get_audit_response_cache().get(cache_key)
+        if encoded is None:
+            encoded = self.read_cached_data_response(cache_key)
+        if encoded is None:
+            response = fetch()
+            try:
+                encoded = self.encode_response(response)
+            except TypeError as err:
+                self.app.log.error("Failed to cache response: " + str(err))
+                return response
+            self.write_cached_data_response(cache_key, method_name, encoded)
+        with self.response_cache_lock:
+            self.get_audit_response_cache()[cache_key] = encoded
+
+        return self.decode_response(encoded)
+
+    def get_audit_response_cache(self):
+        """
+        The caller must hold response_cache_lock
+        """
+        cache = self.response_cache
+        if self.account_audit_id in cache:
+            cache.move_to_end(self.account_audit_id)
+        else:
+            cache[self.account_audit_id] = dict()
+            # drop the least recently used audits
+            while len(cache) > self.max_cached_audits:
+                cache.popitem(last=False)
+        return cache[self.account_audit_id]
+
+    def read_cached_data_response(self, cache_key):
+        # models imports the aws clients so can't be imported at module level
+        from chalicelib import models
+
+        try:
+            cached = models.CachedDataResponse.get_or_none(
+                models.CachedDataResponse.account_audit_id == self.account_audit_id,
+                models.CachedDataResponse.cache_key == cache_key,
+            )
+            encoded = None if cached is None else cached.response
+        except Exception as err:
+            self.app.log.error("Failed to read cached response: " + str(err))
+            encoded = None
+        return encoded
+
+    def write_cached_data_response(self, cache_key, method_name, encoded):
+        from chalicelib import models
+
+        if self.criterion_id is None:
+            return
+        try:
+            models.CachedDataResponse.insert(
+                criterion_id=self.criterion_id,
+                account_audit_id=self.account_audit_id,
+                invoke_class_name=type(self).__name__,
+                invoke_class_get_data_method=method_name,
+                cache_key=cache_key,
+                response=encoded,
+            ).on_conflict_ignore().execute()
+        except Exception as err:
+            self.app.log.error("Failed to write cached response: " + str(err))
+
+    def encode_response(self, response):
+        # tag datetimes so they are restored by decode_response
+        # boto3 returns timezone aware datetimes
+        def encode_type(item):
+            if isinstance(item, datetime):
+                return {"__datetime__": item.strftime(self.datetime_format + "%z")}
+            raise TypeError(f"Cannot cache {type(item).__name__} in API response")
+
+        return json.dumps(response, default=encode_type)
+
+    def decode_response(self, encoded):
+        def decode_type(item):
+            if len(item) == 1 and "__datetime__" in item:
+                value = item["__datetime__"]
+                has_timezone = value[-5] in "+-"
+                date_format = self.datetime_format + ("%z" if has_timezone else "")
+                return datetime.strptime(value, date_format)
+            return item
+
+        return json.loads(encoded, object_hook=decode_type)
+
     def get_chain_role_params(self):
         """
         Retrieve the secrets from SSM.
+        The parameters are cached for all clients in the container
+        They are decrypted so they are only kept in memory
         """
         if self.chain == {}:
             # Only get the SSM params if they're not
             # already populated into self.chain
-            params = {
-                "/csw/chain/account": "account",
-                "/csw/chain/chain_role": "chain_role",
-                "/csw/chain/target_role": "target_role",
-            }
+            self.chain = dict(
+                invariant_cache.get(
+                    self.chain_role_params_cache_key,
+                    self.fetch_chain_role_params,
+                    self.chain_role_params_ttl,
+                    persist=False,
+                )
+                or {}
+            )
 
-            # Get list of SSM parameter names from dict
-            param_list = list(params.keys())
+        return self.chain
 
-            ssm = boto3.client("ssm")
+    def fetch_chain_role_params(self):
+        chain = {}
+        params = {
+            "/csw/chain/account": "account",
+            "/csw/chain/chain_role": "chain_role",
+            "/csw/chain/target_role": "target_role",
+        }
 
-            # Get all listed parameters in one API call
-            response = ssm.get_parameters(Names=param_list, WithDecryption=True)
+        # Get list of SSM parameter names from dict
+        param_list = list(params.keys())
 
-            for item in response["Parameters"]:
-                param_name = params[item["Name"]]
-                param_value = item["Value"]
-                self.chain[param_name] = param_value
+        ssm = boto3.client("ssm")
 
-        return self.chain
+        # Get all listed parameters in one API call
+        response = ssm.get_parameters(Names=param_list, WithDecryption=True)
+
+        for item in response["Parameters"]:
+            param_name = params[item["Name"]]
+            param_value = item["Value"]
+            chain[param_name] = param_value
+
+        # an empty response is not cached
+        return chain or None
+
+    def invalidate_chain_role_params(self):
+        self.chain = {}
+        invariant_cache.invalidate(self.chain_role_params_cache_key)
 
     def to_camel_case(self, source_string, capitalize_first=True):
 
@@ -84,40 +282,31 @@ class GdsAwsClient:
         return f"{session_name}-{region}-{service_name}"
 
     # gets a boto3.client class for the given service, account and role
-    # if the client has already been defined in self.clients it is
-    # reused instead of creating a new instance
+    # clients are reused from the client pool
     def get_boto3_client(self, service_name, account="default", role="", region=None):
 
         session_name = self.get_session_name(account, role)
-        client_name = self.get_client_name(service_name, session_name, region)
-
-        if client_name not in self.clients:
 
-            if session_name == "default":
-                client = self.get_default_client(service_name, region)
-
-            else:
-                client = self.get_assumed_client(service_name, account, role, region)
+        if session_name == "default":
+            client = self.get_default_client(service_name, region)
 
         else:
-            client = self.clients[client_name]
+            client = self.get_assumed_client(service_name, account, role, region)
 
         return client
 
     # gets a boto3.client with the default credentials
     def get_default_client(self, service_name, region=None):
-
-        client_name = self.get_client_name(service_name, "default", region)
-
-        # self.clients[client_name] = boto3.client(service_name) #, **creds)
-        self.clients[client_name] = boto3.client(
-            service_name,
-            aws_access_key_id=os.environ["AWS_ACCESS_KEY_ID"],
-            aws_secret_access_key=os.environ["AWS_SECRET_ACCESS_KEY"],
-            aws_session_token=os.environ["AWS_SESSION_TOKEN"],
-            region_name=region,
+        return self.get_boto3_session_client(
+            service_name, self.get_default_session(), region
         )
-        return self.clients[client_name]
+
+    def get_default_cache_key(self, name):
+        """
+        Scope a cached value to the default credentials so that a value
+        fetched with other credentials sharing CSW_CACHE_PATH isn't used
+        """
+        return f"{name}:{os.environ.get('AWS_ACCESS_KEY_ID', '')}"
 
     def get_default_session(self):
         session = {
@@ -131,31 +320,77 @@ class GdsAwsClient:
     # resulting from sts assume-role command
     def get_assumed_client(self, service_name, account="default", role="", region=None):
 
-        session_name = self.get_session_name(account, role)
-        client_name = self.get_client_name(service_name, session_name)
-
         session = self.get_session(account, role)
-        self.clients[client_name] = boto3.client(
-            service_name,
-            aws_access_key_id=session["AccessKeyId"],
-            aws_secret_access_key=session["SecretAccessKey"],
-            aws_session_token=session["SessionToken"],
-            region_name=region,
-        )
-
-        return self.clients[client_name]
+        return self.get_boto3_session_client(service_name, session, region)
 
     def get_boto3_session_client(self, service_name, session, region=None):
+        """
+        Get a pooled client for the credentials, service and region
+        or create one if there isn't one
+        :param session: credentials dict from assume_role or get_default_session
+        """
+        key = self.client_pool.get_key(session, service_name, region)
+        client = self.client_pool.get(key)
+        if client is not None:
+            return client
+
+        with self.client_lock:
+            client = boto3.client(
+                service_name,
+                aws_access_key_id=session["AccessKeyId"],
+                aws_secret_access_key=session["SecretAccessKey"],
+                aws_session_token=session["SessionToken"],
+                region_name=region,
+                config=botocore.config.Config(
+                    retries={"max_attempts": get_max_attempts()}
+                ),
+            )
+        register_client(client)
+        # assumed sessions record the account they are for
+        account = session.get("Account", session["AccessKeyId"])
+        self.governor.register(client, account)
+
+        return self.client_pool.put(key, client, session.get("Expiration"))
+
+    def paginate(self, client, operation_name, result_key, **kwargs):
+        """
+        Yield the items from every page of a paginated API call
+        Only one page is held in memory at a time
+        :param client: boto3 client
+        :param operation_name: eg "describe_security_groups"
+        :param result_key: the key of the item list in each page
+        :param kwargs: the operation parameters
+        """
+        paginator = client.get_paginator(operation_name)
+        for page in paginator.paginate(**kwargs):
+            yield from page.get(result_key, [])
 
-        client = boto3.client(
-            service_name,
-            aws_access_key_id=session["AccessKeyId"],
-            aws_secret_access_key=session["SecretAccessKey"],
-            aws_session_token=session["SessionToken"],
-            region_name=region,
-        )
-
-        return client
+    def enrich(self, items, fetch, max_workers=None):
+        """
+        Generator of the details fetched for each item
+
+        The fetch calls run on a bounded pool of worker threads and go
+        through the governor like any other call. Items are read in
+        chunks so a paginated generator is only read ahead by one chunk.
+        A failed fetch is logged and yielded as the error so the other
+        items are still enriched.
+        :param items: iterable of items eg: from paginate
+        :param fetch: callable taking an item and returning its details
+        :return: generator of (item, details, error) in item order
+        """
+        executor = BoundedExecutor(max_workers or get_enrich_concurrency())
+        items = iter(items)
+        while True:
+            chunk = list(itertools.islice(items, executor.max_workers * 4))
+            if len(chunk) == 0:
+                break
+            results = executor.map(fetch, chunk)
+            for item, (details, error) in zip(chunk, results):
+                if error is not None:
+                    self.app.log.error(
+                        f"Failed to enrich item: {type(error).__name__}: {error}"
+                    )
+                yield item, details, error
 
     def get_boto3_resource(self, resource_name):
 
@@ -228,7 +463,10 @@ class GdsAwsClient:
                 )
                 self.app.log.debug("Session expiry: " + expiry)
                 # self.app.log.debug('Time now: ' + datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"))
-                self.sessions[session_name] = assumed_credentials["Credentials"]
+                self.credential_cache.put(
+                    session_name,
+                    dict(assumed_credentials["Credentials"], Account=account),
+                )
             else:
                 raise Exception("Assume role failed")
 
@@ -263,37 +501,31 @@ class GdsAwsClient:
 
         return caller_details
 
-    # get_session returns the existing session if it already exists
-    # or assumes the role and returns the new session if it doesn't
+    # get_session returns the existing session if it is still valid
+    # or assumes the role and returns the new session if it isn't
+    # session is the session used to assume the role if it isn't cached
     def get_session(self, account="default", role="", session=None):
 
         try:
             session_name = self.get_session_name(account, role)
-            valid = False
-
-            if session_name in self.sessions.keys():
-                session = self.sessions[session_name]
-                valid = True
-
-                expiry = session["Expiration"].strftime("%Y-%m-%d %H:%M:%S")
-                now = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
-                if expiry < now:
-                    self.sessions[session_name] = None
-                    valid = False
-
-            if not valid:
+            credentials = self.credential_cache.get(session_name)
+            self.record_credential_cache(credentials is not None)
 
+            if credentials is None:
                 assumed = self.assume_role(account, role, session)
                 if not assumed:
                     raise Exception("Assume role failed")
-
-            session = self.sessions[session_name]
+                credentials = self.credential_cache.peek(session_name)
 
         except Exception as exception:
             self.app.log.error(str(exception))
-            session = None
+            credentials = None
 
-        return session
+        return credentials
+
+    def record_credential_cache(self, hit):
+        if self.api_usage is not None:
+            self.api_usage.record_credential_cache(hit)
 
     def assume_chained_role(self, target_account):
         """
@@ -302,19 +534,7 @@ class GdsAwsClient:
         assumes complete successfully
         return: bool
         """
-        assumed = False
-        chain = self.get_chain_role_params()
-        try:
-            chain_assumed = self.assume_role(chain["account"], chain["chain_role"])
-            if chain_assumed:
-                chain_session = self.get_session(chain["account"], chain["chain_role"])
-                assumed = self.assume_role(
-                    target_account, chain["target_role"], session=chain_session
-                )
-        except Exception:
-            self.app.log.error(self.app.utilities.get_typed_exception())
-
-        return assumed
+        return self.get_chained_session(target_account) is not None
 
     def get_chained_session(self, target_account):
         """
@@ -326,12 +546,15 @@ class GdsAwsClient:
         target_session = None
         try:
             chain = self.get_chain_role_params()
-            chain_assumed = self.assume_role(chain["account"], chain["chain_role"])
-            if chain_assumed:
-                chain_session = self.get_session(chain["account"], chain["chain_role"])
+            # both sessions are reused until they are close to expiry
+            chain_session = self.get_session(chain["account"], chain["chain_role"])
+            if chain_session is not None:
                 target_session = self.get_session(
                     target_account, chain["target_role"], session=chain_session
                 )
+            else:
+                # the chain account or role may have changed
+                self.invalidate_chain_role_params()
         except Exception:
             self.app.log.error(self.app.utilities.get_typed_exception())
 
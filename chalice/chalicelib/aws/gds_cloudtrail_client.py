@@ -13,6 +13,8 @@ class GdsCloudtrailClient(GdsAwsClient):
     def describe_trails(self, session):
         """
         """
-        cloudtrail_client = self.get_boto3_session_client("cloudtrail", session)
-        data = cloudtrail_client.describe_trails().get("trailList", [])
-        return data
+        def fetch():
+            cloudtrail_client = self.get_boto3_session_client("cloudtrail", session)
+            return cloudtrail_client.describe_trails().get("trailList", [])
+
+        return self.get_cached_response(fetch, "cloudtrail", "describe_trails")
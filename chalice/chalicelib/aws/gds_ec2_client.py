@@ -2,19 +2,37 @@
 # extends GdsAwsClient
 # implements aws ec2 api queries
 from chalicelib.aws.gds_aws_client import GdsAwsClient
+from chalicelib.ttl_cache import invariant_cache
 
 
 class GdsEc2Client(GdsAwsClient):
 
     resource_type = "AWS::EC2::*"
 
+    regions_cache_key = "ec2:describe_regions"
+    regions_ttl = 86400
+
     def describe_regions(self):
+        """
+        The enabled regions are cached for all clients in the container
+        which use the same credentials
+        """
+        return invariant_cache.get(
+            self.get_default_cache_key(self.regions_cache_key),
+            self.fetch_regions,
+            self.regions_ttl,
+        )
+
+    def fetch_regions(self):
 
         ec2 = self.get_default_client("ec2")
         response = ec2.describe_regions()
 
         return response["Regions"]
 
+    def invalidate_regions(self):
+        invariant_cache.invalidate(self.get_default_cache_key(self.regions_cache_key))
+
     def describe_vpcs(self, session, region_name):
 
         ec2 = self.get_boto3_session_client("ec2", session, region=region_name)
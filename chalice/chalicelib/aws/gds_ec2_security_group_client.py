@@ -12,16 +12,21 @@ class GdsEc2SecurityGroupClient(GdsEc2Client):
 
     def describe_security_groups(self, session, **kwargs):
 
-        # get a boto3 client for the EC2 service in the given region (default to London)
-        ec2 = self.get_boto3_session_client("ec2", session, kwargs["region"])
+        region = kwargs["region"]
 
-        # run describe security groups api call
-        response = ec2.describe_security_groups()
+        def fetch():
+            # get a boto3 client for the EC2 service in the given region (default to London)
+            ec2 = self.get_boto3_session_client("ec2", session, region)
 
-        # return the security groups element of the response
-        security_groups = response["SecurityGroups"]
+            # run describe security groups api call for every page
+            return list(
+                self.paginate(ec2, "describe_security_groups", "SecurityGroups")
+            )
 
-        return security_groups
+        # the security group criteria share the response within an audit
+        return self.get_cached_response(
+            fetch, "ec2", "describe_security_groups", region
+        )
 
     def get_security_group_by_id(self, session, region, id):
         try:
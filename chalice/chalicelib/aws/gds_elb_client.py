@@ -11,22 +11,30 @@ class GdsElbClient(GdsAwsClient):
     """
 
     def get_balancer_list_with_attributes(self, session):
-        balancer_list = self.get_balancer_list(session)
-        for balancer in balancer_list:
-            for kv in self.get_balancer_attributes(
-                session, balancer["LoadBalancerArn"]
-            ):
-                balancer.update({kv["Key"]: kv["Value"]})
+        """
+        Generator of the load balancers with their attributes
+        Load balancers whose attributes can't be fetched are yielded
+        without them so that they are still recorded
+        """
         self.app.log.debug("ELB::get_balancer_list_with_attributes")
-        self.app.log.debug(type(balancer_list))
-        self.app.log.debug(balancer_list)
-        return balancer_list
+        balancers = self.enrich(
+            self.get_balancer_list(session),
+            lambda balancer: self.get_balancer_attributes(
+                session, balancer["LoadBalancerArn"]
+            ),
+        )
+        for balancer, attributes, error in balancers:
+            if error is None:
+                for kv in attributes:
+                    balancer.update({kv["Key"]: kv["Value"]})
+            yield balancer
 
     def get_balancer_list(self, session):
         """
+        Generator of the load balancers on every page
         """
         client = self.get_boto3_session_client("elbv2", session)
-        return client.describe_load_balancers().get("LoadBalancers", [])
+        return self.paginate(client, "describe_load_balancers", "LoadBalancers")
 
     def get_balancer_attributes(self, session, load_balancer_arn):
         """
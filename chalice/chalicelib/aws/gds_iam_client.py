@@ -9,18 +9,18 @@ class GdsIamClient(GdsAwsClient):
     resource_type = "AWS::IAM::*"
 
     def list_users(self, session):
-
+        """
+        Generator of the users on every page
+        """
         iam = self.get_boto3_session_client("iam", session)
-        response = iam.list_users()
-
-        return response["Users"]
+        return self.paginate(iam, "list_users", "Users")
 
     def list_roles(self, session):
-
+        """
+        Generator of the roles on every page
+        """
         iam = self.get_boto3_session_client("iam", session)
-        response = iam.list_roles()
-
-        return response["Roles"]
+        return self.paginate(iam, "list_roles", "Roles")
 
     def list_attached_role_policies(self, session, role_name):
 
@@ -11,24 +11,32 @@ class GdsKmsClient(GdsAwsClient):
     """
 
     def get_key_list_with_details(self, session):
-        keys_list = self.get_key_list(session)
-        for key in keys_list:
-            key.update(self.get_key_rotation_status(session, key["KeyArn"]))
-            key.update(self.get_key_details(session, key["KeyArn"]))
+        """
+        Generator of the keys with their rotation status and details
+        Keys whose details can't be fetched are yielded without them
+        so that they are still recorded
+        """
         self.app.log.debug("KMS::get_key_list_with_details")
-        self.app.log.debug(type(keys_list))
-        self.app.log.debug(keys_list)
-        return keys_list
+        keys = self.enrich(
+            self.get_key_list(session), lambda key: self.get_key_enrichment(session, key)
+        )
+        for key, details, error in keys:
+            if error is None:
+                key.update(details)
+            yield key
+
+    def get_key_enrichment(self, session, key):
+        details = dict(self.get_key_rotation_status(session, key["KeyArn"]))
+        details.update(self.get_key_details(session, key["KeyArn"]))
+        return details
 
     def get_key_list(self, session):
         """
+        Generator of the keys on every page
         """
         kms_client = self.get_boto3_session_client("kms", session)
-        data = kms_client.list_keys().get("Keys", [])
         self.app.log.debug("KMS::get_key_list")
-        self.app.log.debug(type(data))
-        self.app.log.debug(data)
-        return data
+        return self.paginate(kms_client, "list_keys", "Keys")
 
     def get_key_rotation_status(self, session, key_id_or_arn):
         """
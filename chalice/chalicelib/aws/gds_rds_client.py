@@ -12,10 +12,8 @@ class GdsRdsClient(GdsAwsClient):
 
     def describe_db_instances(self, session):
         """
+        Generator of the DB instances on every page
         """
-        kms_client = self.get_boto3_session_client("rds", session)
-        data = kms_client.describe_db_instances().get("DBInstances", [])
+        rds_client = self.get_boto3_session_client("rds", session)
         self.app.log.debug("RDS::describe_db_instances")
-        self.app.log.debug(type(data))
-        self.app.log.debug(data)
-        return data
+        return self.paginate(rds_client, "describe_db_instances", "DBInstances")
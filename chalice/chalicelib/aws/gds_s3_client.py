@@ -10,10 +10,24 @@ class GdsS3Client(GdsAwsClient):
     # list buckets
     def get_bucket_list(self, session):
 
-        s3 = self.get_boto3_session_client("s3", session)
-        response = s3.list_buckets()
-        buckets = response["Buckets"]
-
+        def fetch():
+            s3 = self.get_boto3_session_client("s3", session)
+            response = s3.list_buckets()
+            return response["Buckets"]
+
+        return self.get_cached_response(fetch, "s3", "list_buckets")
+
+    def get_bucket_list_with_details(self, session, key, get_detail):
+        """
+        Get the buckets with a detail fetched concurrently for each bucket
+        :param key: the bucket key to set the detail as
+        :param get_detail: eg: self.get_bucket_versioning
+        :return list: buckets with the detail or None if it failed
+        """
+        buckets = self.get_bucket_list(session)
+        details = self.enrich(buckets, lambda bucket: get_detail(session, bucket["Name"]))
+        for bucket, detail, error in details:
+            bucket[key] = detail
         return buckets
 
     def get_bucket_policy(self, session, bucket_name):
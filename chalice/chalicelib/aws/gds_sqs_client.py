@@ -3,11 +3,21 @@
 # implements aws sqs endpoint queries
 
 import os
+import time
 from chalicelib.aws.gds_aws_client import GdsAwsClient
+from chalicelib.ttl_cache import invariant_cache
 
 
 class GdsSqsClient(GdsAwsClient):
 
+    # SQS send-message-batch limits
+    max_batch_entries = 10
+    max_batch_bytes = 262144
+
+    # the account the queues belong to
+    account_cache_key = "sts:caller_account"
+    account_ttl = 86400
+
     # get-queue-url
     # --queue-name < value >
     def get_queue_url(self, queue_name):
@@ -16,8 +26,11 @@ class GdsSqsClient(GdsAwsClient):
 
             self.app.log.debug("Try getting queue URL for: " + queue_name)
             region = os.environ["CSW_REGION"]
-            caller = self.get_caller_details()
-            account = caller["Account"]
+            account = invariant_cache.get(
+                self.get_default_cache_key(self.account_cache_key),
+                self.fetch_account,
+                self.account_ttl,
+            )
             queue_url = f"https://{region}.queue.amazonaws.com/{account}/{queue_name}"
 
             self.app.log.debug("Queue URL: " + queue_url)
@@ -28,10 +41,18 @@ class GdsSqsClient(GdsAwsClient):
 
         return queue_url
 
+    def fetch_account(self):
+        # get_caller_details returns None if the call fails
+        return self.get_caller_details()["Account"]
+
+    def invalidate_account(self):
+        invariant_cache.invalidate(self.get_default_cache_key(self.account_cache_key))
+
     # send-message
     # --queue-url < value >
     # --message-body < value >
-    def send_message(self, queue_url, body):
+    # [--delay-seconds < value >]
+    def send_message(self, queue_url, body, delay_seconds=0):
 
         try:
 
@@ -39,7 +60,12 @@ class GdsSqsClient(GdsAwsClient):
 
             sqs = self.get_default_client("sqs", region)
 
-            response = sqs.send_message(QueueUrl=queue_url, MessageBody=body)
+            message = {"QueueUrl": queue_url, "MessageBody": body}
+            # only override the queue's default delay if requested
+            if delay_seconds > 0:
+                message["DelaySeconds"] = min(int(delay_seconds), 900)
+
+            response = sqs.send_message(**message)
 
             message_id = response["MessageId"]
         except Exception as err:
@@ -47,3 +73,114 @@ class GdsSqsClient(GdsAwsClient):
             message_id = None
 
         return message_id
+
+    # send-message-batch
+    # --queue-url < value >
+    # --entries < value >
+    def send_message_batch(self, queue_url, bodies, delay_seconds=0, retries=3):
+        """
+        Send messages in batches of up to 10 retrying only the entries which
+        fail with a server side error
+        :param queue_url: str
+        :param bodies: list of message bodies
+        :param delay_seconds: optional delay applied to every message
+        :param retries: times to retry the failed entries
+        :return list: the message ids in the order of bodies or None for
+            messages which could not be sent
+        """
+        message_ids = [None] * len(bodies)
+        try:
+            region = os.environ["CSW_REGION"]
+            sqs = self.get_default_client("sqs", region)
+        except Exception as err:
+            self.app.log.error("Failed to create SQS client: " + str(err))
+            return message_ids
+
+        pending = list(range(len(bodies)))
+        attempt = 0
+        while pending and attempt <= retries:
+            if attempt > 0:
+                time.sleep(0.1 * 2 ** attempt)
+            failed = []
+            for batch in self.get_message_batches(bodies, pending):
+                entries = []
+                for index in batch:
+                    entry = {"Id": str(index), "MessageBody": bodies[index]}
+                    if delay_seconds > 0:
+                        entry["DelaySeconds"] = min(int(delay_seconds), 900)
+                    entries.append(entry)
+                try:
+                    response = sqs.send_message_batch(QueueUrl=queue_url, Entries=entries)
+                except Exception as err:
+                    self.app.log.error("Failed to send SQS message batch: " + str(err))
+                    failed.extend(batch)
+                    continue
+                for sent in response.get("Successful", []):
+                    message_ids[int(sent["Id"])] = sent["MessageId"]
+                for failure in response.get("Failed", []):
+                    self.app.log.error(
+                        f"Failed to send SQS message: {failure.get('Code')} {failure.get('Message')}"
+                    )
+                    # sender faults such as an invalid message won't succeed on retry
+                    if not failure.get("SenderFault", False):
+                        failed.append(int(failure["Id"]))
+            pending = failed
+            attempt += 1
+
+        return message_ids
+
+    def get_message_batches(self, bodies, indexes):
+        """
+        Group the message indexes into batches within the SQS
+        entry count and payload size limits
+        """
+        batch = []
+        batch_bytes = 0
+        for index in indexes:
+            size = len(bodies[index].encode("utf-8"))
+            full = len(batch) == self.max_batch_entries
+            too_big = batch_bytes + size > self.max_batch_bytes
+            if batch and (full or too_big):
+                yield batch
+                batch = []
+                batch_bytes = 0
+            batch.append(index)
+            batch_bytes += size
+        if batch:
+            yield batch
+
+    # delete-message-batch
+    # --queue-url < value >
+    # --entries < value >
+    def delete_message_batch(self, queue_url, receipt_handles):
+        """
+        Delete processed messages in batches of up to 10
+        :param receipt_handles: list of receipt handles
+        :return list: the receipt handles which could not be deleted
+        """
+        failed = []
+        try:
+            region = os.environ["CSW_REGION"]
+            sqs = self.get_default_client("sqs", region)
+        except Exception as err:
+            self.app.log.error("Failed to create SQS client: " + str(err))
+            return list(receipt_handles)
+
+        for start in range(0, len(receipt_handles), self.max_batch_entries):
+            batch = receipt_handles[start:start + self.max_batch_entries]
+            entries = [
+                {"Id": str(index), "ReceiptHandle": receipt_handle}
+                for index, receipt_handle in enumerate(batch)
+            ]
+            try:
+                response = sqs.delete_message_batch(QueueUrl=queue_url, Entries=entries)
+            except Exception as err:
+                self.app.log.error("Failed to delete SQS message batch: " + str(err))
+                failed.extend(batch)
+                continue
+            for failure in response.get("Failed", []):
+                self.app.log.error(
+                    f"Failed to delete SQS message: {failure.get('Code')} {failure.get('Message')}"
+                )
+                failed.append(batch[int(failure["Id"])])
+        return failed
@@ -44,6 +44,45 @@ class GdsSupportClient(GdsAwsClient):
         result = response["status"]
         return result
 
+    def refresh_checks(self, session, check_ids):
+        """
+        Request a refresh of each check without waiting for the result
+        Some checks are refreshed automatically by AWS and can't be
+        refreshed on request so they are left out of the response
+        :return dict: {check_id: refresh status}
+        """
+        statuses = {}
+        for check_id in check_ids:
+            try:
+                statuses[check_id] = self.refresh_trusted_advisor_check(
+                    session, checkId=check_id
+                )
+            except Exception as err:
+                self.app.log.debug(f"Check {check_id} could not be refreshed: {err}")
+        return statuses
+
+    def describe_trusted_advisor_check_refresh_statuses(self, session, check_ids):
+        """
+        Get the refresh status of a list of refreshable checks in one call
+        :return dict: {check_id: refresh status}
+        """
+        support = self.get_boto3_session_client("support", session, "us-east-1")
+        response = support.describe_trusted_advisor_check_refresh_statuses(
+            checkIds=check_ids
+        )
+        return {status["checkId"]: status for status in response["statuses"]}
+
+    def describe_trusted_advisor_check_summaries(self, session, check_ids):
+        """
+        Get the summary of the latest results of a list of checks in one call
+        :return dict: {check_id: summary}
+        """
+        support = self.get_boto3_session_client("support", session, "us-east-1")
+        response = support.describe_trusted_advisor_check_summaries(
+            checkIds=check_ids
+        )
+        return {summary["checkId"]: summary for summary in response["summaries"]}
+
     def refresh_check_with_wait(self, session, check_id):
         updated = False
         try:
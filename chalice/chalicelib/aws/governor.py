@@ -0,0 +1,203 @@
+"""
+Pace the AWS API calls made by every client in the process
+
+The governor is registered on the botocore event system of each boto3
+client (see GdsAwsClient.get_boto3_session_client) so every attempt,
+including botocore's own retries, goes through it.
+
+- Each (account, service, region) has a token bucket. The rate is
+  halved when a call is throttled and increased a little after each
+  call which isn't, so calls run as fast as AWS allows.
+- After a throttle the next attempts also wait a random (jittered)
+  backoff which doubles with each consecutive throttle.
+- CSW_AWS_MAX_CONCURRENCY caps the requests in flight across all
+  clients. The permit is taken before each attempt and released after
+  it, or when the call ends if an error skipped the release.
+
+The time spent waiting is counted against the criterion making the
+call by the ApiUsageRecorder current on the calling thread.
+"""
+import functools
+import os
+import random
+import threading
+from time import monotonic, perf_counter, sleep
+
+from chalicelib.aws.api_usage import get_current_recorder, is_throttled
+
+
+def get_max_concurrency():
+    return int(os.environ.get("CSW_AWS_MAX_CONCURRENCY", 16))
+
+
+def get_initial_rate():
+    """
+    Calls per second per (account, service, region) before any throttling
+    """
+    return float(os.environ.get("CSW_AWS_RATE", 20))
+
+
+def get_max_attempts():
+    """
+    Passed to botocore as retries.max_attempts
+    """
+    return int(os.environ.get("CSW_AWS_MAX_ATTEMPTS", 8))
+
+
+class TokenBucket:
+
+    min_rate = 0.5
+    rate_increase = 0.5
+    base_backoff = 0.1
+    max_backoff = 20
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.max_rate = rate
+        self.tokens = rate
+        self.updated = monotonic()
+        self.backoff = 0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Take a token without blocking
+        :return float: seconds to wait before using the token
+        """
+        with self.lock:
+            now = monotonic()
+            self.tokens = min(
+                self.rate, self.tokens + (now - self.updated) * self.rate
+            )
+            self.updated = now
+            # tokens can go negative, reserving the next ones
+            self.tokens -= 1
+            wait = 0 if self.tokens >= 0 else -self.tokens / self.rate
+            if self.backoff > 0:
+                wait += random.uniform(0, self.backoff)
+            return wait
+
+    def throttled(self):
+        with self.lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = min(self.tokens, 0)
+            self.backoff = min(
+                self.max_backoff, max(self.base_backoff, self.backoff * 2)
+            )
+
+    def succeeded(self):
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.rate_increase)
+            self.backoff = 0
+
+
+class ApiGovernor:
+    def __init__(self, max_concurrency=None, rate=None):
+        self.semaphore = threading.Semaphore(max_concurrency or get_max_concurrency())
+        self.rate = rate
+        # {(account, service, region): TokenBucket}
+        self.buckets = dict()
+        # {(account, service, region): {attempts, throttles, waits, wait_ms}}
+        self.metrics = dict()
+        self.lock = threading.Lock()
+        # whether the current thread holds the semaphore
+        self.local = threading.local()
+
+    def register(self, client, account):
+        """
+        :param client: boto3 client
+        :param account: the account id or access key id of the credentials
+        """
+        key = (account, client.meta.service_model.service_name, client.meta.region_name)
+        events = client.meta.events
+        events.register(
+            "before-send",
+            functools.partial(self.before_send, key),
+            unique_id=f"governor-before-{id(self)}",
+        )
+        events.register(
+            "needs-retry",
+            functools.partial(self.needs_retry, key),
+            unique_id=f"governor-retry-{id(self)}",
+        )
+        # emitted once the call returns or raises so a permit is
+        # never held after the call if an error skipped needs-retry
+        events.register(
+            "after-call", self.release, unique_id=f"governor-after-{id(self)}"
+        )
+        events.register(
+            "after-call-error",
+            self.release,
+            unique_id=f"governor-after-error-{id(self)}",
+        )
+
+    def get_bucket(self, key):
+        with self.lock:
+            if key not in self.buckets:
+                self.buckets[key] = TokenBucket(self.rate or get_initial_rate())
+                self.metrics[key] = {
+                    "attempts": 0,
+                    "throttles": 0,
+                    "waits": 0,
+                    "wait_ms": 0,
+                }
+            return self.buckets[key]
+
+    def before_send(self, key, event_name=None, **kwargs):
+        started = perf_counter()
+        wait = self.get_bucket(key).acquire()
+        if wait > 0:
+            sleep(wait)
+        self.semaphore.acquire()
+        self.local.acquired = True
+        wait_ms = int((perf_counter() - started) * 1000)
+        with self.lock:
+            metrics = self.metrics[key]
+            metrics["attempts"] += 1
+            if wait_ms > 0:
+                metrics["waits"] += 1
+                metrics["wait_ms"] += wait_ms
+        api_usage = get_current_recorder()
+        if api_usage is not None and wait_ms > 0 and event_name:
+            account, service, region = key
+            # before-send.{service_id}.{operation}
+            operation = event_name.split(".")[-1]
+            api_usage.record_wait(region, service, operation, wait_ms)
+
+    def release(self, **kwargs):
+        """
+        Release the current thread's permit if it still holds it
+        """
+        if getattr(self.local, "acquired", False):
+            self.local.acquired = False
+            self.semaphore.release()
+
+    def needs_retry(self, key, response=None, **kwargs):
+        # called after every attempt with (http_response, parsed)
+        # or None if the request raised an exception
+        self.release()
+        if response is None:
+            return
+        bucket = self.get_bucket(key)
+        if is_throttled(*response):
+            bucket.throttled()
+            with self.lock:
+                self.metrics[key]["throttles"] += 1
+        else:
+            bucket.succeeded()
+
+    def get_metrics(self):
+        """
+        :return list: [{account, service, region, rate, attempts, ...}]
+        """
+        with self.lock:
+            return [
+                dict(
+                    metrics,
+                    account=account,
+                    service=service,
+                    region=region,
+                    rate=self.buckets[(account, service, region)].rate,
+                )
+                for (account, service, region), metrics in self.metrics.items()
+            ]
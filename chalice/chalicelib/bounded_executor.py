@@ -0,0 +1,51 @@
+"""
+Run a function across a list of items on a bounded thread pool.
+
+Results are returned in the order of the items regardless of the order
+in which the calls complete so they can be fed into the sequential
+parts of the audit (evaluate, persist, summarize) unchanged.
+
+Exceptions matching catch are returned alongside the item so that one
+failed call does not abort the rest of the batch. Any other exception
+is re-raised once every call has completed.
+
+The worker threads count their AWS calls against the API usage
+recorder of the thread which called map.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from chalicelib.aws.api_usage import get_current_recorder, recording
+
+
+class BoundedExecutor:
+    def __init__(self, max_workers=4):
+        self.max_workers = max(1, int(max_workers))
+
+    def map(self, func, items, catch=(Exception,)):
+        """
+        Call func(item) for each item
+        :param func: callable taking a single item
+        :param items: list of items
+        :param catch: tuple of exception types to collect rather than raise
+        :return: list of (result, error) tuples in item order
+        """
+        items = list(items)
+        if self.max_workers == 1 or len(items) <= 1:
+            return [self.call(func, item, catch) for item in items]
+
+        workers = min(self.max_workers, len(items))
+        recorder = get_current_recorder()
+
+        def call(item):
+            with recording(recorder):
+                return self.call(func, item, catch)
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(call, item) for item in items]
+            return [future.result() for future in futures]
+
+    def call(self, func, item, catch):
+        try:
+            return func(item), None
+        except catch as error:
+            return None, error
@@ -0,0 +1,104 @@
+"""
+Claim-check storage for SQS payloads which may exceed the 256KB limit.
+
+The payload is written to a blob store and only the reference is sent
+on the queue. The consumer reads the payload back with get.
+
+In AWS the store is the S3 bucket named by CSW_CLAIM_CHECK_BUCKET.
+CSW_CLAIM_CHECK_PATH selects a local directory instead (for tests and
+local development). If neither is set payloads are always sent inline.
+"""
+import os
+
+from chalicelib.aws.gds_aws_client import GdsAwsClient
+
+
+def get_claim_check_threshold():
+    """
+    Payloads larger than this many bytes are sent by reference
+    """
+    return int(os.environ.get("CSW_CLAIM_CHECK_THRESHOLD", 200000))
+
+
+def get_claim_check_store(app):
+    if os.environ.get("CSW_CLAIM_CHECK_PATH"):
+        return LocalClaimCheckStore(app, os.environ["CSW_CLAIM_CHECK_PATH"])
+    if os.environ.get("CSW_CLAIM_CHECK_BUCKET"):
+        return S3ClaimCheckStore(app, os.environ["CSW_CLAIM_CHECK_BUCKET"])
+    return None
+
+
+def check_in(store, key, body, threshold=None):
+    """
+    Store body if it is too large to send inline
+    :param store: ClaimCheckStore or None
+    :param key: the name to store the payload under
+    :param body: the JSON encoded payload
+    :return str|None: the reference or None if the body should be sent inline
+    """
+    if threshold is None:
+        threshold = get_claim_check_threshold()
+    if store is None or len(body.encode("utf-8")) <= threshold:
+        return None
+    try:
+        reference = store.put(key, body)
+    except Exception:
+        # fall back to sending the payload inline as before
+        store.app.log.error(store.app.utilities.get_typed_exception())
+        reference = None
+    return reference
+
+
+class ClaimCheckStore:
+    scheme = None
+
+    def __init__(self, app, location):
+        self.app = app
+        self.location = location
+
+    def put(self, key, body):
+        """
+        :return str: the reference to send on the queue
+        """
+        raise NotImplementedError
+
+    def get(self, reference):
+        raise NotImplementedError
+
+    def parse_reference(self, reference):
+        prefix = f"{self.scheme}://"
+        if not reference.startswith(prefix):
+            raise ValueError(f"Not a {self.scheme} claim check: {reference}")
+        return reference[len(prefix):]
+
+
+class S3ClaimCheckStore(ClaimCheckStore):
+    scheme = "s3"
+
+    def get_client(self):
+        return GdsAwsClient(self.app).get_default_client(
+            "s3", os.environ.get("CSW_REGION")
+        )
+
+    def put(self, key, body):
+        self.get_client().put_object(
+            Bucket=self.location, Key=key, Body=body.encode("utf-8")
+        )
+        return f"s3://{self.location}/{key}"
+
+    def get(self, reference):
+        bucket, key = self.parse_reference(reference).split("/", 1)
+        response = self.get_client().get_object(Bucket=bucket, Key=key)
+        return response["Body"].read().decode("utf-8")
+
+
+class LocalClaimCheckStore(ClaimCheckStore):
+    scheme = "file"
+
+    def put(self, key, body):
+        path = os.path.join(self.location, key)
+        self.app.utilities.write_file(path, body)
+        return f"file://{path}"
+
+    def get(self, reference):
+        return self.app.utilities.read_file(self.parse_reference(reference))
@@ -9,6 +9,7 @@ class CloudTrailFileValidation(CriteriaDefault):
     active = True
     severity = 3
     ClientClass = GdsCloudtrailClient
+    data_source = "cloudtrail.describe_trails"
     is_regional = False
     resource_type = "AWS::CLOUDTRAIL:LOG_VALIDATION"
     title = "Cloud Trail: Log File Validation"
@@ -11,6 +11,7 @@ class MultiregionalCloudtrail(CriteriaDefault):
     active = True
     severity = 2
     ClientClass = GdsCloudtrailClient
+    data_source = "cloudtrail.describe_trails"
     is_regional = False
     resource_type = "AWS::CLOUDTRAIL:MULTIREGIONAL"
     title = "Cloud Trail: Multi-regional"
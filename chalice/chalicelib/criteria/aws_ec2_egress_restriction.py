@@ -10,6 +10,7 @@ class UnrestrictedEgressSecurityGroups(CriteriaDefault):
 
     active = True
     severity = 3
+    data_source = "ec2.describe_security_groups"
 
     def __init__(self, app):
         self.ClientClass = GdsEc2SecurityGroupClient
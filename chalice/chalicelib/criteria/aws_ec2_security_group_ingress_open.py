@@ -10,6 +10,7 @@ class AwsEc2SecurityGroupIngressOpen(CriteriaDefault):
     active = True
 
     ClientClass = GdsEc2SecurityGroupClient
+    data_source = "ec2.describe_security_groups"
 
     resource_type = "AWS::EC2::SecurityGroup"
 
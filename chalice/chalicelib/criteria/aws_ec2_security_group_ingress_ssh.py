@@ -13,6 +13,7 @@ class AwsEc2SecurityGroupIngressSsh(CriteriaDefault):
     severity = 3
 
     ClientClass = GdsEc2SecurityGroupClient
+    data_source = "ec2.describe_security_groups"
     AllowlistClass = AccountSshCidrAllowlist
 
     resource_type = "AWS::EC2::SecurityGroup"
@@ -56,13 +57,16 @@ class AwsEc2SecurityGroupIngressSsh(CriteriaDefault):
 
         return item
 
-    def evaluate(self, event, item, whitelist=[]):
+    def evaluate_item(self, item, context=None):
 
+        context = context or {}
         self.app.log.debug("Evaluating compliance")
-        self.annotation = ""
+        annotations = []
 
         has_relevant_rule = False
         is_compliant = True
+        # load the allow list once per item rather than once per cidr
+        valid_ranges = None
         if "IpPermissions" in item:
             for ingress_rule in item["IpPermissions"]:
 
@@ -72,8 +76,13 @@ class AwsEc2SecurityGroupIngressSsh(CriteriaDefault):
                 if self.rule_applies_to_ssh(ingress_rule):
                     self.app.log.debug("Applies to SSH")
                     has_relevant_rule = True
-                    rule_is_compliant = self.rule_is_compliant(ingress_rule)
-                    is_compliant &= rule_is_compliant
+                    if valid_ranges is None:
+                        valid_ranges = self.get_valid_ranges()
+                    invalid_cidrs = self.get_invalid_cidrs(ingress_rule, valid_ranges)
+                    is_compliant &= len(invalid_cidrs) == 0
+                    annotations.extend(
+                        f"The IP range {cidr} is not valid. " for cidr in invalid_cidrs
+                    )
 
         if has_relevant_rule:
             if is_compliant:
@@ -82,10 +91,14 @@ class AwsEc2SecurityGroupIngressSsh(CriteriaDefault):
                 compliance_type = "NON_COMPLIANT"
         else:
             compliance_type = "NOT_APPLICABLE"
-            self.annotation = "This group does not contain rules applying to SSH"
+            annotations = ["This group does not contain rules applying to SSH"]
 
         evaluation = self.build_evaluation(
-            item["GroupId"], compliance_type, event, self.resource_type, self.annotation
+            item["GroupId"],
+            compliance_type,
+            context.get("event", {}),
+            self.resource_type,
+            "<br/>".join(annotations),
         )
 
         # apply filter to mark default security groups as compliant by exception
@@ -144,16 +157,16 @@ class AwsEc2SecurityGroupIngressSsh(CriteriaDefault):
 
     def rule_is_compliant(self, rule):
 
-        compliant = True
+        return len(self.get_invalid_cidrs(rule, self.get_valid_ranges())) == 0
 
-        annotations = []
+    def get_invalid_cidrs(self, rule, valid_ranges):
+
+        invalid_cidrs = []
 
         for ip_range in rule["IpRanges"]:
 
             cidr = ip_range["CidrIp"]
 
-            valid_ranges = self.get_valid_ranges()
-
             cidr_is_valid = False
 
             if cidr in valid_ranges:
@@ -179,16 +192,11 @@ class AwsEc2SecurityGroupIngressSsh(CriteriaDefault):
                         cidr_is_valid = True
                         break
 
-            compliant &= cidr_is_valid
-
             if not cidr_is_valid:
-                annotations.append(f"The IP range {cidr} is not valid. ")
+                invalid_cidrs.append(cidr)
                 self.app.log.debug(f"The IP range {cidr} is not valid. ")
 
-            if len(annotations) > 0:
-                self.annotation = "<br/>".join(annotations)
-
-        return compliant
+        return invalid_cidrs
 
     def rule_applies_to_ssh(self, rule):
 
@@ -40,7 +40,12 @@ class ElbLogging(CriteriaDefault):
         }
 
     def evaluate(self, event, item, whitelist=[]):
-        if item["access_logs.s3.enabled"] == "true":
+        if "access_logs.s3.enabled" not in item:
+            # the call to get the load balancer attributes failed
+            # so the load balancer is ignored rather than passed or failed
+            compliance_type = "NOT_APPLICABLE"
+            self.annotation = "Unable to retrieve the logging status of this load balancer."
+        elif item["access_logs.s3.enabled"] == "true":
             compliance_type = "COMPLIANT"
             self.annotation = ""
         else:
@@ -55,11 +55,9 @@ class ManagedCmkRotation(CriteriaDefault):
         super(ManagedCmkRotation, self).__init__(app)
 
     def get_data(self, session, **kwargs):
-        try:
-            return self.client.get_key_list_with_details(session)
-        except Exception:
-            self.app.log.error(self.app.utilities.get_typed_exception())
-            return []
+        # the keys are fetched as the generator is iterated
+        # errors on later pages propagate so the criterion isn't processed
+        return self.client.get_key_list_with_details(session)
 
     def translate(self, data={}):
         return {
@@ -71,7 +69,12 @@ class ManagedCmkRotation(CriteriaDefault):
     def evaluate(self, event, item, whitelist=[]):
         compliance_type = "NON_COMPLIANT"
         self.annotation = f'The CMK "{item["KeyArn"]}" is non-rotating, enabled and not scheduled for deletion.'
-        if item["KeyRotationEnabled"] or not item["Enabled"] or "DeletionDate" in item:
+        if "KeyRotationEnabled" not in item or "Enabled" not in item:
+            # the call to get the rotation status or details failed
+            # so the key is ignored rather than passed or failed
+            compliance_type = "NOT_APPLICABLE"
+            self.annotation = f'Unable to retrieve the rotation status of the CMK "{item["KeyArn"]}".'
+        elif item["KeyRotationEnabled"] or not item["Enabled"] or "DeletionDate" in item:
             compliance_type = "COMPLIANT"
             self.annotation = ""
         return self.build_evaluation(
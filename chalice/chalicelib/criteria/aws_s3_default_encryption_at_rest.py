@@ -34,13 +34,10 @@ class AwsS3DefaultEncryptionAtRest(CriteriaDefault):
 
     def get_data(self, session, **kwargs):
         self.app.log.debug("Getting a list of buckets in this account")
-        buckets = self.client.get_bucket_list(session)
         self.app.log.debug("Adding an 'Encryption' key to these buckets")
-        for bucket in buckets:
-            bucket["Encryption"] = self.client.get_bucket_encryption(
-                session, bucket["Name"]
-            )
-        return buckets
+        return self.client.get_bucket_list_with_details(
+            session, "Encryption", self.client.get_bucket_encryption
+        )
 
     def translate(self, data):
 
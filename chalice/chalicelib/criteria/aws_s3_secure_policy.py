@@ -47,9 +47,12 @@ class AwsS3SecurePolicy(CriteriaDefault):
 
     def get_data(self, session, **kwargs):
         """Request buckets and policies from AWS API."""
-        buckets = self.client.get_bucket_list(session)
+        buckets = self.client.get_bucket_list_with_details(
+            session, "Policy", self.client.get_bucket_policy
+        )
         for bucket in buckets:
-            policy = self.client.get_bucket_policy(session, bucket["Name"])
+            # only attach policies which parse
+            policy = bucket.pop("Policy")
             try:
                 bucket["Policy"] = json.loads(policy)
             except (TypeError, json.decoder.JSONDecodeError):
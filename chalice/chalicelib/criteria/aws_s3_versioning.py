@@ -36,14 +36,9 @@ class AwsS3Versioning(CriteriaDefault):
 
     def get_data(self, session, **kwargs):
         self.app.log.debug("Getting a list of buckets")
-        buckets = self.client.get_bucket_list(session)
-        for bucket in buckets:
-            # Mutating items as I'm iterating over them again... Sorry
-            bucket["Versioning"] = self.client.get_bucket_versioning(
-                session, bucket["Name"]
-            )
-
-        return buckets
+        return self.client.get_bucket_list_with_details(
+            session, "Versioning", self.client.get_bucket_versioning
+        )
 
     def translate(self, data):
         item = {
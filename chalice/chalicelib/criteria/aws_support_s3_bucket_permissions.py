@@ -64,23 +64,23 @@ class S3BucketReadAll(S3BucketPermissions):
         )
         super(S3BucketReadAll, self).__init__(app)
 
-    def evaluate(self, event, item, whitelist=[]):
+    def evaluate_item(self, item, context=None):
+        context = context or {}
         compliance_type = "NON_COMPLIANT"
+        annotation = ""
         if item["metadata"][3] == "Yes":
-            self.annotation = (
+            annotation = (
                 f'Bucket "{item["metadata"][2]}" in region "{item["metadata"][0]}" policy allows "everyone" '
                 f'or "any authenticated AWS user" to list its contents.'
             )
         else:
             compliance_type = "COMPLIANT"
-            # Remove any previous annotation if instance is reused
-            self.annotation = ""
         return self.build_evaluation(
             item["resourceId"],
             compliance_type,
-            event,
+            context.get("event", {}),
             self.resource_type,
-            self.annotation,
+            annotation,
         )
 
 
@@ -107,10 +107,12 @@ class S3BucketOpenAccess(S3BucketPermissions):
         )
         super(S3BucketOpenAccess, self).__init__(app)
 
-    def evaluate(self, event, item, whitelist=[]):
+    def evaluate_item(self, item, context=None):
+        context = context or {}
         compliance_type = "NON_COMPLIANT"
+        annotation = ""
         if item["metadata"][6] == "Yes":
-            self.annotation = (
+            annotation = (
                 "The bucket ACL Everyone <strong>List objects</strong> permission is enabled."
             )
         else:
@@ -118,9 +120,9 @@ class S3BucketOpenAccess(S3BucketPermissions):
         return self.build_evaluation(
             item["resourceId"],
             compliance_type,
-            event,
+            context.get("event", {}),
             self.resource_type,
-            self.annotation,
+            annotation,
         )
 
 
@@ -150,10 +152,12 @@ class S3BucketWriteAll(S3BucketPermissions):
         )
         super(S3BucketWriteAll, self).__init__(app)
 
-    def evaluate(self, event, item, whitelist=[]):
+    def evaluate_item(self, item, context=None):
+        context = context or {}
         compliance_type = "NON_COMPLIANT"
+        annotation = ""
         if item["metadata"][4] == "Yes":
-            self.annotation = (
+            annotation = (
                 "The bucket ACL Everyone <strong>Write objects</strong> permission is enabled."
             )
         else:
@@ -161,7 +165,7 @@ class S3BucketWriteAll(S3BucketPermissions):
         return self.build_evaluation(
             item["resourceId"],
             compliance_type,
-            event,
+            context.get("event", {}),
             self.resource_type,
-            self.annotation,
+            annotation,
         )
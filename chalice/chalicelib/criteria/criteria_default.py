@@ -1,7 +1,10 @@
+import copy
+import hashlib
 import json
 from datetime import datetime
 
 from chalicelib.aws.gds_aws_client import GdsAwsClient
+from chalicelib.bounded_executor import BoundedExecutor
 from chalicelib.aws.gds_support_client import GdsSupportClient
 
 
@@ -33,6 +36,22 @@ class CriteriaDefault:
     """
     aggregation_type = "all"
 
+    """
+    data_source = None | "{service}.{method}"
+    Criteria with the same data_source must return the same data from
+    get_data so that, with CSW_GROUPED_CRITERIA enabled, they can be
+    evaluated as one work unit which calls get_data once per region.
+    Leave as None if get_data enriches or filters the response.
+    """
+    data_source = None
+
+    """
+    version is included in the resource hash so increment it whenever
+    evaluate changes to stop previous results being reused for
+    unchanged resources
+    """
+    version = 1
+
     # Set default account_subscription_id which should be set in the
     # audit lambda by calling the set_account_subscription_id() method
     account_subscription_id = None
@@ -59,6 +78,12 @@ class CriteriaDefault:
     def get_chained_session(self, target_account):
         return self.client.get_chained_session(target_account)
 
+    def set_response_cache_context(self, account_audit_id, criterion_id=None):
+        self.client.set_response_cache_context(account_audit_id, criterion_id)
+
+    def set_api_usage(self, recorder):
+        self.client.set_api_usage(recorder)
+
     def get_aggregation_type(self):
         return self.aggregation_type
 
@@ -73,6 +98,56 @@ class CriteriaDefault:
     def get_data(self, session, **kwargs):
         return []
 
+    def evaluate_item(self, item, context=None):
+        """
+        Evaluate a single item returned by get_data
+
+        This is a pure function of (item, context) returning the
+        compliance evaluation with its annotation. It must not write
+        to the criterion so one instance can evaluate items in parallel.
+
+        Criteria which still implement evaluate(event, item, whitelist)
+        and set self.annotation are adapted by running evaluate on a
+        copy of the criterion.
+        :param item: an item returned by get_data
+        :param context: dict with optional "event" and "whitelist" keys
+        :return dict: the evaluation returned by build_evaluation
+        """
+        if type(self).evaluate is CriteriaDefault.evaluate:
+            raise NotImplementedError(
+                f"{type(self).__name__} must implement evaluate_item"
+            )
+        context = context or {}
+        legacy = copy.copy(self)
+        return legacy.evaluate(
+            context.get("event", {}), item, context.get("whitelist", [])
+        )
+
+    def evaluate(self, event, item, whitelist=[]):
+        """
+        Legacy evaluation contract for criteria implementing evaluate_item
+        Sets self.annotation for callers which read it after evaluating
+        """
+        evaluation = self.evaluate_item(
+            item, {"event": event, "whitelist": whitelist}
+        )
+        self.annotation = evaluation.get("annotation", "")
+        return evaluation
+
+    def evaluate_batch(self, items, context=None, max_workers=1):
+        """
+        Evaluate a list of items on a bounded pool of worker threads
+        :param items: list of items returned by get_data
+        :param context: passed to evaluate_item for every item
+        :param max_workers: the maximum number of concurrent evaluations
+        :return list: the evaluations in item order
+        """
+        executor = BoundedExecutor(max_workers)
+        results = executor.map(
+            lambda item: self.evaluate_item(item, context), items, catch=()
+        )
+        return [evaluation for evaluation, error in results]
+
     def get_resource_persistent_id(self, item, audit):
         """
         The resource_identifier needs to be something which will
@@ -172,11 +247,12 @@ class CriteriaDefault:
 
     def summarize(self, resources, summary=None):
 
-        regions = []
-
         if summary is None:
             summary = self.empty_summary()
 
+        # carry the regions over when summarizing page by page
+        regions = summary["regions"]["list"]
+
         for resource in resources:
 
             has_region = "region" in resource
@@ -233,6 +309,7 @@ class CriteriaDefault:
         item = self.translate(api_item)
         # store original API resource data
         item["resource_data"] = self.app.utilities.to_json(api_item)
+        item["resource_hash"] = self.get_resource_hash(api_item)
 
         # populate foreign keys
         item["account_audit_id"] = audit
@@ -254,6 +331,18 @@ class CriteriaDefault:
 
         return item
 
+    def get_resource_hash(self, api_item):
+        """
+        A stable hash of the resource data and criterion version
+        Keys are sorted so the hash doesn't depend on the API key order
+        """
+        canonical = json.dumps(
+            {"criterion": type(self).__name__, "version": self.version, "data": api_item},
+            sort_keys=True,
+            default=self.app.utilities.to_json_type_convert,
+        )
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
     def set_account_subscription_id(self, account_subscription_id):
         self.account_subscription_id = account_subscription_id
 
@@ -266,6 +355,10 @@ class TrustedAdvisorCriterion(CriteriaDefault):
     ResourceClientClass = GdsAwsClient
     check_id = ""
 
+    # set when the refresh is orchestrated by chalicelib.trusted_advisor
+    # {"refreshed": bool, "flagged": int|None}
+    trusted_advisor_summary = None
+
     def __init__(self, app):
         # attributes to overwrite in subclasses
         self.status_string = ""
@@ -280,16 +373,47 @@ class TrustedAdvisorCriterion(CriteriaDefault):
         self.resource_client = self.ResourceClientClass(app)
 
     def get_data(self, session, **kwargs):
-        updated = self.client.refresh_check_with_wait(session, self.check_id)
+        """
+        Criteria sharing a check_id share one refreshed and enriched
+        TA result per audit through the client response cache.
+        The enrichment is part of the key in case a subclass
+        overrides get_resource_data.
+        """
+        enrichment = type(self).get_resource_data.__qualname__
+        return self.client.get_cached_response(
+            lambda: self.get_check_data(session),
+            "support",
+            "describe_trusted_advisor_check_result",
+            self.region,
+            checkId=self.check_id,
+            language=self.language,
+            enrichment=enrichment,
+        )
+
+    def set_trusted_advisor_summary(self, summary):
+        self.trusted_advisor_summary = summary
+
+    def get_check_data(self, session):
+        summary = self.trusted_advisor_summary
+        if summary is None:
+            self.client.refresh_check_with_wait(session, self.check_id)
+        elif summary.get("flagged") == 0:
+            # nothing flagged so there's no need to fetch the full result
+            return []
 
         output = self.client.describe_trusted_advisor_check_result(
             session, checkId=self.check_id, language=self.language
         )
         # if the TA results does not contain the key flaggedResources, add it with an empty list for its value
         flagged = output.get("flaggedResources",[])
-        for resource in flagged:
-            region = resource["metadata"][0]
-            original = self.get_resource_data(session, region, resource)
+        # eg: the ACL of each flagged S3 bucket
+        originals = self.client.enrich(
+            flagged,
+            lambda resource: self.get_resource_data(
+                session, resource["metadata"][0], resource
+            ),
+        )
+        for resource, original, error in originals:
             resource["originalResourceData"] = original
 
         self.app.log.debug(json.dumps(output))
@@ -207,10 +207,106 @@ class DatabaseHandle:
         db.close()
 
 
+class AuditResourceWriter:
+    """
+    Buffers audit_resource items and their resource_compliance records
+    so that a whole criterion/region batch can be written in a single
+    transaction rather than two autocommitted INSERTs per resource.
+
+    On postgres each table is written with a multi-row
+    INSERT ... RETURNING id and the returned ids are wired into the
+    compliance rows. Databases without a RETURNING clause fall back to
+    row by row inserts inside the same transaction.
+
+    The resource_data is written compressed to the resource_data table
+    in the same transaction (see models.ResourceData).
+    """
+
+    def __init__(self, app=None, max_rows=1000):
+        self.app = app
+        self.max_rows = max_rows
+        self.buffer = []
+        self.rows_written = 0
+
+    def log(self, message):
+        if self.app is not None:
+            self.app.log.debug(message)
+
+    def add(self, audit_resource_item, compliance):
+        """
+        Queue an audit_resource item (the output of
+        check.build_audit_resource_item) and its compliance dict.
+        The compliance audit_resource_id is populated on flush.
+        """
+        self.buffer.append((audit_resource_item, compliance))
+        if len(self.buffer) >= self.max_rows:
+            self.flush()
+
+    def flush(self):
+        """
+        Write all buffered rows in one transaction
+        :return: list of created audit_resource ids in the order added
+        """
+        from chalicelib.models import AuditResource, ResourceCompliance
+
+        if len(self.buffer) == 0:
+            return []
+
+        db = AuditResource._meta.database
+        with db.atomic():
+            resource_rows = [AuditResource.clean(item) for item, _ in self.buffer]
+            AuditResource.store_resource_data(resource_rows)
+            resource_ids = AuditResource.insert_rows(
+                resource_rows, ["resource_persistent_id", "resource_hash"]
+            )
+
+            compliance_rows = []
+            for resource_id, (_, compliance) in zip(resource_ids, self.buffer):
+                compliance["audit_resource_id"] = resource_id
+                compliance_rows.append(ResourceCompliance.clean(compliance))
+            ResourceCompliance.insert_rows(compliance_rows, ["audit_resource_id"])
+
+        self.rows_written += len(resource_ids)
+        self.log(f"Bulk wrote {len(resource_ids)} audit resources")
+        self.buffer = []
+        return resource_ids
+
+
 class BaseModel(peewee.Model):
 
     validators = []
 
+    @classmethod
+    def insert_rows(cls, rows, key):
+        """
+        Insert rows into the model table returning their ids in order.
+        Postgres doesn't guarantee the order of the rows returned by a
+        multi-row INSERT ... RETURNING so the key fields are returned
+        with the ids and matched to the rows. Rows with the same key are
+        assumed to be interchangeable. Databases without a RETURNING
+        clause fall back to row by row inserts.
+        :param key: [field name] identifying a row
+        """
+        if len(rows) == 0:
+            return []
+        db = cls._meta.database
+        if db.returning_clause:
+            fields = [cls._meta.fields[name] for name in key]
+            query = cls.insert_many(rows).returning(cls._meta.primary_key, *fields)
+            # {key values: [id]}
+            returned = {}
+            for row in query.tuples().execute():
+                returned.setdefault(tuple(row[1:]), []).append(row[0])
+            ids = [
+                returned[
+                    tuple(field.db_value(row[field.name]) for field in fields)
+                ].pop()
+                for row in rows
+            ]
+        else:
+            ids = [cls.insert(**row).execute() for row in rows]
+        return ids
+
     def serialize(self):
         """
         Returns a model's instance as a python dictionary.
@@ -0,0 +1,42 @@
+"""
+In-memory lookup of resource exceptions for a single
+(account_subscription, criterion) evaluation.
+
+The exceptions are loaded once at the start of evaluating a criterion
+so that failed resources can be checked for an active exception
+without a query per resource.
+
+In chalice mode the index is populated from the resource_exception
+table. In CLI mode it is populated from config/exceptions.json.
+"""
+from datetime import datetime
+
+
+class ResourceExceptionIndex:
+    def __init__(self, audit_date=None):
+        self.audit_date = audit_date if audit_date is not None else datetime.now()
+        self.exceptions = {}
+
+    def add(self, resource_persistent_id, exception, date_expires, date_created=None):
+        """
+        Add an exception to the index if it is valid at the audit date
+        :param resource_persistent_id: the key to look the exception up by
+        :param exception: the ResourceException record or dict returned by get
+        :param date_expires: datetime
+        :param date_created: datetime or None if not recorded
+        :return bool: whether the exception was added
+        """
+        started = date_created is None or date_created <= self.audit_date
+        in_date = started and date_expires >= self.audit_date
+        if in_date:
+            self.exceptions[resource_persistent_id] = exception
+        return in_date
+
+    def get(self, resource_persistent_id):
+        return self.exceptions.get(resource_persistent_id)
+
+    def has_exception(self, resource_persistent_id):
+        return resource_persistent_id in self.exceptions
+
+    def __len__(self):
+        return len(self.exceptions)
@@ -0,0 +1,123 @@
+"""
+Compact versioned SQS messages passed between the audit stages.
+
+Messages carry record ids rather than serialize() output, which embeds
+the account, team, criterion and provider records in every message.
+The consuming stage loads the records it needs.
+
+audit-account-queue:
+    {"v": 1, "audit_id": 1}
+audit-account-metric-queue:
+    {"v": 1, "audit_id": 1, "audit_criterion_id": 2, "criterion_id": 3}
+    + "region" when regional criteria are fanned out per region
+    + "trusted_advisor_summary" when TA refreshes are orchestrated
+    or {"v": 1, "audit_id": 1, "audit_criteria": [
+        {"audit_criterion_id": 2, "criterion_id": 3}, ...]}
+    for criteria sharing a data source evaluated as one work unit
+    or {"v": 1, "trusted_advisor_orchestration": {...}}
+evaluated-metric-queue:
+    {"v": 1, "audit_id": 1, "audit_criterion_id": 2, "criterion_id": 3,
+     "processed": true, "check_passed": false}
+completed-audit-queue:
+    {"v": 1, "audit_id": 1, "report": {...}}
+    or {"v": 1, "audit_id": 1, "report_reference": "s3://bucket/key"}
+    see chalicelib.claim_check
+
+Any message may also carry the audit trace context
+    "trace": {"trace_id": "...", "span_id": "...", "enqueued_at": 1567000000.0}
+see chalicelib.tracing
+
+Messages without a version are the serialize() output sent before the
+schema was introduced and are converted by decode so that messages
+already on the queues when this is deployed are still processed.
+"""
+import json
+from time import time
+
+MESSAGE_VERSION = 1
+
+
+def audit_message(audit_id):
+    return {"audit_id": audit_id}
+
+
+def audit_criterion_message(audit_criterion, region=None, **kwargs):
+    """
+    :param audit_criterion: AuditCriterion
+    :param region: region name if the criterion is fanned out per region
+    :param kwargs: optional stage specific fields
+    """
+    message = {
+        "audit_id": audit_criterion.account_audit_id_id,
+        "audit_criterion_id": audit_criterion.id,
+        "criterion_id": audit_criterion.criterion_id_id,
+    }
+    if region is not None:
+        message["region"] = region
+    message.update(kwargs)
+    return message
+
+
+def audit_criteria_message(audit_criteria, region=None):
+    """
+    A group of criteria which share a data source
+    :param audit_criteria: [AuditCriterion] in the same audit
+    :param region: region name if the criteria are fanned out per region
+    """
+    message = {
+        "audit_id": audit_criteria[0].account_audit_id_id,
+        "audit_criteria": [
+            {
+                "audit_criterion_id": audit_criterion.id,
+                "criterion_id": audit_criterion.criterion_id_id,
+            }
+            for audit_criterion in audit_criteria
+        ],
+    }
+    if region is not None:
+        message["region"] = region
+    return message
+
+
+def encode(message, trace=None):
+    """
+    :param trace: the trace context from Tracer.get_context
+    """
+    data = dict(message, v=MESSAGE_VERSION)
+    if trace is not None:
+        data["trace"] = dict(trace, enqueued_at=time())
+    return json.dumps(data)
+
+
+def decode(body):
+    """
+    :param body: the SQS message body
+    :return dict: the message in the current schema
+    """
+    data = json.loads(body)
+    if "v" not in data:
+        return from_legacy(data)
+    if data["v"] > MESSAGE_VERSION:
+        raise ValueError(f"Unsupported message version: {data['v']}")
+    return data
+
+
+def from_legacy(data):
+    """
+    Convert the serialize() output of an AuditCriterion or AccountAudit
+    """
+    if "criterion_id" in data:
+        message = {
+            "v": 0,
+            "audit_id": data["account_audit_id"]["id"],
+            "audit_criterion_id": data["id"],
+            "criterion_id": data["criterion_id"]["id"],
+        }
+        for key in ["processed", "check_passed"]:
+            if key in data:
+                message[key] = data[key]
+    elif "account_subscription_id" in data:
+        message = {"v": 0, "audit_id": data["id"]}
+    else:
+        message = dict(data, v=0)
+    return message
@@ -1,7 +1,9 @@
 import os
 import datetime
+import hashlib
 import peewee
 import re
+import zlib
 
 # peewee has a validator library but it has a max version of 3.1
 # this would mean downgrading our peewee version.
@@ -11,8 +13,11 @@ import re
 # from peewee_validates import ModelValidator
 
 from app import app  # used only for logging
+from playhouse import shortcuts
+
 from chalicelib import database_handle
 from chalicelib.aws.gds_iam_client import GdsIamClient
+from chalicelib.exception_index import ResourceExceptionIndex
 
 
 class User(database_handle.BaseModel):
@@ -870,10 +875,59 @@ class AccountAudit(database_handle.BaseModel):
     criteria_failed = peewee.IntegerField(default=0)
     issues_found = peewee.IntegerField(default=0)
     finished = peewee.BooleanField(default=False)
+    criteria_attempted = peewee.IntegerField(default=0)
 
     class Meta:
         table_name = "account_audit"
 
+    @classmethod
+    def record_criterion_evaluated(cls, audit_criterion):
+        """
+        Add an evaluated audit_criterion to the audit stats with an atomic
+        UPDATE rather than re-aggregating every audit_criterion record.
+        The audit_criterion is flagged as aggregated in the same transaction
+        so a redelivered SQS message is not counted twice.
+        :param audit_criterion: AuditCriterion
+        :return: (criteria_attempted, active_criteria) after the update
+            or None if the audit_criterion has already been counted
+            The audit isn't finished in this transaction so a redelivered
+            message which gets None completes the audit if it isn't finished
+        """
+        db = cls._meta.database
+        processed = 1 if audit_criterion.processed else 0
+        failed = 1 if audit_criterion.failed > 0 else 0
+        passed = 1 if processed and not failed else 0
+        with db.atomic():
+            claimed = (
+                AuditCriterion.update(aggregated=True)
+                .where(
+                    AuditCriterion.id == audit_criterion.id,
+                    AuditCriterion.aggregated == False,
+                )
+                .execute()
+            )
+            if claimed == 0:
+                return None
+
+            audit_id = audit_criterion.account_audit_id_id
+            query = cls.update(
+                criteria_attempted=cls.criteria_attempted + 1,
+                criteria_processed=cls.criteria_processed + processed,
+                criteria_passed=cls.criteria_passed + passed,
+                criteria_failed=cls.criteria_failed + failed,
+                issues_found=cls.issues_found + audit_criterion.failed,
+                date_updated=datetime.datetime.now(),
+            ).where(cls.id == audit_id)
+            counts = cls.select(cls.criteria_attempted, cls.active_criteria).where(
+                cls.id == audit_id
+            )
+            if db.returning_clause:
+                query = query.returning(cls.criteria_attempted, cls.active_criteria)
+                counts = query
+            else:
+                query.execute()
+            return list(counts.tuples().execute())[0]
+
     def get_audit_failed_resources(self):
         account_audit_id = self.id
         try:
@@ -1041,6 +1095,52 @@ class NotificationMethod(database_handle.BaseModel):
         table_name = "notification_method"
 
 
+# Idempotency ledger for SQS messages which are delivered at least once
+# A redelivered message skips the work units it has already completed
+class ProcessedMessage(database_handle.BaseModel):
+    message_id = peewee.CharField()
+    work_unit = peewee.CharField()
+    date_processed = peewee.DateTimeField(default=datetime.datetime.now)
+
+    class Meta:
+        table_name = "processed_message"
+        indexes = ((("message_id", "work_unit"), True),)
+
+    @classmethod
+    def is_processed(cls, message_id, work_unit):
+        return (
+            cls.select()
+            .where(cls.message_id == message_id, cls.work_unit == work_unit)
+            .exists()
+        )
+
+    @classmethod
+    def record(cls, message_id, work_unit):
+        cls.insert(
+            message_id=message_id, work_unit=work_unit
+        ).on_conflict_ignore().execute()
+
+    @classmethod
+    def record_many(cls, message_id, work_units):
+        if len(work_units) == 0:
+            return
+        cls.insert_many(
+            [{"message_id": message_id, "work_unit": work_unit} for work_unit in work_units]
+        ).on_conflict_ignore().execute()
+
+    @classmethod
+    def get_work_units(cls, message_id):
+        """
+        :return set: the work units already completed for the message
+        """
+        return {
+            processed.work_unit
+            for processed in cls.select(cls.work_unit).where(
+                cls.message_id == message_id
+            )
+        }
+
+
 # For each audit if we're querying the same domain and the same
 # method for multiple checks (eg ec2 describe-security-groups)
 # we can get the data once, store and re-use it rather than calling
@@ -1058,6 +1158,9 @@ class CachedDataResponse(database_handle.BaseModel):
     )
     invoke_class_name = peewee.CharField()
     invoke_class_get_data_method = peewee.CharField()
+    # hash of the service, method, region and arguments
+    # see GdsAwsClient.get_cached_response
+    cache_key = peewee.CharField(null=True)
     response = peewee.TextField()
 
     class Meta:
@@ -1075,10 +1178,78 @@ class AuditCriterion(database_handle.BaseModel):
     ignored = peewee.IntegerField(default=0)
     processed = peewee.BooleanField(default=False)
     attempted = peewee.BooleanField(default=False)
+    # counted in the account_audit stats
+    aggregated = peewee.BooleanField(default=False)
+    # progress saved when the evaluation runs out of lambda time
+    checkpoint = peewee.TextField(null=True)
 
     class Meta:
         table_name = "audit_criterion"
 
+    def complete_from_regions(self, aggregation_type):
+        """
+        Fan-in for criteria evaluated as one message per region.
+
+        Once every audit_criterion_region record has been attempted the
+        region stats are merged into this record. The merge is a single
+        conditional UPDATE on attempted so that when the last regions
+        report concurrently only one of them completes the criterion.
+        :param aggregation_type: "all" or "any" from the check class
+        :return: check_passed if this call completed the criterion else None
+        """
+        regions = AuditCriterionRegion.audit_criterion_id == self.id
+        pending = (
+            AuditCriterionRegion.select()
+            .where(regions, AuditCriterionRegion.attempted == False)
+            .count()
+        )
+        if pending > 0:
+            return None
+
+        processed_case = peewee.Case(None, [(AuditCriterionRegion.processed, 1)], 0)
+        passed_case = peewee.Case(None, [(AuditCriterionRegion.check_passed, 1)], 0)
+        stats = (
+            AuditCriterionRegion.select(
+                peewee.fn.COUNT(AuditCriterionRegion.id).alias("region_count"),
+                peewee.fn.SUM(processed_case).alias("processed_regions"),
+                peewee.fn.SUM(passed_case).alias("passed_regions"),
+                peewee.fn.SUM(AuditCriterionRegion.regions).alias("regions"),
+                peewee.fn.SUM(AuditCriterionRegion.resources).alias("resources"),
+                peewee.fn.SUM(AuditCriterionRegion.tested).alias("tested"),
+                peewee.fn.SUM(AuditCriterionRegion.passed).alias("passed"),
+                peewee.fn.SUM(AuditCriterionRegion.failed).alias("failed"),
+                peewee.fn.SUM(AuditCriterionRegion.ignored).alias("ignored"),
+            )
+            .where(regions)
+            .get()
+        )
+        if stats.region_count == 0:
+            return None
+
+        merged = {
+            "regions": stats.regions,
+            "resources": stats.resources,
+            "tested": stats.tested,
+            "passed": stats.passed,
+            "failed": stats.failed,
+            "ignored": stats.ignored,
+            "processed": stats.processed_regions > 0,
+            "attempted": True,
+        }
+        completed = (
+            AuditCriterion.update(**merged)
+            .where(AuditCriterion.id == self.id, AuditCriterion.attempted == False)
+            .execute()
+        )
+        if completed == 0:
+            return None
+
+        for field, value in merged.items():
+            setattr(self, field, value)
+        if aggregation_type == "all":
+            return stats.passed_regions == stats.region_count
+        return stats.passed_regions > 0
+
     def get_resources_by_status(self, status_id):
         account_audit_id = self.account_audit_id
 
@@ -1141,6 +1312,172 @@ class AuditCriterion(database_handle.BaseModel):
         return issues_list
 
 
+# Per region stats for regional criteria audited with one
+# SQS message per region. Merged into audit_criterion by
+# AuditCriterion.complete_from_regions once every region is attempted.
+class AuditCriterionRegion(database_handle.BaseModel):
+    audit_criterion_id = peewee.ForeignKeyField(
+        AuditCriterion, backref="audit_criterion_regions"
+    )
+    region = peewee.CharField()
+    regions = peewee.IntegerField(default=0)
+    resources = peewee.IntegerField(default=0)
+    tested = peewee.IntegerField(default=0)
+    passed = peewee.IntegerField(default=0)
+    failed = peewee.IntegerField(default=0)
+    ignored = peewee.IntegerField(default=0)
+    processed = peewee.BooleanField(default=False)
+    attempted = peewee.BooleanField(default=False)
+    check_passed = peewee.BooleanField(default=False)
+    checkpoint = peewee.TextField(null=True)
+
+    class Meta:
+        table_name = "audit_criterion_region"
+
+
+# The AWS API calls made evaluating a criterion
+# see chalicelib.aws.api_usage
+class AuditCriterionApiUsage(database_handle.BaseModel):
+    audit_criterion_id = peewee.ForeignKeyField(
+        AuditCriterion, backref="api_usage"
+    )
+    region = peewee.CharField(null=True)
+    service = peewee.CharField()
+    operation = peewee.CharField()
+    calls = peewee.IntegerField(default=0)
+    retries = peewee.IntegerField(default=0)
+    throttles = peewee.IntegerField(default=0)
+    bytes = peewee.BigIntegerField(default=0)
+    duration_ms = peewee.IntegerField(default=0)
+    # time held back by the ApiGovernor
+    wait_ms = peewee.IntegerField(default=0)
+    # assume role credential cache lookups (sts AssumeRole only)
+    cache_hits = peewee.IntegerField(default=0)
+    cache_misses = peewee.IntegerField(default=0)
+
+    class Meta:
+        table_name = "audit_criterion_api_usage"
+
+    @classmethod
+    def record(cls, audit_criterion_id, usage):
+        """
+        :param usage: ApiUsageRecorder.get_usage output
+        """
+        rows = [dict(totals, audit_criterion_id=audit_criterion_id) for totals in usage]
+        if len(rows) > 0:
+            cls.insert_many(rows).execute()
+
+
+# The API response for a resource is stored out of row compressed
+# and deduplicated by its content hash since most resources are
+# unchanged from one audit to the next
+class ResourceData(database_handle.BaseModel):
+    content_hash = peewee.CharField(unique=True)
+    data = peewee.BlobField()
+
+    class Meta:
+        table_name = "resource_data"
+
+    @staticmethod
+    def get_content_hash(resource_data):
+        return hashlib.sha256(resource_data.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def compress(resource_data):
+        return zlib.compress(resource_data.encode("utf-8"))
+
+    @staticmethod
+    def decompress(data):
+        return zlib.decompress(bytes(data)).decode("utf-8")
+
+    def get_data(self):
+        return self.decompress(self.data)
+
+    @classmethod
+    def store(cls, resource_data_list):
+        """
+        Store the JSON encoded resource data skipping any content which
+        is already stored
+        :param resource_data_list: [str]
+        :return list: the resource_data ids in the order passed
+        """
+        hashes = [cls.get_content_hash(data) for data in resource_data_list]
+        rows = {}
+        for content_hash, data in zip(hashes, resource_data_list):
+            if content_hash not in rows:
+                rows[content_hash] = {
+                    "content_hash": content_hash,
+                    "data": cls.compress(data),
+                }
+        if len(rows) == 0:
+            return []
+        cls.insert_many(list(rows.values())).on_conflict_ignore().execute()
+        ids = dict(
+            cls.select(cls.content_hash, cls.id)
+            .where(cls.content_hash.in_(list(rows.keys())))
+            .tuples()
+        )
+        return [ids[content_hash] for content_hash in hashes]
+
+
+# Spans recording the time an audit spends in each SQS stage
+# see chalicelib.tracing
+class AuditTraceSpan(database_handle.BaseModel):
+    trace_id = peewee.CharField()
+    span_id = peewee.CharField()
+    parent_span_id = peewee.CharField(null=True)
+    account_audit_id = peewee.ForeignKeyField(AccountAudit, backref="trace_spans")
+    audit_criterion_id = peewee.ForeignKeyField(
+        AuditCriterion, null=True, backref="trace_spans"
+    )
+    stage = peewee.CharField()
+    name = peewee.CharField()
+    region = peewee.CharField(null=True)
+    date_started = peewee.DateTimeField()
+    duration_ms = peewee.IntegerField()
+
+    class Meta:
+        table_name = "audit_trace_span"
+
+    @classmethod
+    def get_stage_durations(cls, account_audit_id):
+        """
+        Break down an audit's duration by stage and span name.
+        Criteria are evaluated concurrently so the totals for a stage
+        can add up to more than the elapsed time of the audit.
+        :return dict: {
+            "elapsed_ms": first span start to last span end,
+            "stages": [{stage, name, spans, duration_ms, max_duration_ms}]
+        }
+        """
+        spans = list(cls.select().where(cls.account_audit_id == account_audit_id))
+        stages = {}
+        for span in spans:
+            key = (span.stage, span.name)
+            if key not in stages:
+                stages[key] = {
+                    "stage": span.stage,
+                    "name": span.name,
+                    "spans": 0,
+                    "duration_ms": 0,
+                    "max_duration_ms": 0,
+                }
+            stages[key]["spans"] += 1
+            stages[key]["duration_ms"] += span.duration_ms
+            stages[key]["max_duration_ms"] = max(
+                stages[key]["max_duration_ms"], span.duration_ms
+            )
+        elapsed_ms = 0
+        if len(spans) > 0:
+            started = min(span.date_started for span in spans)
+            ended = max(
+                span.date_started + datetime.timedelta(milliseconds=span.duration_ms)
+                for span in spans
+            )
+            elapsed_ms = int((ended - started).total_seconds() * 1000)
+        return {"elapsed_ms": elapsed_ms, "stages": list(stages.values())}
+
+
 # This is where we store the results of quering the API
 # This should include "green" status checks as well as
 # identified risks.
@@ -1151,12 +1488,119 @@ class AuditResource(database_handle.BaseModel):
     resource_id = peewee.CharField()
     resource_name = peewee.CharField(null=True)
     resource_persistent_id = peewee.CharField(null=True)
-    resource_data = peewee.TextField()
+    # legacy rows hold the JSON inline, new rows reference a
+    # resource_data record and rows for resources unchanged since a
+    # previous audit reference the audit_resource holding the data
+    resource_data = peewee.TextField(null=True)
+    resource_data_id = peewee.ForeignKeyField(
+        ResourceData, null=True, backref="audit_resources"
+    )
+    resource_hash = peewee.CharField(null=True)
+    reference_audit_resource_id = peewee.ForeignKeyField(
+        "self", null=True, backref="references"
+    )
     date_evaluated = peewee.DateTimeField(default=datetime.datetime.now)
 
     class Meta:
         table_name = "audit_resource"
 
+    def serialize(self):
+        """
+        Does not follow resource_data_id or reference_audit_resource_id
+        since the resource lists never display the resource data.
+        Use get_resource_data to load it.
+        """
+        return shortcuts.model_to_dict(
+            self,
+            exclude=[
+                AuditResource.resource_data_id,
+                AuditResource.reference_audit_resource_id,
+            ],
+        )
+
+    def raw(self):
+        data = super().raw()
+        data["resource_data"] = self.get_resource_data()
+        data["resource_data_id"] = self.resource_data_id_id
+        data["reference_audit_resource_id"] = self.reference_audit_resource_id_id
+        return data
+
+    def get_resource_data(self):
+        """
+        :return str: the JSON encoded API response for the resource
+        """
+        if self.resource_data is not None:
+            resource_data = self.resource_data
+        elif self.resource_data_id_id is not None:
+            resource_data = self.resource_data_id.get_data()
+        elif self.reference_audit_resource_id_id is not None:
+            resource_data = self.reference_audit_resource_id.get_resource_data()
+        else:
+            resource_data = None
+        return resource_data
+
+    @classmethod
+    def store_resource_data(cls, rows):
+        """
+        Move the resource_data of audit_resource rows into resource_data
+        records before they are inserted
+        :param rows: [dict] as returned by clean
+        """
+        stored = [row for row in rows if row.get("resource_data") is not None]
+        ids = ResourceData.store([row["resource_data"] for row in stored])
+        for row, resource_data_id in zip(stored, ids):
+            row["resource_data_id"] = resource_data_id
+            row["resource_data"] = None
+
+    @classmethod
+    def get_unchanged_compliance(cls, account_audit_id, criterion_id, resource_items):
+        """
+        Find the compliance of resources with the same content hash in
+        a previous audit so that they don't need to be evaluated again.
+        Results modified by an exception (status 4) are not reused since
+        the exception may have expired.
+        :param account_audit_id: the previous audit
+        :param resource_items: output of check.build_audit_resource_item
+        :return dict: {
+            resource_persistent_id: (id of the row holding the resource_data, compliance dict)
+        }
+        """
+        hashes = {
+            item["resource_persistent_id"]: item["resource_hash"]
+            for item in resource_items
+        }
+        if len(hashes) == 0:
+            return {}
+        query = (
+            ResourceCompliance.select(ResourceCompliance, cls)
+            .join(cls)
+            .where(
+                cls.account_audit_id == account_audit_id,
+                cls.criterion_id == criterion_id,
+                cls.resource_hash.in_(list(set(hashes.values()))),
+                ResourceCompliance.status_id.in_([2, 3]),
+            )
+        )
+        unchanged = {}
+        for compliance in query:
+            resource = compliance.audit_resource_id
+            if hashes.get(resource.resource_persistent_id) != resource.resource_hash:
+                continue
+            # as returned by build_evaluation
+            evaluation = {
+                "resource_type": compliance.resource_type,
+                "resource_id": compliance.resource_id,
+                "compliance_type": compliance.compliance_type,
+                "is_compliant": compliance.is_compliant,
+                "is_applicable": compliance.is_applicable,
+                "status_id": compliance.status_id_id,
+            }
+            if compliance.annotation:
+                evaluation["annotation"] = compliance.annotation
+            holder_id = resource.reference_audit_resource_id_id or resource.id
+            unchanged[resource.resource_persistent_id] = (holder_id, evaluation)
+        return unchanged
+
 
 class ResourceCompliance(database_handle.BaseModel):
     audit_resource_id = peewee.ForeignKeyField(
@@ -1243,6 +1687,34 @@ class ResourceException(database_handle.BaseModel):
 
         return exception
 
+    @classmethod
+    def get_active_exception_index(cls, criterion_id, account_subscription_id):
+        """
+        Load every exception for the account and criterion which is valid
+        now into a ResourceExceptionIndex keyed by resource_persistent_id
+        so the audit can look up failed resources without a query each.
+        """
+        index = ResourceExceptionIndex()
+        try:
+            exceptions = ResourceException.select().where(
+                ResourceException.criterion_id == criterion_id,
+                ResourceException.account_subscription_id == account_subscription_id,
+                ResourceException.date_created <= index.audit_date,
+                ResourceException.date_expires >= index.audit_date,
+            )
+            for exception in exceptions:
+                index.add(
+                    exception.resource_persistent_id,
+                    exception,
+                    exception.date_expires,
+                    exception.date_created,
+                )
+            app.log.debug(f"Loaded {len(index)} active exceptions")
+        except Exception:
+            app.log.error(app.utilities.get_typed_exception())
+
+        return index
+
     @classmethod
     def find_exception(
         cls, criterion_id, resource_persistent_id, account_subscription_id
@@ -609,6 +609,8 @@ def resource_details(id):
             .join(models.AuditResource)
             .where(models.AuditResource.id == resource.id)
         ).get()
+        resource_item = resource.serialize()
+        resource_item["resource_data"] = resource.get_resource_data()
         response = app.templates.render_authorized_template(
             "resource_details.html",
             app.current_request,
@@ -617,7 +619,7 @@ def resource_details(id):
                     account.product_team_id
                 ).serialize(),
                 "account": account.serialize(),
-                "resource": resource.serialize(),
+                "resource": resource_item,
                 "criterion": models.Criterion.get_by_id(
                     resource.criterion_id
                 ).serialize(),
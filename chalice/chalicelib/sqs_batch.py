@@ -0,0 +1,99 @@
+"""
+Per message success tracking for the SQS handlers
+
+Lambda deletes a whole SQS batch when the handler returns and
+redelivers the whole batch when it raises. SqsBatch records which
+messages failed so that only those are redelivered.
+
+With CSW_SQS_BATCH_ITEM_FAILURES=true the handler returns a partial
+batch response listing the failed messages. This needs the event
+source mapping's FunctionResponseTypes to include
+ReportBatchItemFailures, which chalice can't configure, so it is off
+by default. Otherwise the messages which succeeded are deleted and the
+handler raises so that Lambda redelivers the rest.
+"""
+import os
+from contextlib import contextmanager
+
+
+def get_sqs_batch_size():
+    """
+    The number of messages passed to each invocation of the SQS handlers
+
+    The handler decorators read this when chalice packages the app so
+    CSW_SQS_BATCH_SIZE has to be set in the shell which runs chalice
+    deploy. The stage environment_variables in config.json are only
+    set in the deployed lambdas so they have no effect.
+    """
+    return int(os.environ.get("CSW_SQS_BATCH_SIZE", 1))
+
+
+def is_batch_item_failures():
+    return os.environ.get("CSW_SQS_BATCH_ITEM_FAILURES", "false").lower() == "true"
+
+
+def get_message_id(message):
+    """
+    :param message: chalice SQSRecord
+    """
+    return message.to_dict().get("messageId")
+
+
+class SqsBatchFailed(Exception):
+    """
+    Raised so that Lambda redelivers the messages which failed
+    """
+
+
+class SqsBatch:
+    def __init__(self, app, sqs, queue_name, event):
+        """
+        :param sqs: GdsSqsClient
+        :param queue_name: the queue the event was received from
+        :param event: chalice SQSEvent
+        """
+        self.app = app
+        self.sqs = sqs
+        self.queue_name = queue_name
+        self.event = event
+        self.succeeded = []
+        self.failed = []
+
+    def __iter__(self):
+        return iter(self.event)
+
+    @contextmanager
+    def process(self, message):
+        """
+        Record whether the message is processed without raising
+        Exceptions are logged rather than stopping the rest of the batch
+        """
+        try:
+            yield
+        except Exception:
+            self.app.log.error(self.app.utilities.get_typed_exception())
+            self.failed.append(message)
+        else:
+            self.succeeded.append(message)
+
+    def get_response(self, default=None):
+        """
+        :param default: the handler's return value if nothing failed
+        :raise SqsBatchFailed: if messages failed without batch item failures
+        """
+        if is_batch_item_failures():
+            return {
+                "batchItemFailures": [
+                    {"itemIdentifier": get_message_id(message)} for message in self.failed
+                ]
+            }
+        if len(self.failed) == 0:
+            return default
+        queue_url = self.sqs.get_queue_url(self.queue_name)
+        undeleted = self.sqs.delete_message_batch(
+            queue_url, [message.receipt_handle for message in self.succeeded]
+        )
+        raise SqsBatchFailed(
+            f"Failed to process {len(self.failed)} of {len(self.failed) + len(self.succeeded)} "
+            f"messages ({len(undeleted)} processed messages not deleted)"
+        )
@@ -0,0 +1,141 @@
+"""
+Trace an audit across the SQS stages
+
+audit_account_schedule -> account_audit_criteria
+-> account_evaluate_criteria -> audit_evaluated_metric
+
+A trace id is generated when the audit is created and the trace
+context is sent in every message (see messages.encode) along with the
+time it was enqueued. Each stage records a queue_wait span for the time
+the message spent on the queue, a process span for the time the stage
+took, and spans for the steps within it (assume_role, fetch, evaluate
+and persist).
+
+CSW_AUDIT_TRACING=true writes the spans to the audit_trace_span table.
+CSW_TRACE_PATH writes them as JSON lines to a local directory instead
+(for local development). If neither is set nothing is recorded but the
+trace context is still propagated.
+"""
+import os
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from time import time
+
+from chalicelib import models
+
+
+def new_trace_id():
+    return uuid.uuid4().hex
+
+
+def new_span_id():
+    return uuid.uuid4().hex[:16]
+
+
+def get_trace_exporter(app):
+    if os.environ.get("CSW_TRACE_PATH"):
+        return LocalTraceExporter(app, os.environ["CSW_TRACE_PATH"])
+    if os.environ.get("CSW_AUDIT_TRACING", "false").lower() == "true":
+        return DatabaseTraceExporter(app)
+    return None
+
+
+class Tracer:
+    """
+    Records the spans of one stage processing one message
+    """
+
+    def __init__(self, stage, account_audit_id, trace=None, exporter=None):
+        """
+        :param stage: the lambda name
+        :param trace: the trace context from the message or None
+        to start a new trace
+        """
+        trace = trace or {}
+        self.stage = stage
+        self.account_audit_id = account_audit_id
+        self.trace_id = trace.get("trace_id") or new_trace_id()
+        self.parent_span_id = trace.get("span_id")
+        self.span_id = new_span_id()
+        self.exporter = exporter
+        self.started = time()
+        self.spans = []
+        if "enqueued_at" in trace:
+            self.add_span("queue_wait", trace["enqueued_at"], self.started)
+
+    def get_context(self):
+        """
+        :return dict: the trace context to send in the next stage's messages
+        """
+        return {"trace_id": self.trace_id, "span_id": self.span_id}
+
+    def add_span(
+        self, name, started, ended, audit_criterion_id=None, region=None, span_id=None
+    ):
+        """
+        Spans are children of the stage's process span. The process span
+        itself (span_id) is a child of the span which sent the message.
+        """
+        self.spans.append(
+            {
+                "trace_id": self.trace_id,
+                "span_id": span_id or new_span_id(),
+                "parent_span_id": self.parent_span_id if span_id else self.span_id,
+                "account_audit_id": self.account_audit_id,
+                "audit_criterion_id": audit_criterion_id,
+                "stage": self.stage,
+                "name": name,
+                "region": region,
+                "date_started": datetime.fromtimestamp(started),
+                "duration_ms": int((ended - started) * 1000),
+            }
+        )
+
+    @contextmanager
+    def span(self, name, audit_criterion_id=None, region=None):
+        started = time()
+        try:
+            yield
+        finally:
+            self.add_span(name, started, time(), audit_criterion_id, region)
+
+    def finish(self):
+        """
+        Record the process span for the stage and export the spans
+        """
+        self.add_span("process", self.started, time(), span_id=self.span_id)
+        if self.exporter is not None:
+            try:
+                self.exporter.export(self.spans)
+            except Exception:
+                # tracing should never fail the audit
+                app = self.exporter.app
+                app.log.error("Failed to export trace: " + app.utilities.get_typed_exception())
+        self.spans = []
+
+
+class TraceExporter:
+    def __init__(self, app):
+        self.app = app
+
+    def export(self, spans):
+        raise NotImplementedError
+
+
+class DatabaseTraceExporter(TraceExporter):
+    def export(self, spans):
+        models.AuditTraceSpan.insert_many(spans).execute()
+
+
+class LocalTraceExporter(TraceExporter):
+    def __init__(self, app, location):
+        super().__init__(app)
+        self.location = location
+
+    def export(self, spans):
+        os.makedirs(self.location, exist_ok=True)
+        for span in spans:
+            path = os.path.join(self.location, f"{span['trace_id']}.jsonl")
+            with open(path, "a") as file:
+                file.write(self.app.utilities.to_json(span) + "\n")
@@ -0,0 +1,140 @@
+"""
+Non-blocking orchestration of Trusted Advisor refreshes for an account audit.
+
+Without orchestration each TrustedAdvisorCriterion refreshes its own
+check and sleeps until the check can be refreshed again.
+
+With orchestration the refreshes for every TA check in the audit are
+requested once at the start of the audit. A delayed SQS message then
+polls the refresh statuses of all the checks in one call and re-queues
+itself until they are fresh. When a check is fresh, or the attempts run
+out, its criteria are dispatched with the check summary so that:
+- the criterion does not refresh the check again
+- checks with no flagged resources don't fetch the full result
+
+The orchestration state is carried in the message:
+{
+    "account_audit_id": 1,
+    "attempt": 0,
+    "pending": {check_id: [audit_criterion_id, ...]},
+    "refreshable": [check_id, ...]
+}
+"""
+import os
+
+
+def get_refresh_delay():
+    """
+    Seconds to wait between polls of the refresh statuses (max 900 for SQS)
+    """
+    return int(os.environ.get("CSW_TA_REFRESH_DELAY", 60))
+
+
+def get_refresh_attempts():
+    """
+    Polls before the criteria are dispatched with whatever result is available
+    """
+    return int(os.environ.get("CSW_TA_REFRESH_ATTEMPTS", 5))
+
+
+class TrustedAdvisorOrchestrator:
+
+    # statuses after which the check won't get any fresher
+    complete_statuses = ["success", "abandoned", "none"]
+
+    def __init__(self, app, client, max_attempts=None):
+        self.app = app
+        self.client = client
+        self.max_attempts = (
+            max_attempts if max_attempts is not None else get_refresh_attempts()
+        )
+
+    def start(self, session, account_audit_id, pending):
+        """
+        Request a refresh of every pending check
+        :param session: the account session
+        :param account_audit_id: int
+        :param pending: dict {check_id: [audit_criterion_id, ...]}
+        :return dict: the orchestration state
+        """
+        refreshed = self.client.refresh_checks(session, list(pending.keys()))
+        return {
+            "account_audit_id": account_audit_id,
+            "attempt": 0,
+            "pending": pending,
+            "refreshable": list(refreshed.keys()),
+        }
+
+    def poll(self, session, orchestration):
+        """
+        Find the checks which are ready for their criteria to be evaluated
+        :param session: the account session
+        :param orchestration: the state returned by start or a previous poll
+        :return tuple: (
+            {check_id: trusted_advisor_summary} for the ready checks,
+            the orchestration state to poll again or None if nothing is pending
+        )
+        """
+        pending = orchestration["pending"]
+        attempt = orchestration["attempt"] + 1
+        refreshable = [
+            check_id for check_id in orchestration["refreshable"] if check_id in pending
+        ]
+
+        statuses = {}
+        if refreshable and attempt < self.max_attempts:
+            try:
+                statuses = self.client.describe_trusted_advisor_check_refresh_statuses(
+                    session, refreshable
+                )
+            except Exception:
+                self.app.log.error(self.app.utilities.get_typed_exception())
+                # give up waiting rather than polling something that fails
+                attempt = self.max_attempts
+
+        ready = {}
+        for check_id in pending:
+            if check_id not in refreshable:
+                # refreshed automatically by AWS
+                ready[check_id] = {"refreshed": True}
+            elif attempt >= self.max_attempts:
+                ready[check_id] = {"refreshed": False}
+            else:
+                status = statuses.get(check_id, {}).get("status")
+                if status in self.complete_statuses:
+                    ready[check_id] = {"refreshed": status == "success"}
+
+        self.add_flagged_counts(session, ready)
+
+        remaining = {
+            check_id: audit_criterion_ids
+            for check_id, audit_criterion_ids in pending.items()
+            if check_id not in ready
+        }
+        if remaining:
+            next_poll = dict(orchestration, attempt=attempt, pending=remaining)
+        else:
+            next_poll = None
+
+        return ready, next_poll
+
+    def add_flagged_counts(self, session, ready):
+        """
+        Record the number of flagged resources from the check summaries
+        If the summaries can't be read the count is left as None and
+        the criteria fetch the full result
+        """
+        for summary in ready.values():
+            summary["flagged"] = None
+        if not ready:
+            return
+        try:
+            summaries = self.client.describe_trusted_advisor_check_summaries(
+                session, list(ready.keys())
+            )
+            for check_id, summary in summaries.items():
+                if check_id in ready:
+                    resources = summary.get("resourcesSummary", {})
+                    ready[check_id]["flagged"] = resources.get("resourcesFlagged")
+        except Exception:
+            self.app.log.error(self.app.utilities.get_typed_exception())
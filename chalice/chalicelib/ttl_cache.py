@@ -0,0 +1,125 @@
+"""
+Cache values which practically never change across invocations
+
+eg: the list of regions, the queue URLs and SSM parameters
+
+Values are kept in memory for the life of the container and written
+to a JSON file under CSW_CACHE_PATH (/tmp by default) so that they
+survive the module being reloaded. Each value expires after its TTL.
+Values which shouldn't be written to disk, like secrets, are only
+kept in memory.
+
+Failing to read or write the file tier never fails the caller, the
+value is fetched instead.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from time import time
+
+
+def get_cache_path():
+    return os.environ.get(
+        "CSW_CACHE_PATH", os.path.join(tempfile.gettempdir(), "csw_cache")
+    )
+
+
+class TtlCache:
+    def __init__(self, path=None):
+        """
+        :param path: the directory for the file tier
+        defaults to get_cache_path()
+        """
+        self.path = path
+        # {key: (expires, value)}
+        self.memory = dict()
+        self.lock = threading.Lock()
+
+    def get_path(self):
+        return self.path or get_cache_path()
+
+    def get_file_name(self, key):
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.get_path(), f"{digest}.json")
+
+    def get(self, key, fetch, ttl, persist=True):
+        """
+        Get the cached value or call fetch() and cache the result
+        None is never cached so that a failed fetch is retried
+        :param fetch: function returning a JSON serializable value
+        :param ttl: seconds to cache the value for
+        :param persist: whether to use the file tier
+        """
+        value = self.read(key, persist)
+        if value is None:
+            value = fetch()
+            if value is not None:
+                self.write(key, value, ttl, persist)
+        return value
+
+    def read(self, key, persist=True):
+        now = time()
+        with self.lock:
+            expires, value = self.memory.get(key, (0, None))
+        if expires > now:
+            return value
+        if not persist:
+            return None
+        try:
+            with open(self.get_file_name(key)) as file:
+                cached = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if cached["expires"] <= now:
+            return None
+        with self.lock:
+            self.memory[key] = (cached["expires"], cached["value"])
+        return cached["value"]
+
+    def write(self, key, value, ttl, persist=True):
+        expires = time() + ttl
+        with self.lock:
+            self.memory[key] = (expires, value)
+        if not persist:
+            return
+        file_name = self.get_file_name(key)
+        try:
+            os.makedirs(self.get_path(), exist_ok=True)
+            # write then rename so other threads never read a partial file
+            temporary = f"{file_name}.{os.getpid()}.{threading.get_ident()}"
+            with open(temporary, "w") as file:
+                json.dump({"key": key, "expires": expires, "value": value}, file)
+            os.replace(temporary, file_name)
+        except (OSError, TypeError, ValueError):
+            pass
+
+    def invalidate(self, key):
+        """
+        Remove the value from both tiers so it is fetched again
+        """
+        with self.lock:
+            self.memory.pop(key, None)
+        try:
+            os.remove(self.get_file_name(key))
+        except OSError:
+            pass
+
+    def clear(self):
+        with self.lock:
+            self.memory.clear()
+        try:
+            file_names = os.listdir(self.get_path())
+        except OSError:
+            return
+        for file_name in file_names:
+            if file_name.endswith(".json"):
+                try:
+                    os.remove(os.path.join(self.get_path(), file_name))
+                except OSError:
+                    pass
+
+
+# shared by every caller in the container
+invariant_cache = TtlCache()
@@ -0,0 +1,254 @@
+"""
+Sqlite versions of the tables used by the unit tests and benchmarks
+
+Sqlite does not allow schema qualified foreign key references so the
+peewee create_tables method can't be used for tables with foreign keys.
+The tables are created in a "public" database attached to the
+connection so the models' schema resolves.
+"""
+from datetime import datetime
+
+
+def attach_public_schema(db, schema_path=":memory:"):
+    """
+    :param schema_path: the sqlite file for the public schema
+    """
+    db.execute_sql(f"ATTACH DATABASE '{schema_path}' AS public")
+
+
+def create_account_subscription_table(db):
+    """
+    Minimal sqlite version of the account_subscription table
+    """
+    db.execute_sql(
+        """
+        CREATE TABLE public.account_subscription (
+            id INTEGER PRIMARY KEY,
+            account_id INTEGER,
+            account_name TEXT,
+            product_team_id INTEGER,
+            active BOOLEAN DEFAULT 1,
+            auditable BOOLEAN DEFAULT 1,
+            suspended BOOLEAN DEFAULT 0
+        )
+        """
+    )
+
+
+def create_audit_criterion_tables(db):
+    """
+    Minimal sqlite versions of the account_audit, audit_criterion
+    and audit_criterion_region tables.
+    """
+    db.execute_sql(
+        """
+        CREATE TABLE public.account_audit (
+            id INTEGER PRIMARY KEY,
+            account_subscription_id INTEGER,
+            date_started TIMESTAMP,
+            date_updated TIMESTAMP,
+            date_completed TIMESTAMP,
+            active_criteria INTEGER DEFAULT 0,
+            criteria_processed INTEGER DEFAULT 0,
+            criteria_passed INTEGER DEFAULT 0,
+            criteria_failed INTEGER DEFAULT 0,
+            issues_found INTEGER DEFAULT 0,
+            finished BOOLEAN DEFAULT 0,
+            criteria_attempted INTEGER DEFAULT 0
+        )
+        """
+    )
+    db.execute_sql(
+        """
+        CREATE TABLE public.audit_criterion (
+            id INTEGER PRIMARY KEY,
+            criterion_id INTEGER,
+            account_audit_id INTEGER,
+            regions INTEGER DEFAULT 0,
+            resources INTEGER DEFAULT 0,
+            tested INTEGER DEFAULT 0,
+            passed INTEGER DEFAULT 0,
+            failed INTEGER DEFAULT 0,
+            ignored INTEGER DEFAULT 0,
+            processed BOOLEAN DEFAULT 0,
+            attempted BOOLEAN DEFAULT 0,
+            aggregated BOOLEAN DEFAULT 0,
+            checkpoint TEXT,
+            UNIQUE (account_audit_id, criterion_id)
+        )
+        """
+    )
+    db.execute_sql(
+        """
+        CREATE TABLE public.audit_criterion_region (
+            id INTEGER PRIMARY KEY,
+            audit_criterion_id INTEGER,
+            region TEXT,
+            regions INTEGER DEFAULT 0,
+            resources INTEGER DEFAULT 0,
+            tested INTEGER DEFAULT 0,
+            passed INTEGER DEFAULT 0,
+            failed INTEGER DEFAULT 0,
+            ignored INTEGER DEFAULT 0,
+            processed BOOLEAN DEFAULT 0,
+            attempted BOOLEAN DEFAULT 0,
+            check_passed BOOLEAN DEFAULT 0,
+            checkpoint TEXT,
+            UNIQUE (audit_criterion_id, region)
+        )
+        """
+    )
+
+
+def create_criterion_tables(db):
+    """
+    Minimal sqlite versions of the criterion and criterion_params tables.
+    """
+    db.execute_sql(
+        """
+        CREATE TABLE public.criterion (
+            id INTEGER PRIMARY KEY,
+            criterion_name TEXT,
+            criteria_provider_id INTEGER,
+            invoke_class_name TEXT,
+            invoke_class_get_data_method TEXT,
+            title TEXT,
+            description TEXT,
+            why_is_it_important TEXT,
+            how_do_i_fix_it TEXT,
+            active BOOLEAN DEFAULT 1,
+            is_regional BOOLEAN DEFAULT 1,
+            severity INTEGER DEFAULT 1
+        )
+        """
+    )
+    db.execute_sql(
+        """
+        CREATE TABLE public.criterion_params (
+            id INTEGER PRIMARY KEY,
+            criterion_id INTEGER,
+            param_name TEXT,
+            param_value TEXT
+        )
+        """
+    )
+
+
+def create_audit_resource_tables(db):
+    """
+    Minimal sqlite versions of the audit_resource, resource_data and
+    resource_compliance tables.
+    """
+    db.execute_sql(
+        """
+        CREATE TABLE public.audit_resource (
+            id INTEGER PRIMARY KEY,
+            criterion_id INTEGER,
+            account_audit_id INTEGER,
+            region TEXT,
+            resource_id TEXT,
+            resource_name TEXT,
+            resource_persistent_id TEXT,
+            resource_data TEXT,
+            resource_data_id INTEGER,
+            resource_hash TEXT,
+            reference_audit_resource_id INTEGER,
+            date_evaluated TIMESTAMP
+        )
+        """
+    )
+    db.execute_sql(
+        """
+        CREATE TABLE public.resource_data (
+            id INTEGER PRIMARY KEY,
+            content_hash TEXT UNIQUE,
+            data BLOB
+        )
+        """
+    )
+    db.execute_sql(
+        """
+        CREATE TABLE public.resource_compliance (
+            id INTEGER PRIMARY KEY,
+            audit_resource_id INTEGER,
+            annotation TEXT,
+            resource_type TEXT,
+            resource_id TEXT,
+            compliance_type TEXT,
+            is_compliant BOOLEAN,
+            is_applicable BOOLEAN,
+            status_id INTEGER
+        )
+        """
+    )
+
+
+def create_audit_report_tables(db):
+    """
+    Minimal sqlite versions of the cached_data_response and
+    account_latest_audit tables.
+    """
+    db.execute_sql(
+        """
+        CREATE TABLE public.cached_data_response (
+            id INTEGER PRIMARY KEY,
+            criterion_id INTEGER NOT NULL,
+            account_audit_id INTEGER NOT NULL,
+            invoke_class_name TEXT,
+            invoke_class_get_data_method TEXT,
+            cache_key TEXT,
+            response TEXT,
+            UNIQUE (account_audit_id, cache_key)
+        )
+        """
+    )
+    db.execute_sql(
+        """
+        CREATE TABLE public.account_latest_audit (
+            id INTEGER PRIMARY KEY,
+            account_subscription_id INTEGER UNIQUE,
+            account_audit_id INTEGER
+        )
+        """
+    )
+
+
+def create_processed_message_table(db):
+    """
+    Minimal sqlite version of the processed_message table
+    """
+    db.execute_sql(
+        """
+        CREATE TABLE public.processed_message (
+            id INTEGER PRIMARY KEY,
+            message_id TEXT NOT NULL,
+            work_unit TEXT NOT NULL,
+            date_processed TIMESTAMP,
+            UNIQUE (message_id, work_unit)
+        )
+        """
+    )
+
+
+def build_resource_pair(index):
+    item = {
+        "account_audit_id": 1,
+        "criterion_id": 1,
+        "region": "eu-west-2",
+        "resource_id": f"sg-{index}",
+        "resource_name": f"group-{index}",
+        "resource_persistent_id": f"AWS::EC2::SecurityGroup::eu-west-2::123456789012::group-{index}",
+        "resource_data": "{}",
+        "date_evaluated": datetime.now(),
+    }
+    compliance = {
+        "annotation": "",
+        "resource_type": "AWS::EC2::SecurityGroup",
+        "resource_id": f"sg-{index}",
+        "compliance_type": "COMPLIANT",
+        "is_compliant": True,
+        "is_applicable": True,
+        "status_id": 2,
+    }
+    item["resource_compliance"] = compliance
+    return item, compliance
@@ -0,0 +1,75 @@
+import unittest
+
+import boto3
+from botocore.stub import Stubber
+
+from chalicelib.aws.api_usage import ApiUsageRecorder, recording, register_client
+
+
+class TestApiUsageRecorder(unittest.TestCase):
+    """
+    Unit tests for counting API calls through the botocore events
+    """
+
+    def setUp(self):
+        self.recorder = ApiUsageRecorder()
+        self.client = boto3.client(
+            "ec2",
+            region_name="eu-west-2",
+            aws_access_key_id="testing",
+            aws_secret_access_key="testing",
+        )
+        # register before the stubber which short circuits before-call
+        register_client(self.client)
+        self.stubber = Stubber(self.client)
+
+    def test_calls_are_counted_per_operation(self):
+        self.stubber.add_response(
+            "describe_security_groups",
+            {"SecurityGroups": [], "ResponseMetadata": {"RetryAttempts": 2}},
+        )
+        self.stubber.add_response("describe_security_groups", {"SecurityGroups": []})
+        self.stubber.add_response("describe_regions", {"Regions": []})
+        with self.stubber, recording(self.recorder):
+            self.client.describe_security_groups()
+            self.client.describe_security_groups()
+            self.client.describe_regions()
+
+        usage = {item["operation"]: item for item in self.recorder.get_usage()}
+        self.assertEqual(set(usage.keys()), {"DescribeSecurityGroups", "DescribeRegions"})
+        groups = usage["DescribeSecurityGroups"]
+        self.assertEqual(groups["calls"], 2)
+        self.assertEqual(groups["retries"], 2)
+        self.assertEqual(groups["region"], "eu-west-2")
+        self.assertEqual(groups["service"], "ec2")
+
+    def test_calls_are_counted_against_the_current_recorder(self):
+        other = ApiUsageRecorder()
+        self.stubber.add_response("describe_regions", {"Regions": []})
+        self.stubber.add_response("describe_regions", {"Regions": []})
+        self.stubber.add_response("describe_regions", {"Regions": []})
+        with self.stubber:
+            with recording(self.recorder):
+                self.client.describe_regions()
+                with recording(other):
+                    self.client.describe_regions()
+            # calls made without a recorder aren't counted
+            self.client.describe_regions()
+
+        self.assertEqual([usage["calls"] for usage in self.recorder.get_usage()], [1])
+        self.assertEqual([usage["calls"] for usage in other.get_usage()], [1])
+
+    def test_throttled_attempts_are_counted(self):
+        operation = self.client.meta.service_model.operation_model("DescribeRegions")
+        throttled = {"Error": {"Code": "RequestLimitExceeded"}}
+        self.recorder.needs_retry("eu-west-2", operation, response=(None, throttled))
+        self.recorder.needs_retry("eu-west-2", operation, response=(None, {}))
+        self.recorder.needs_retry("eu-west-2", operation, response=None)
+
+        [usage] = self.recorder.get_usage()
+        self.assertEqual(usage["throttles"], 1)
+        self.assertEqual(usage["calls"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+import unittest
+from datetime import datetime, timedelta, timezone
+
+from chalicelib.aws.api_usage import ApiUsageRecorder
+from chalicelib.aws.client_pool import ClientPool
+from chalicelib.aws.gds_aws_client import GdsAwsClient
+from tests.chalicelib.aws.test_client_default import TestClientDefault
+
+
+class TestClientPool(unittest.TestCase):
+    """
+    Unit tests for the bounded boto3 client pool
+    """
+
+    def test_least_recently_used_is_evicted(self):
+        pool = ClientPool(max_size=2)
+        pool.put("a", "client-a")
+        pool.put("b", "client-b")
+        pool.get("a")
+        pool.put("c", "client-c")
+
+        self.assertEqual(len(pool), 2)
+        self.assertIsNone(pool.get("b"))
+        self.assertEqual(pool.get("a"), "client-a")
+
+    def test_expired_clients_are_evicted(self):
+        pool = ClientPool(max_size=2)
+        expired = datetime.now(timezone.utc) - timedelta(seconds=1)
+        pool.put("a", "client-a", expiration=expired)
+        self.assertIsNone(pool.get("a"))
+        self.assertEqual(len(pool), 0)
+
+    def test_put_keeps_the_first_client(self):
+        pool = ClientPool(max_size=2)
+        pool.put("a", "client-a")
+        self.assertEqual(pool.put("a", "other"), "client-a")
+
+
+class TestGdsAwsClientPool(TestClientDefault):
+    """
+    Unit tests for reusing pooled clients in GdsAwsClient
+    """
+
+    def setUp(self):
+        self.client = GdsAwsClient(self.app)
+        self.client.client_pool = ClientPool(max_size=8)
+        self.session = {
+            "AccessKeyId": "AKIATEST",
+            "SecretAccessKey": "secret",
+            "SessionToken": "token",
+            "Expiration": datetime.now(timezone.utc) + timedelta(hours=1),
+        }
+
+    def test_clients_are_reused_per_service_and_region(self):
+        first = self.client.get_boto3_session_client("s3", self.session, "eu-west-2")
+        second = self.client.get_boto3_session_client("s3", self.session, "eu-west-2")
+        other = self.client.get_boto3_session_client("s3", self.session, "eu-west-1")
+
+        self.assertIs(first, second)
+        self.assertIsNot(first, other)
+        self.assertEqual(other.meta.region_name, "eu-west-1")
+
+    def test_clients_are_shared_by_criteria_with_recorders(self):
+        self.client.set_api_usage(ApiUsageRecorder())
+        first = self.client.get_boto3_session_client("kms", self.session, "eu-west-2")
+        other = GdsAwsClient(self.app)
+        other.client_pool = self.client.client_pool
+        other.set_api_usage(ApiUsageRecorder())
+        second = other.get_boto3_session_client("kms", self.session, "eu-west-2")
+        self.assertIs(first, second)
+        self.assertEqual(len(self.client.client_pool), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
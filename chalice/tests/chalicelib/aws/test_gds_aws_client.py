@@ -1,5 +1,18 @@
+import os
+import shutil
+import tempfile
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+import peewee
+
 from tests.chalicelib.aws.test_client_default import TestClientDefault
+from chalicelib import models
+from chalicelib.aws.api_usage import ApiUsageRecorder
+from chalicelib.aws.credential_cache import CredentialCache
 from chalicelib.aws.gds_aws_client import GdsAwsClient
+from chalicelib.ttl_cache import TtlCache
+from fixtures.sqlite_schema import attach_public_schema, create_audit_report_tables
 
 
 class TestGdsAwsClient(TestClientDefault):
@@ -47,4 +60,229 @@ class TestGdsAwsClient(TestClientDefault):
         self.assertIn("test_key_1", lookup)
         self.assertEqual(lookup["test_key_1"], "test_val_1")
         self.assertIn("test_key_2", lookup)
-        self.assertEqual(lookup["test_key_2"], "test_val_2")
\ No newline at end of file
+        self.assertEqual(lookup["test_key_2"], "test_val_2")
+
+    def test_paginate(self):
+        pages = [{"Roles": [1, 2]}, {}, {"Roles": [3]}]
+        requested = []
+
+        class FakePaginator:
+            def paginate(self, **kwargs):
+                requested.append(kwargs)
+                for page in pages:
+                    yield page
+
+        class FakeClient:
+            def get_paginator(self, operation_name):
+                requested.append(operation_name)
+                return FakePaginator()
+
+        items = self.client.paginate(FakeClient(), "list_roles", "Roles", PathPrefix="/")
+        # nothing is fetched until the generator is iterated
+        self.assertEqual(requested, [])
+        self.assertEqual(list(items), [1, 2, 3])
+        self.assertEqual(requested, ["list_roles", {"PathPrefix": "/"}])
+
+
+class TestGdsAwsClientResponseCache(TestClientDefault):
+    """
+    Unit tests for the per audit API response cache
+    """
+
+    def setUp(self):
+        GdsAwsClient.response_cache.clear()
+        self.db = peewee.SqliteDatabase(":memory:")
+        attach_public_schema(self.db)
+        create_audit_report_tables(self.db)
+        self.original_db = models.CachedDataResponse._meta.database
+        self.db.bind([models.CachedDataResponse])
+        self.calls = 0
+
+    def tearDown(self):
+        self.original_db.bind([models.CachedDataResponse])
+        self.db.close()
+        GdsAwsClient.response_cache.clear()
+
+    def fetch(self):
+        self.calls += 1
+        return [
+            {
+                "GroupId": "sg-1",
+                "Created": datetime(2019, 10, 1, 12, 0, 0, tzinfo=timezone.utc),
+            }
+        ]
+
+    def get_client(self, account_audit_id=1):
+        client = GdsAwsClient(self.app)
+        client.set_response_cache_context(account_audit_id, criterion_id=1)
+        return client
+
+    def test_no_audit_context_is_not_cached(self):
+        client = GdsAwsClient(self.app)
+        for _ in range(2):
+            client.get_cached_response(self.fetch, "ec2", "describe_security_groups")
+        self.assertEqual(self.calls, 2)
+
+    def test_response_is_cached_in_process(self):
+        client = self.get_client()
+        first = client.get_cached_response(
+            self.fetch, "ec2", "describe_security_groups", "eu-west-2"
+        )
+        first[0]["GroupId"] = "modified"
+        second = self.get_client().get_cached_response(
+            self.fetch, "ec2", "describe_security_groups", "eu-west-2"
+        )
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(second[0]["GroupId"], "sg-1")
+        self.assertEqual(second[0]["Created"], self.fetch()[0]["Created"])
+
+    def test_key_includes_region_and_audit(self):
+        self.get_client().get_cached_response(
+            self.fetch, "ec2", "describe_security_groups", "eu-west-1"
+        )
+        self.get_client().get_cached_response(
+            self.fetch, "ec2", "describe_security_groups", "eu-west-2"
+        )
+        self.get_client(account_audit_id=2).get_cached_response(
+            self.fetch, "ec2", "describe_security_groups", "eu-west-1"
+        )
+        self.assertEqual(self.calls, 3)
+
+    def test_response_is_shared_via_cached_data_response(self):
+        self.get_client().get_cached_response(self.fetch, "s3", "list_buckets")
+        # simulate a separate lambda container
+        GdsAwsClient.response_cache.clear()
+        response = self.get_client().get_cached_response(
+            self.fetch, "s3", "list_buckets"
+        )
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(response[0]["GroupId"], "sg-1")
+        cached = models.CachedDataResponse.get()
+        self.assertEqual(cached.invoke_class_name, "GdsAwsClient")
+        self.assertEqual(cached.invoke_class_get_data_method, "list_buckets")
+
+
+class TestGdsAwsClientCredentialCache(TestClientDefault):
+    """
+    Unit tests for reusing assume role sessions until they near expiry
+    """
+
+    def setUp(self):
+        self.client = GdsAwsClient(self.app)
+        self.client.credential_cache = CredentialCache()
+        self.client.get_chain_role_params = lambda: {
+            "account": "111111111111",
+            "chain_role": "ChainRole",
+            "target_role": "TargetRole",
+        }
+        self.client.assume_role = self.assume_role
+        self.assumed = []
+        self.expiration = datetime.now(timezone.utc) + timedelta(hours=1)
+
+    def assume_role(self, account, role, session=None):
+        self.assumed.append((account, role, session))
+        self.client.credential_cache.put(
+            self.client.get_session_name(account, role),
+            {"AccessKeyId": f"{account}-{role}", "Expiration": self.expiration},
+        )
+        return True
+
+    def test_chained_session_is_reused(self):
+        recorder = ApiUsageRecorder()
+        self.client.set_api_usage(recorder)
+        first = self.client.get_chained_session("222222222222")
+        second = self.client.get_chained_session("222222222222")
+
+        self.assertEqual(first, second)
+        self.assertEqual(len(self.assumed), 2)
+        # the target role is assumed with the chain session
+        self.assertEqual(self.assumed[1][2]["AccessKeyId"], "111111111111-ChainRole")
+        self.assertEqual(self.client.credential_cache.get_stats(), {"hits": 2, "misses": 2})
+        [usage] = recorder.get_usage()
+        self.assertEqual((usage["cache_hits"], usage["cache_misses"]), (2, 2))
+
+    def test_session_is_refreshed_ahead_of_expiry(self):
+        self.expiration = datetime.now(timezone.utc) + timedelta(seconds=60)
+        self.client.get_chained_session("222222222222")
+        self.expiration = datetime.now(timezone.utc) + timedelta(hours=1)
+        self.client.get_chained_session("222222222222")
+        self.assertEqual(len(self.assumed), 4)
+        # naive expirations are treated as UTC
+        self.assertTrue(
+            self.client.credential_cache.is_valid(
+                {"Expiration": datetime.utcnow() + timedelta(hours=1)}
+            )
+        )
+
+    def test_failed_assume_role_is_not_cached(self):
+        self.client.assume_role = lambda account, role, session=None: False
+        self.assertIsNone(self.client.get_chained_session("222222222222"))
+        self.assertFalse(self.client.assume_chained_role("222222222222"))
+
+
+class TestGdsAwsClientChainRoleParams(TestClientDefault):
+    """
+    Unit tests for caching the decrypted chain role parameters
+    """
+
+    def setUp(self):
+        self.cache_path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_path)
+        patcher = patch(
+            "chalicelib.aws.gds_aws_client.invariant_cache", TtlCache(self.cache_path)
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = GdsAwsClient(self.app)
+        self.fetched = 0
+
+    def fetch_chain_role_params(self):
+        self.fetched += 1
+        return {"account": "111111111111", "chain_role": "ChainRole"}
+
+    def test_params_are_only_cached_in_memory(self):
+        self.client.fetch_chain_role_params = self.fetch_chain_role_params
+        self.client.get_chain_role_params()
+        other = GdsAwsClient(self.app)
+        other.fetch_chain_role_params = self.fetch_chain_role_params
+        self.assertEqual(other.get_chain_role_params()["chain_role"], "ChainRole")
+        self.assertEqual(self.fetched, 1)
+        self.assertEqual(os.listdir(self.cache_path), [])
+
+
+class TestGdsAwsClientEnrich(TestClientDefault):
+    """
+    Unit tests for fetching per item details concurrently
+    """
+
+    def setUp(self):
+        self.client = GdsAwsClient(self.app)
+        self.read = []
+
+    def items(self, count):
+        for index in range(count):
+            self.read.append(index)
+            yield index
+
+    def fetch(self, item):
+        if item == 3:
+            raise ValueError("no details")
+        return item * 10
+
+    def test_details_are_in_item_order(self):
+        enriched = list(self.client.enrich(self.items(10), self.fetch, max_workers=4))
+        self.assertEqual([item for item, details, error in enriched], list(range(10)))
+        self.assertEqual(enriched[9][1], 90)
+
+    def test_errors_are_collected_per_item(self):
+        enriched = list(self.client.enrich(self.items(5), self.fetch, max_workers=2))
+        item, details, error = enriched[3]
+        self.assertIsNone(details)
+        self.assertIsInstance(error, ValueError)
+        self.assertEqual(enriched[4][1:], (40, None))
+
+    def test_items_are_read_one_chunk_ahead(self):
+        enriched = self.client.enrich(self.items(20), self.fetch, max_workers=2)
+        next(enriched)
+        # chunks are 4 * max_workers items
+        self.assertEqual(len(self.read), 8)
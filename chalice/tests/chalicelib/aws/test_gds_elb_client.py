@@ -0,0 +1,34 @@
+from tests.chalicelib.aws.test_client_default import TestClientDefault
+from chalicelib.aws.gds_elb_client import GdsElbClient
+
+
+class TestGdsElbClient(TestClientDefault):
+    """
+    Unit tests for fetching the load balancers with their attributes
+    """
+
+    def setUp(self):
+        self.client = GdsElbClient(self.app)
+        self.client.get_balancer_list = lambda session: (
+            {"LoadBalancerArn": arn, "LoadBalancerName": arn}
+            for arn in ["elb-1", "elb-2", "elb-3"]
+        )
+        self.client.get_balancer_attributes = self.get_balancer_attributes
+
+    def get_balancer_attributes(self, session, load_balancer_arn):
+        if load_balancer_arn == "elb-2":
+            raise Exception("LoadBalancerNotFound")
+        return [{"Key": "access_logs.s3.enabled", "Value": "true"}]
+
+    def test_balancers_are_returned_with_their_attributes(self):
+        balancers = list(self.client.get_balancer_list_with_attributes({}))
+        self.assertEqual(
+            [balancer["LoadBalancerArn"] for balancer in balancers],
+            ["elb-1", "elb-2", "elb-3"],
+        )
+        self.assertEqual(balancers[0]["access_logs.s3.enabled"], "true")
+        self.assertEqual(balancers[2]["access_logs.s3.enabled"], "true")
+
+    def test_balancers_without_attributes_are_still_returned(self):
+        balancers = list(self.client.get_balancer_list_with_attributes({}))
+        self.assertNotIn("access_logs.s3.enabled", balancers[1])
@@ -0,0 +1,33 @@
+from tests.chalicelib.aws.test_client_default import TestClientDefault
+from chalicelib.aws.gds_kms_client import GdsKmsClient
+
+
+class TestGdsKmsClient(TestClientDefault):
+    """
+    Unit tests for fetching the keys with their details
+    """
+
+    def setUp(self):
+        self.client = GdsKmsClient(self.app)
+        self.client.get_key_list = lambda session: (
+            {"KeyId": key_id, "KeyArn": f"arn:aws:kms:eu-west-2:123456789012:key/{key_id}"}
+            for key_id in ["key-1", "key-2", "key-3"]
+        )
+        self.client.get_key_rotation_status = self.get_key_rotation_status
+        self.client.get_key_details = lambda session, key_arn: {"Enabled": True}
+
+    def get_key_rotation_status(self, session, key_arn):
+        if key_arn.endswith("key-2"):
+            raise Exception("AccessDeniedException")
+        return {"KeyRotationEnabled": True}
+
+    def test_keys_are_returned_with_their_details(self):
+        keys = list(self.client.get_key_list_with_details({}))
+        self.assertEqual([key["KeyId"] for key in keys], ["key-1", "key-2", "key-3"])
+        self.assertTrue(keys[0]["KeyRotationEnabled"])
+        self.assertTrue(keys[2]["Enabled"])
+
+    def test_keys_without_details_are_still_returned(self):
+        keys = list(self.client.get_key_list_with_details({}))
+        self.assertNotIn("KeyRotationEnabled", keys[1])
+        self.assertNotIn("Enabled", keys[1])
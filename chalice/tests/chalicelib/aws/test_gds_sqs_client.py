@@ -0,0 +1,108 @@
+import os
+import shutil
+import tempfile
+from unittest.mock import patch
+
+from tests.chalicelib.aws.test_client_default import TestClientDefault
+from chalicelib.aws.gds_sqs_client import GdsSqsClient
+from chalicelib.ttl_cache import TtlCache
+
+
+class FakeSqs:
+    """
+    Records send_message_batch calls and fails the requested entries once
+    """
+
+    def __init__(self, fail_once=(), sender_fault=()):
+        self.fail_once = set(fail_once)
+        self.sender_fault = set(sender_fault)
+        self.batches = []
+
+    def send_message_batch(self, QueueUrl, Entries):
+        self.batches.append([entry["Id"] for entry in Entries])
+        response = {"Successful": [], "Failed": []}
+        for entry in Entries:
+            index = int(entry["Id"])
+            if index in self.sender_fault:
+                response["Failed"].append(
+                    {"Id": entry["Id"], "SenderFault": True, "Code": "InvalidMessage"}
+                )
+            elif index in self.fail_once:
+                self.fail_once.remove(index)
+                response["Failed"].append(
+                    {"Id": entry["Id"], "SenderFault": False, "Code": "InternalError"}
+                )
+            else:
+                response["Successful"].append(
+                    {"Id": entry["Id"], "MessageId": f"message-{index}"}
+                )
+        return response
+
+    def delete_message_batch(self, QueueUrl, Entries):
+        self.batches.append([entry["ReceiptHandle"] for entry in Entries])
+        failed = [
+            {"Id": entry["Id"], "SenderFault": True, "Code": "ReceiptHandleIsInvalid"}
+            for entry in Entries
+            if entry["ReceiptHandle"] in self.sender_fault
+        ]
+        return {"Successful": [], "Failed": failed}
+
+
+class TestGdsSqsClient(TestClientDefault):
+    """
+    Unit tests for the batched SQS producer
+    """
+
+    def setUp(self):
+        os.environ.setdefault("CSW_REGION", "eu-west-2")
+        self.client = GdsSqsClient(self.app)
+
+    def send(self, sqs, bodies):
+        self.client.get_default_client = lambda service_name, region: sqs
+        return self.client.send_message_batch("queue", bodies)
+
+    def test_sends_in_batches_of_ten(self):
+        sqs = FakeSqs()
+        message_ids = self.send(sqs, [f"body-{index}" for index in range(23)])
+        self.assertEqual([len(batch) for batch in sqs.batches], [10, 10, 3])
+        self.assertEqual(message_ids[22], "message-22")
+
+    def test_retries_only_failed_entries(self):
+        sqs = FakeSqs(fail_once=[3, 12])
+        message_ids = self.send(sqs, [f"body-{index}" for index in range(15)])
+        self.assertEqual(sqs.batches[-1], ["3", "12"])
+        self.assertNotIn(None, message_ids)
+
+    def test_sender_faults_are_not_retried(self):
+        sqs = FakeSqs(sender_fault=[1])
+        message_ids = self.send(sqs, ["a", "b", "c"])
+        self.assertEqual(len(sqs.batches), 1)
+        self.assertEqual(message_ids, ["message-0", None, "message-2"])
+
+    def test_batches_respect_payload_size(self):
+        bodies = ["x" * 100000 for _ in range(4)]
+        batches = list(self.client.get_message_batches(bodies, range(4)))
+        self.assertEqual(batches, [[0, 1], [2, 3]])
+
+    def test_delete_returns_undeleted_receipt_handles(self):
+        sqs = FakeSqs(sender_fault=["handle-11"])
+        self.client.get_default_client = lambda service_name, region: sqs
+        handles = [f"handle-{index}" for index in range(12)]
+        failed = self.client.delete_message_batch("queue", handles)
+        self.assertEqual([len(batch) for batch in sqs.batches], [10, 2])
+        self.assertEqual(failed, ["handle-11"])
+
+    def test_queue_account_is_cached_per_credentials(self):
+        cache_path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_path)
+        patcher = patch(
+            "chalicelib.aws.gds_sqs_client.invariant_cache", TtlCache(cache_path)
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        accounts = {"AKIA1": "111111111111", "AKIA2": "222222222222"}
+        self.client.fetch_account = lambda: accounts[os.environ["AWS_ACCESS_KEY_ID"]]
+        for access_key, account in accounts.items():
+            with patch.dict(os.environ, {"AWS_ACCESS_KEY_ID": access_key}):
+                with self.subTest(access_key=access_key):
+                    self.assertIn(f"/{account}/", self.client.get_queue_url("queue"))
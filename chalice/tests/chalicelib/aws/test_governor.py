@@ -0,0 +1,119 @@
+import unittest
+from unittest import mock
+
+import boto3
+
+from chalicelib.aws.api_usage import ApiUsageRecorder, recording
+from chalicelib.aws.governor import ApiGovernor, TokenBucket
+
+
+class FakeHttpResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+class TestTokenBucket(unittest.TestCase):
+    """
+    Unit tests for the adaptive token bucket
+    """
+
+    @mock.patch("chalicelib.aws.governor.monotonic", return_value=100)
+    def test_waits_once_the_tokens_are_used(self, monotonic):
+        bucket = TokenBucket(rate=2)
+        self.assertEqual([bucket.acquire() for _ in range(3)], [0, 0, 0.5])
+
+    def test_throttling_halves_the_rate_until_calls_succeed(self):
+        bucket = TokenBucket(rate=8)
+        bucket.throttled()
+        bucket.throttled()
+        self.assertEqual(bucket.rate, 2)
+        self.assertEqual(bucket.backoff, 0.2)
+        bucket.succeeded()
+        self.assertEqual(bucket.rate, 2.5)
+        self.assertEqual(bucket.backoff, 0)
+
+
+class TestApiGovernor(unittest.TestCase):
+    """
+    Unit tests for pacing calls through the botocore events
+    """
+
+    def setUp(self):
+        self.governor = ApiGovernor(max_concurrency=1, rate=1000)
+        self.key = ("123456789012", "ec2", "eu-west-2")
+
+    def test_attempts_hold_the_concurrency_cap(self):
+        self.governor.before_send(self.key)
+        self.assertFalse(self.governor.semaphore.acquire(blocking=False))
+        self.governor.needs_retry(self.key, response=None)
+        self.assertTrue(self.governor.semaphore.acquire(blocking=False))
+
+    def test_throttles_slow_the_bucket(self):
+        throttled = (FakeHttpResponse(400), {"Error": {"Code": "RequestLimitExceeded"}})
+        self.governor.before_send(self.key)
+        self.governor.needs_retry(self.key, response=throttled)
+
+        [metrics] = self.governor.get_metrics()
+        self.assertEqual(metrics["attempts"], 1)
+        self.assertEqual(metrics["throttles"], 1)
+        self.assertEqual(metrics["rate"], 500)
+
+    @mock.patch("chalicelib.aws.governor.sleep")
+    def test_waits_are_recorded_against_the_criterion(self, sleep):
+        recorder = ApiUsageRecorder()
+        bucket = self.governor.get_bucket(self.key)
+        bucket.tokens = -1
+        with mock.patch(
+            "chalicelib.aws.governor.perf_counter", side_effect=[0, 0.25]
+        ), recording(recorder):
+            self.governor.before_send(
+                self.key, event_name="before-send.ec2.DescribeVpcs"
+            )
+        self.governor.needs_retry(self.key, response=None)
+
+        sleep.assert_called_once()
+        [usage] = recorder.get_usage()
+        self.assertEqual(usage["operation"], "DescribeVpcs")
+        self.assertEqual(usage["wait_ms"], 250)
+
+    def test_register_keys_by_account_service_and_region(self):
+        client = boto3.client(
+            "elb",
+            region_name="eu-west-1",
+            aws_access_key_id="testing",
+            aws_secret_access_key="testing",
+        )
+        self.governor.register(client, "123456789012")
+        client.meta.events.emit(
+            "before-send.elastic-load-balancing.DescribeLoadBalancers", request=None
+        )
+        self.governor.needs_retry(("123456789012", "elb", "eu-west-1"))
+        [metrics] = self.governor.get_metrics()
+        self.assertEqual(
+            (metrics["account"], metrics["service"], metrics["region"]),
+            ("123456789012", "elb", "eu-west-1"),
+        )
+
+    def test_permit_is_released_if_an_error_skips_needs_retry(self):
+        client = boto3.client(
+            "elb",
+            region_name="eu-west-1",
+            aws_access_key_id="testing",
+            aws_secret_access_key="testing",
+        )
+        self.governor.register(client, "123456789012")
+
+        def fail(**kwargs):
+            raise RuntimeError("failed between the governor's hooks")
+
+        # the request fails after the governor's before-send then
+        # needs-retry raises before the governor's handler is called
+        client.meta.events.register("before-send", fail)
+        client.meta.events.register_first("needs-retry", fail)
+        with self.assertRaises(RuntimeError):
+            client.describe_load_balancers()
+        self.assertTrue(self.governor.semaphore.acquire(blocking=False))
+
+
+if __name__ == "__main__":
+    unittest.main()
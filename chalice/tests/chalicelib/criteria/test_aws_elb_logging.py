@@ -86,3 +86,13 @@ class TestElbLogging(CriteriaSubclassTestCaseMixin, TestCaseWithAttrAssert):
     def test_evaluate_pass(self):
         output = self._evaluate_invariant_assertions({}, self.test_data[0], [])
         self._evaluate_passed_status_assertions(self.test_data[0], output)
+
+    def test_evaluate_without_attributes(self):
+        item = {
+            key: value
+            for key, value in self.test_data[0].items()
+            if not key.startswith("access_logs")
+        }
+        output = self._evaluate_invariant_assertions({}, item, [])
+        self._evaluate_inapplicable_status_assertions(item, output)
+        self.assertIn("Unable to retrieve", output["annotation"])
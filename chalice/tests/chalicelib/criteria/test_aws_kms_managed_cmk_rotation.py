@@ -1,3 +1,5 @@
+from botocore.exceptions import ClientError
+
 from chalicelib.criteria.aws_kms_managed_cmk_rotation import ManagedCmkRotation
 
 from tests.chalicelib.criteria.test_criteria_default import (
@@ -91,3 +93,22 @@ class TestManagedCmkRotation(CriteriaSubclassTestCaseMixin, TestCaseWithAttrAsse
                     )
                 else:
                     self._evaluate_passed_status_assertions(self.test_data[key], output)
+
+    def test_evaluate_without_details(self):
+        item = {
+            "KeyArn": self.test_data["pass"]["KeyArn"],
+            "KeyId": self.test_data["pass"]["KeyId"],
+        }
+        output = self._evaluate_invariant_assertions({}, item, [])
+        self._evaluate_inapplicable_status_assertions(item, output)
+        self.assertIn("Unable to retrieve", output["annotation"])
+
+    def test_get_data_raises_errors_on_later_pages(self):
+        def get_key_list_with_details(session):
+            yield self.test_data["pass"]
+            raise ClientError({"Error": {"Code": "ThrottlingException"}}, "ListKeys")
+
+        self.subclass.client.get_key_list_with_details = get_key_list_with_details
+        data = self.subclass.get_data(None)
+        with self.assertRaises(ClientError):
+            list(data)
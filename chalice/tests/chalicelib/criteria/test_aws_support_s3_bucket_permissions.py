@@ -1,3 +1,8 @@
+import peewee
+
+from app import CloudSecurityWatch
+from chalicelib import models
+from chalicelib.aws.gds_aws_client import GdsAwsClient
 from chalicelib.criteria.aws_support_s3_bucket_permissions import (
     S3BucketReadAll,
     S3BucketOpenAccess,
@@ -8,6 +13,7 @@ from tests.chalicelib.criteria.test_criteria_default import (
     TestCaseWithAttrAssert,
 )
 from tests.chalicelib.criteria.test_data import S3_BUCKET_PERMISSIONS
+from fixtures.sqlite_schema import attach_public_schema, create_audit_report_tables
 
 
 class TestS3BucketPermissionsMixin(CriteriaSubclassTestCaseMixin):
@@ -179,6 +185,17 @@ class TestS3BucketOpenAccess(TestS3BucketPermissionsMixin, TestCaseWithAttrAsser
             output = self._evaluate_invariant_assertions(event, item, whitelist)
             self._evaluate_failed_status_assertions(item, output)
 
+    def test_evaluate_item_does_not_leak_annotation(self):
+        """
+        a compliant bucket evaluated after a failed one has no annotation
+        """
+        failed = S3_BUCKET_PERMISSIONS["open_access_fails"]["flaggedResources"][0]
+        passed = S3_BUCKET_PERMISSIONS["read_all_fails"]["flaggedResources"][0]
+        outputs = self.subclass.evaluate_batch([failed, passed], max_workers=2)
+        self.assertIn("annotation", outputs[0])
+        self.assertNotIn("annotation", outputs[1])
+        self.assertEqual(self.subclass.annotation, "")
+
 
 class TestS3BucketWriteAll(TestS3BucketPermissionsMixin, TestCaseWithAttrAssert):
     def setUp(self):
@@ -198,3 +215,62 @@ class TestS3BucketWriteAll(TestS3BucketPermissionsMixin, TestCaseWithAttrAssert)
             # tests
             output = self._evaluate_invariant_assertions(event, item, whitelist)
             self._evaluate_failed_status_assertions(item, output)
+
+
+class TestS3BucketPermissionsSharedResult(TestCaseWithAttrAssert):
+    """
+    The sibling criteria share one TA refresh, result and enrichment per audit
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = CloudSecurityWatch("test_app")
+
+    def setUp(self):
+        GdsAwsClient.response_cache.clear()
+        self.db = peewee.SqliteDatabase(":memory:")
+        attach_public_schema(self.db)
+        create_audit_report_tables(self.db)
+        self.original_db = models.CachedDataResponse._meta.database
+        self.db.bind([models.CachedDataResponse])
+        self.calls = {"refresh": 0, "result": 0, "acl": 0}
+
+    def tearDown(self):
+        self.original_db.bind([models.CachedDataResponse])
+        self.db.close()
+        GdsAwsClient.response_cache.clear()
+
+    def build_criterion(self, CriterionClass, criterion_id):
+        criterion = CriterionClass(self.app)
+        criterion.set_response_cache_context(1, criterion_id)
+
+        def refresh(session, check_id):
+            self.calls["refresh"] += 1
+            return True
+
+        def result(session, checkId, language):
+            self.calls["result"] += 1
+            return S3_BUCKET_PERMISSIONS["write_all_fails"]
+
+        def acl(session, name):
+            self.calls["acl"] += 1
+            return {"Grants": []}
+
+        criterion.client.refresh_check_with_wait = refresh
+        criterion.client.describe_trusted_advisor_check_result = result
+        criterion.resource_client.get_bucket_acl = acl
+        return criterion
+
+    def test_siblings_share_check_result(self):
+        siblings = [S3BucketReadAll, S3BucketOpenAccess, S3BucketWriteAll]
+        outputs = [
+            self.build_criterion(CriterionClass, index).get_data(None)
+            for index, CriterionClass in enumerate(siblings, 1)
+        ]
+        flagged = S3_BUCKET_PERMISSIONS["write_all_fails"]["flaggedResources"]
+        self.assertEqual(self.calls["refresh"], 1)
+        self.assertEqual(self.calls["result"], 1)
+        self.assertEqual(self.calls["acl"], len(flagged))
+        for output in outputs:
+            self.assertEqual(len(output), len(flagged))
+            self.assertEqual(output[0]["originalResourceData"], {"Grants": []})
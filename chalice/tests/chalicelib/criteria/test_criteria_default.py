@@ -10,6 +10,7 @@ import os
 from app import CloudSecurityWatch
 from tests.chalicelib.criteria.test_data import EMPTY_SUMMARY, SESSION
 from chalicelib.criteria.criteria_default import CriteriaDefault
+from chalicelib.utilities import Utilities
 
 
 os.environ["CSW_CRITERIA_UNIT_TESTING"] = "1"
@@ -229,6 +230,74 @@ class TestCriteriaDefault(TestCaseWithAttrAssert):
                 msg="empty summary does not match the prototype",
             )
 
+    def test_summarize_pages(self):
+        """
+        summarizing page by page counts the regions from every page
+        """
+        self.app.utilities = Utilities()
+        compliance = {"is_applicable": True, "is_compliant": True}
+        pages = [
+            [{"region": "eu-west-1", "resource_name": "a", "resource_compliance": compliance}],
+            [{"region": "eu-west-2", "resource_name": "b", "resource_compliance": compliance}],
+        ]
+        summary = None
+        for page in pages:
+            summary = self.criteria_default.summarize(page, summary)
+        self.assertEqual(summary["all"]["display_stat"], 2)
+        self.assertEqual(summary["regions"]["count"], 2)
+        self.assertEqual(summary["regions"]["list"], ["eu-west-1", "eu-west-2"])
+
+    def test_get_resource_hash(self):
+        self.app.utilities = Utilities()
+        resource_hash = self.criteria_default.get_resource_hash({"a": 1, "b": [1, 2]})
+        with self.subTest("key order doesn't matter"):
+            self.assertEqual(
+                self.criteria_default.get_resource_hash({"b": [1, 2], "a": 1}),
+                resource_hash,
+            )
+        with self.subTest("content changes"):
+            self.assertNotEqual(
+                self.criteria_default.get_resource_hash({"a": 2, "b": [1, 2]}),
+                resource_hash,
+            )
+        with self.subTest("version changes"):
+            self.criteria_default.version = 2
+            self.assertNotEqual(
+                self.criteria_default.get_resource_hash({"a": 1, "b": [1, 2]}),
+                resource_hash,
+            )
+
+    def test_evaluate_item_not_implemented(self):
+        with self.assertRaises(NotImplementedError):
+            self.criteria_default.evaluate_item({})
+
+    def test_evaluate_item_adapts_legacy_evaluate(self):
+        """
+        legacy evaluate methods write self.annotation which must not
+        leak into the criterion or between items
+        """
+
+        class LegacyCriterion(CriteriaDefault):
+            def evaluate(self, event, item, whitelist=[]):
+                if item["fail"]:
+                    self.annotation = f"{item['id']} failed"
+                compliance_type = "NON_COMPLIANT" if item["fail"] else "COMPLIANT"
+                return self.build_evaluation(
+                    item["id"], compliance_type, event, self.resource_type, self.annotation
+                )
+
+        criterion = LegacyCriterion(self.app)
+        items = [{"id": str(index), "fail": index % 2 == 0} for index in range(10)]
+        outputs = criterion.evaluate_batch(items, max_workers=4)
+        self.assertEqual([output["resource_id"] for output in outputs], [item["id"] for item in items])
+        for item, output in zip(items, outputs):
+            with self.subTest(item=item["id"]):
+                if item["fail"]:
+                    self.assertEqual(output["annotation"], f"{item['id']} failed")
+                else:
+                    self.assertNotIn("annotation", output)
+        self.assertEqual(criterion.annotation, "")
+
 
 class CriteriaSubclassTestCaseMixin(object):
     """
@@ -0,0 +1,61 @@
+import unittest
+
+from app import CloudSecurityWatch
+from chalicelib.criteria.aws_cloudtrail_log_validation import CloudTrailFileValidation
+from chalicelib.criteria.aws_cloudtrail_multiregional import MultiregionalCloudtrail
+from chalicelib.criteria.aws_ec2_egress_restriction import (
+    UnrestrictedEgressSecurityGroups,
+)
+from chalicelib.criteria.aws_ec2_security_group_ingress_open import (
+    AwsEc2SecurityGroupIngressOpen,
+)
+from chalicelib.criteria.aws_ec2_security_group_ingress_ssh import (
+    AwsEc2SecurityGroupIngressSsh,
+)
+
+
+class TestGroupedCriteria(unittest.TestCase):
+    """
+    Criteria with the same data_source are evaluated over the data
+    fetched by the first criterion in the group so their get_data
+    must return the same thing
+    """
+
+    groups = {
+        "ec2.describe_security_groups": (
+            [
+                AwsEc2SecurityGroupIngressOpen,
+                AwsEc2SecurityGroupIngressSsh,
+                UnrestrictedEgressSecurityGroups,
+            ],
+            "describe_security_groups",
+        ),
+        "cloudtrail.describe_trails": (
+            [CloudTrailFileValidation, MultiregionalCloudtrail],
+            "describe_trails",
+        ),
+    }
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = CloudSecurityWatch("test_app")
+
+    def test_groups_share_get_data(self):
+        for data_source, (classes, method_name) in self.groups.items():
+            responses = []
+            for CheckClass in classes:
+                with self.subTest(criterion=CheckClass.__name__):
+                    self.assertEqual(CheckClass.data_source, data_source)
+                check = CheckClass(self.app)
+                setattr(
+                    check.client,
+                    method_name,
+                    lambda session, **kwargs: [{"session": session, **kwargs}],
+                )
+                responses.append(check.get_data("session", region="eu-west-2"))
+            with self.subTest(data_source=data_source):
+                self.assertEqual(responses[1:], responses[:-1])
+
+
+if __name__ == "__main__":
+    unittest.main()
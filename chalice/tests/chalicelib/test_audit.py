@@ -0,0 +1,636 @@
+import functools
+import json
+import os
+import unittest
+from unittest.mock import Mock, patch
+
+import peewee
+
+from app import app
+
+# chalicelib.audit names its queues with the prefix when it is imported
+app.prefix = "test"
+app.env = "test"
+os.environ.setdefault("CSW_ENV", "test")
+
+from chalicelib import audit, messages, models  # noqa: E402
+from chalicelib.criteria.criteria_default import CriteriaDefault  # noqa: E402
+from chalicelib.database_handle import AuditResourceWriter  # noqa: E402
+from chalicelib.exception_index import ResourceExceptionIndex  # noqa: E402
+from chalicelib.sqs_batch import SqsBatchFailed  # noqa: E402
+from fixtures.sqlite_schema import (  # noqa: E402
+    attach_public_schema,
+    create_account_subscription_table,
+    create_audit_criterion_tables,
+    create_audit_report_tables,
+    create_audit_resource_tables,
+    create_criterion_tables,
+    create_processed_message_table,
+)
+
+
+def get_sqs_event(*bodies):
+    return {
+        "Records": [
+            {
+                "messageId": f"message-{index}",
+                "receiptHandle": f"handle-{index}",
+                "body": body,
+            }
+            for index, body in enumerate(bodies)
+        ]
+    }
+
+
+class TestAccountAuditCriteria(unittest.TestCase):
+    """
+    Unit tests for creating the audit criteria and sending their messages
+    """
+
+    def setUp(self):
+        self.db = peewee.SqliteDatabase(":memory:")
+        attach_public_schema(self.db)
+        create_criterion_tables(self.db)
+        create_audit_criterion_tables(self.db)
+        create_processed_message_table(self.db)
+        self.models = [
+            models.Criterion,
+            models.CriterionParams,
+            models.AccountAudit,
+            models.AuditCriterion,
+            models.AuditCriterionRegion,
+            models.ProcessedMessage,
+        ]
+        self.original_db = models.AuditCriterion._meta.database
+        self.db.bind(self.models)
+        self.criteria = [
+            models.Criterion.create(
+                criterion_name=f"criterion {index}",
+                criteria_provider_id=1,
+                invoke_class_name="chalicelib.criteria.Check",
+                invoke_class_get_data_method="describe",
+                title="",
+                description="",
+                why_is_it_important="",
+                how_do_i_fix_it="",
+            )
+            for index in range(3)
+        ]
+        self.audit = models.AccountAudit.create(account_subscription_id=1)
+        patcher = patch("chalicelib.audit.GdsSqsClient")
+        self.sqs = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+        self.sqs.get_queue_url.return_value = "https://queue"
+        self.sqs.send_message_batch.side_effect = lambda url, bodies: [
+            f"sent-{index}" for index in range(len(bodies))
+        ]
+
+    def tearDown(self):
+        self.original_db.bind(self.models)
+        self.db.close()
+
+    def invoke(self):
+        body = json.dumps({"audit_id": self.audit.id, "v": 1})
+        return audit.account_audit_criteria(get_sqs_event(body), None)
+
+    def get_sent_criterion_ids(self):
+        _, bodies = self.sqs.send_message_batch.call_args[0]
+        return sorted(json.loads(body)["criterion_id"] for body in bodies)
+
+    def test_sends_a_message_per_criterion(self):
+        self.invoke()
+        self.assertEqual(models.AuditCriterion.select().count(), 3)
+        self.assertEqual(
+            self.get_sent_criterion_ids(), [criterion.id for criterion in self.criteria]
+        )
+
+    def test_raises_if_messages_are_not_sent(self):
+        self.sqs.send_message_batch.side_effect = lambda url, bodies: [
+            None for _ in bodies
+        ]
+        with self.assertRaises(SqsBatchFailed):
+            self.invoke()
+
+    def test_redelivery_resends_undispatched_criteria(self):
+        # an earlier delivery created the criteria then failed to send
+        # one of them which is recorded in the ledger as not dispatched
+        dispatched = models.AuditCriterion.create(
+            account_audit_id=self.audit, criterion_id=self.criteria[0]
+        )
+        models.ProcessedMessage.record("message-0", audit.get_dispatch_key(dispatched.id))
+        models.AuditCriterion.create(
+            account_audit_id=self.audit, criterion_id=self.criteria[1]
+        )
+        self.invoke()
+
+        self.assertEqual(models.AuditCriterion.select().count(), 3)
+        self.assertEqual(
+            self.get_sent_criterion_ids(),
+            [self.criteria[1].id, self.criteria[2].id],
+        )
+
+    def test_redelivery_after_a_partial_send_only_sends_the_rest(self):
+        self.sqs.send_message_batch.side_effect = lambda url, bodies: [
+            "sent-0", None, "sent-2"
+        ]
+        with self.assertRaises(SqsBatchFailed):
+            self.invoke()
+        _, bodies = self.sqs.send_message_batch.call_args[0]
+        unsent = json.loads(bodies[1])["criterion_id"]
+        self.sqs.send_message_batch.side_effect = lambda url, bodies: [
+            f"sent-{index}" for index in range(len(bodies))
+        ]
+        self.invoke()
+
+        self.assertEqual(self.get_sent_criterion_ids(), [unsent])
+
+    @patch.dict(os.environ, {"CSW_REGIONAL_FAN_OUT": "true"})
+    @patch("chalicelib.audit.get_region_names")
+    def test_redelivery_resends_undispatched_regions(self, get_region_names):
+        get_region_names.return_value = ["eu-west-1", "eu-west-2"]
+        for criterion in self.criteria:
+            audit_criterion = models.AuditCriterion.create(
+                account_audit_id=self.audit, criterion_id=criterion
+            )
+            models.AuditCriterionRegion.create(
+                audit_criterion_id=audit_criterion, region="eu-west-1"
+            )
+            models.ProcessedMessage.record(
+                "message-0", audit.get_dispatch_key(audit_criterion.id, "eu-west-1")
+            )
+        self.invoke()
+
+        _, bodies = self.sqs.send_message_batch.call_args[0]
+        self.assertEqual(
+            {json.loads(body)["region"] for body in bodies}, {"eu-west-2"}
+        )
+        self.assertEqual(len(bodies), 3)
+        self.assertEqual(models.AuditCriterionRegion.select().count(), 6)
+
+
+class TestTrustedAdvisorOrchestration(unittest.TestCase):
+    """
+    Unit tests for dispatching the TA criteria once their checks are refreshed
+    """
+
+    def setUp(self):
+        self.db = peewee.SqliteDatabase(":memory:")
+        attach_public_schema(self.db)
+        create_account_subscription_table(self.db)
+        create_audit_criterion_tables(self.db)
+        create_processed_message_table(self.db)
+        self.models = [
+            models.AccountSubscription,
+            models.AccountAudit,
+            models.AuditCriterion,
+            models.ProcessedMessage,
+        ]
+        self.original_db = models.AuditCriterion._meta.database
+        self.db.bind(self.models)
+        subscription = models.AccountSubscription.create(
+            account_id=123456789012, account_name="test", product_team_id=1
+        )
+        self.audit = models.AccountAudit.create(account_subscription_id=subscription)
+        self.audit_criteria = [
+            models.AuditCriterion.create(
+                account_audit_id=self.audit, criterion_id=criterion_id
+            )
+            for criterion_id in range(1, 3)
+        ]
+        self.pending = {
+            "check": [audit_criterion.id for audit_criterion in self.audit_criteria]
+        }
+        self.sqs = Mock()
+        self.sqs.get_queue_url.return_value = "https://queue"
+        self.sqs.send_message.return_value = "sent"
+        patches = [
+            patch("chalicelib.audit.GdsSupportClient"),
+            patch("chalicelib.audit.TrustedAdvisorOrchestrator"),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.orchestrator = audit.TrustedAdvisorOrchestrator.return_value
+        self.orchestrator.start.return_value = {
+            "account_audit_id": self.audit.id,
+            "attempt": 0,
+            "pending": self.pending,
+            "refreshable": ["check"],
+        }
+
+    def tearDown(self):
+        self.original_db.bind(self.models)
+        self.db.close()
+
+    def test_redelivery_does_not_restart_the_orchestration(self):
+        for _ in range(2):
+            audit.start_trusted_advisor_orchestration(
+                self.sqs, "https://queue", self.audit, self.pending, None, "message-0"
+            )
+
+        self.orchestrator.start.assert_called_once()
+        self.sqs.send_message.assert_called_once()
+
+    def test_raises_if_the_orchestration_is_not_sent(self):
+        self.sqs.send_message.return_value = None
+        with self.assertRaises(Exception):
+            audit.start_trusted_advisor_orchestration(
+                self.sqs, "https://queue", self.audit, self.pending, None, "message-0"
+            )
+        self.assertEqual(models.ProcessedMessage.select().count(), 0)
+
+    def test_redelivered_poll_does_not_resend_criteria(self):
+        orchestration = self.orchestrator.start.return_value
+        self.orchestrator.poll.return_value = (
+            {"check": {"refreshed": True}},
+            dict(orchestration, attempt=1),
+        )
+        # the criteria are sent but the next poll isn't
+        self.sqs.send_message.side_effect = ["sent", "sent", None]
+        with self.assertRaises(Exception):
+            audit.poll_trusted_advisor_orchestration(
+                self.sqs, orchestration, None, "message-0"
+            )
+        self.sqs.send_message.side_effect = None
+        audit.poll_trusted_advisor_orchestration(
+            self.sqs, orchestration, None, "message-0"
+        )
+
+        sent = [
+            messages.decode(call[0][1]) for call in self.sqs.send_message.call_args_list
+        ]
+        self.assertEqual(
+            [message.get("audit_criterion_id") for message in sent],
+            [self.audit_criteria[0].id, self.audit_criteria[1].id, None, None],
+        )
+
+
+class TestAuditEvaluatedMetric(unittest.TestCase):
+    """
+    Unit tests for counting evaluated criteria and completing the audit
+    """
+
+    def setUp(self):
+        self.db = peewee.SqliteDatabase(":memory:")
+        attach_public_schema(self.db)
+        create_account_subscription_table(self.db)
+        create_audit_criterion_tables(self.db)
+        create_audit_resource_tables(self.db)
+        create_audit_report_tables(self.db)
+        self.models = [
+            models.AccountSubscription,
+            models.AccountAudit,
+            models.AuditCriterion,
+            models.AuditResource,
+            models.ResourceCompliance,
+            models.CachedDataResponse,
+            models.AccountLatestAudit,
+        ]
+        self.original_db = models.AuditCriterion._meta.database
+        self.db.bind(self.models)
+        subscription = models.AccountSubscription.create(
+            account_id=123456789012, account_name="test", product_team_id=1
+        )
+        self.audit = models.AccountAudit.create(
+            account_subscription_id=subscription, active_criteria=2
+        )
+        self.audit_criteria = [
+            models.AuditCriterion.create(
+                account_audit_id=self.audit,
+                criterion_id=criterion_id,
+                processed=True,
+                attempted=True,
+            )
+            for criterion_id in [1, 2]
+        ]
+        patcher = patch("chalicelib.audit.GdsSqsClient")
+        self.sqs = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+        self.sqs.get_queue_url.return_value = "https://queue"
+        self.sqs.send_message.return_value = "sent"
+        # the report serializes the related records which aren't under test
+        for model in [models.AccountAudit, models.AuditCriterion]:
+            patcher = patch.object(model, "serialize", lambda record: {"id": record.id})
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.original_db.bind(self.models)
+        self.db.close()
+
+    def invoke(self, audit_criterion):
+        body = messages.encode(messages.audit_criterion_message(audit_criterion))
+        return audit.audit_evaluated_metric(get_sqs_event(body), None)
+
+    def get_audit(self):
+        return models.AccountAudit.get_by_id(self.audit.id)
+
+    def test_last_criterion_completes_the_audit(self):
+        self.invoke(self.audit_criteria[0])
+        self.assertFalse(self.get_audit().finished)
+        self.invoke(self.audit_criteria[1])
+
+        self.assertTrue(self.get_audit().finished)
+        self.sqs.send_message.assert_called_once()
+        latest = models.AccountLatestAudit.get()
+        self.assertEqual(latest.account_audit_id_id, self.audit.id)
+
+    def test_redelivery_completes_an_unfinished_audit(self):
+        self.invoke(self.audit_criteria[0])
+        self.sqs.send_message.return_value = None
+        with self.assertRaises(SqsBatchFailed):
+            self.invoke(self.audit_criteria[1])
+        self.assertFalse(self.get_audit().finished)
+
+        self.sqs.send_message.return_value = "sent"
+        self.invoke(self.audit_criteria[1])
+        audit_record = self.get_audit()
+        self.assertTrue(audit_record.finished)
+        self.assertEqual(audit_record.criteria_attempted, 2)
+        self.assertEqual(self.sqs.send_message.call_count, 2)
+
+    def test_redelivery_of_a_finished_audit_is_skipped(self):
+        for audit_criterion in self.audit_criteria:
+            self.invoke(audit_criterion)
+        self.invoke(self.audit_criteria[1])
+        self.sqs.send_message.assert_called_once()
+
+
+class FakeCriterion(CriteriaDefault):
+    """
+    Returns the items in data for each region and records the calls
+    """
+
+    resource_type = "AWS::Test::Resource"
+    # {region: [{"id": str, "ok": bool}]}
+    data = {}
+    fetched = []
+    evaluated = []
+
+    def get_chained_session(self, target_account):
+        return {"AccessKeyId": "testing", "Account": str(target_account)}
+
+    def get_data(self, session, **kwargs):
+        self.fetched.append(kwargs["region"])
+        return [dict(item) for item in self.data[kwargs["region"]]]
+
+    def translate(self, data={}):
+        return {"resource_id": data["id"], "resource_name": data["id"]}
+
+    def evaluate_item(self, item, context=None):
+        self.evaluated.append(item["id"])
+        return self.build_evaluation(
+            item["id"],
+            "COMPLIANT" if item["ok"] else "NON_COMPLIANT",
+            {},
+            self.resource_type,
+        )
+
+
+class FakeAnyCriterion(FakeCriterion):
+    aggregation_type = "any"
+
+
+class TestEvaluateAuditCriteria(unittest.TestCase):
+    """
+    Unit tests for evaluating the criteria in an audit-account-metric-queue message
+    """
+
+    def setUp(self):
+        self.db = peewee.SqliteDatabase(":memory:")
+        attach_public_schema(self.db)
+        create_account_subscription_table(self.db)
+        create_criterion_tables(self.db)
+        create_audit_criterion_tables(self.db)
+        create_audit_resource_tables(self.db)
+        create_audit_report_tables(self.db)
+        create_processed_message_table(self.db)
+        self.models = [
+            models.AccountSubscription,
+            models.Criterion,
+            models.CriterionParams,
+            models.AccountAudit,
+            models.AuditCriterion,
+            models.AuditCriterionRegion,
+            models.AuditResource,
+            models.ResourceData,
+            models.ResourceCompliance,
+            models.AccountLatestAudit,
+            models.ProcessedMessage,
+        ]
+        self.original_db = models.AuditCriterion._meta.database
+        self.db.bind(self.models)
+        self.subscription = models.AccountSubscription.create(
+            account_id=123456789012, account_name="test", product_team_id=1
+        )
+        self.audit = models.AccountAudit.create(
+            account_subscription_id=self.subscription
+        )
+        FakeCriterion.data = {
+            "eu-west-1": [{"id": "a", "ok": True}, {"id": "b", "ok": True}],
+            "eu-west-2": [
+                {"id": "c", "ok": True},
+                {"id": "d", "ok": False},
+                {"id": "e", "ok": True},
+            ],
+        }
+        FakeCriterion.fetched = []
+        FakeCriterion.evaluated = []
+        self.sqs = Mock()
+        self.sqs.get_queue_url.return_value = "https://queue"
+        patches = [
+            patch("chalicelib.audit.get_region_names", return_value=list(FakeCriterion.data)),
+            # two resources per page so the data has several pages
+            patch(
+                "chalicelib.audit.AuditResourceWriter",
+                functools.partial(AuditResourceWriter, max_rows=2),
+            ),
+            patch.object(
+                models.ResourceException,
+                "get_active_exception_index",
+                return_value=ResourceExceptionIndex(),
+            ),
+            patch("chalicelib.audit.record_api_usage"),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.original_db.bind(self.models)
+        self.db.close()
+
+    def create_audit_criterion(self, CheckClass=FakeCriterion, audit_record=None):
+        criterion = models.Criterion.create(
+            criterion_name=CheckClass.__name__,
+            criteria_provider_id=1,
+            invoke_class_name=f"{__name__}.{CheckClass.__name__}",
+            invoke_class_get_data_method="get_data",
+            title=CheckClass.__name__,
+            description="",
+            why_is_it_important="",
+            how_do_i_fix_it="",
+        )
+        return models.AuditCriterion.create(
+            account_audit_id=audit_record or self.audit, criterion_id=criterion
+        )
+
+    def evaluate(self, audit_criterion, out_of_time=None, **kwargs):
+        message = messages.audit_criterion_message(audit_criterion, **kwargs)
+        return audit.evaluate_audit_criteria(
+            self.sqs, "https://queue", message, out_of_time
+        )
+
+    def get_sent_messages(self):
+        return [
+            messages.decode(call[0][1]) for call in self.sqs.send_message.call_args_list
+        ]
+
+    def test_evaluates_every_region(self):
+        audit_criterion = self.create_audit_criterion()
+        self.assertTrue(self.evaluate(audit_criterion))
+
+        stored = models.AuditCriterion.get_by_id(audit_criterion.id)
+        self.assertEqual((stored.resources, stored.passed, stored.failed), (5, 4, 1))
+        self.assertEqual(stored.regions, 2)
+        self.assertTrue(stored.attempted)
+        self.assertTrue(stored.processed)
+        self.assertEqual(models.AuditResource.select().count(), 5)
+        [evaluated] = self.get_sent_messages()
+        self.assertFalse(evaluated["check_passed"])
+
+    def test_out_of_time_checkpoints_and_sends_a_continuation(self):
+        audit_criterion = self.create_audit_criterion()
+        # checked before the criterion and after each page so
+        # the lambda runs out of time after the first page of eu-west-2
+        checks = iter([False, False, True])
+        self.evaluate(audit_criterion, out_of_time=lambda: next(checks))
+
+        stored = models.AuditCriterion.get_by_id(audit_criterion.id)
+        self.assertFalse(stored.attempted)
+        self.assertEqual(audit.get_checkpoint(stored)["request"], 1)
+        self.assertEqual(audit.get_checkpoint(stored)["page"], 1)
+        [continuation] = self.get_sent_messages()
+        self.assertEqual(continuation["audit_criterion_id"], audit_criterion.id)
+        self.assertNotIn("processed", continuation)
+        self.assertEqual(models.AuditResource.select().count(), 4)
+
+    def test_unsent_continuation_is_redelivered(self):
+        audit_criterion = self.create_audit_criterion()
+        self.sqs.send_message.return_value = None
+        self.sqs.delete_message_batch.return_value = []
+        checks = iter([False, False, True])
+        message = messages.audit_criterion_message(audit_criterion)
+        event = get_sqs_event(messages.encode(message))
+        with patch("chalicelib.audit.GdsSqsClient", return_value=self.sqs), patch(
+            "chalicelib.audit.get_out_of_time", return_value=lambda: next(checks)
+        ):
+            with self.assertRaises(SqsBatchFailed):
+                audit.account_evaluate_criteria(event, None)
+
+        # the message is not deleted so SQS redelivers it
+        self.sqs.delete_message_batch.assert_called_once_with("https://queue", [])
+        self.assertFalse(models.AuditCriterion.get_by_id(audit_criterion.id).attempted)
+        self.assertEqual(models.ProcessedMessage.select().count(), 0)
+
+    def test_unsent_evaluated_message_is_not_recorded_as_processed(self):
+        audit_criterion = self.create_audit_criterion()
+        self.sqs.send_message.return_value = None
+        message = messages.audit_criterion_message(audit_criterion)
+        with self.assertRaises(Exception):
+            audit.evaluate_audit_criteria(
+                self.sqs, "https://queue", message, message_id="message-0"
+            )
+
+        # the redelivered message evaluates the criterion again
+        self.assertEqual(models.ProcessedMessage.select().count(), 0)
+
+    def test_continuation_resumes_from_the_checkpoint(self):
+        audit_criterion = self.create_audit_criterion()
+        checks = iter([False, False, True])
+        self.evaluate(audit_criterion, out_of_time=lambda: next(checks))
+        FakeCriterion.fetched = []
+        self.evaluate(audit_criterion)
+
+        # only the remaining region is fetched and its first page is skipped
+        self.assertEqual(FakeCriterion.fetched, ["eu-west-2"])
+        self.assertEqual(sorted(FakeCriterion.evaluated), ["a", "b", "c", "d", "e"])
+        stored = models.AuditCriterion.get_by_id(audit_criterion.id)
+        self.assertEqual((stored.resources, stored.passed, stored.failed), (5, 4, 1))
+        self.assertIsNone(stored.checkpoint)
+        self.assertTrue(stored.attempted)
+        self.assertEqual(models.AuditResource.select().count(), 5)
+
+    @patch.dict(os.environ, {"CSW_RESOURCE_HASH_REUSE": "true"})
+    def test_unchanged_resources_are_not_evaluated_again(self):
+        self.evaluate(self.create_audit_criterion())
+        models.AccountLatestAudit.create(
+            account_subscription_id=self.subscription, account_audit_id=self.audit
+        )
+        FakeCriterion.data["eu-west-2"][2]["ok"] = False
+        FakeCriterion.evaluated = []
+        audit_record = models.AccountAudit.create(
+            account_subscription_id=self.subscription
+        )
+        audit_criterion = models.AuditCriterion.create(
+            account_audit_id=audit_record,
+            criterion_id=models.Criterion.get().id,
+        )
+        self.evaluate(audit_criterion)
+
+        self.assertEqual(FakeCriterion.evaluated, ["e"])
+        stored = models.AuditCriterion.get_by_id(audit_criterion.id)
+        self.assertEqual((stored.resources, stored.passed, stored.failed), (5, 3, 2))
+        reused = models.AuditResource.select().where(
+            models.AuditResource.account_audit_id == audit_record,
+            models.AuditResource.reference_audit_resource_id.is_null(False),
+        )
+        self.assertEqual(reused.count(), 4)
+
+    @patch.dict(os.environ, {"CSW_ANY_SHORT_CIRCUIT": "true"})
+    def test_any_criteria_stop_at_the_first_pass(self):
+        audit_criterion = self.create_audit_criterion(FakeAnyCriterion)
+        self.evaluate(audit_criterion)
+
+        self.assertEqual(FakeCriterion.fetched, ["eu-west-1"])
+        self.assertEqual(FakeCriterion.evaluated, ["a"])
+        [evaluated] = self.get_sent_messages()
+        self.assertTrue(evaluated["check_passed"])
+
+    def test_grouped_criteria_fetch_the_data_once(self):
+        audit_criteria = [self.create_audit_criterion() for _ in range(2)]
+        message = messages.audit_criteria_message(audit_criteria)
+        audit.evaluate_audit_criteria(self.sqs, "https://queue", message)
+
+        self.assertEqual(sorted(FakeCriterion.fetched), ["eu-west-1", "eu-west-2"])
+        self.assertEqual(len(FakeCriterion.evaluated), 10)
+        for audit_criterion in audit_criteria:
+            stored = models.AuditCriterion.get_by_id(audit_criterion.id)
+            self.assertEqual(stored.resources, 5)
+        self.assertEqual(len(self.get_sent_messages()), 2)
+
+    def test_fanned_out_region_is_recorded_against_the_region(self):
+        audit_criterion = self.create_audit_criterion()
+        for region in FakeCriterion.data:
+            models.AuditCriterionRegion.create(
+                audit_criterion_id=audit_criterion, region=region
+            )
+        self.evaluate(audit_criterion, region="eu-west-2")
+
+        self.assertEqual(FakeCriterion.fetched, ["eu-west-2"])
+        audit_region = models.AuditCriterionRegion.get(
+            models.AuditCriterionRegion.region == "eu-west-2"
+        )
+        self.assertEqual((audit_region.resources, audit_region.failed), (3, 1))
+        # the evaluated message waits for the other region
+        self.assertEqual(self.get_sent_messages(), [])
+
+        self.evaluate(audit_criterion, region="eu-west-1")
+        stored = models.AuditCriterion.get_by_id(audit_criterion.id)
+        self.assertEqual((stored.resources, stored.failed), (5, 1))
+        [evaluated] = self.get_sent_messages()
+        self.assertFalse(evaluated["check_passed"])
+
+
+if __name__ == "__main__":
+    unittest.main()
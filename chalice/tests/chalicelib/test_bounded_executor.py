@@ -0,0 +1,89 @@
+import threading
+import time
+import unittest
+
+from botocore.exceptions import ClientError
+
+from chalicelib.aws.api_usage import ApiUsageRecorder, get_current_recorder, recording
+from chalicelib.bounded_executor import BoundedExecutor
+
+
+def access_denied():
+    return ClientError(
+        {"Error": {"Code": "AccessDenied", "Message": "Denied"}}, "DescribeThings"
+    )
+
+
+class TestBoundedExecutor(unittest.TestCase):
+    """
+    Unit tests for the BoundedExecutor
+    """
+
+    def test_map_preserves_item_order(self):
+        def slow_first(item):
+            # make earlier items finish last
+            time.sleep(0.01 * (5 - item))
+            return item * 2
+
+        results = BoundedExecutor(5).map(slow_first, range(5))
+        self.assertEqual([result for result, _ in results], [0, 2, 4, 6, 8])
+
+    def test_map_isolates_caught_errors(self):
+        def get_region(region):
+            if region == "denied":
+                raise access_denied()
+            return [region]
+
+        results = BoundedExecutor(3).map(
+            get_region, ["eu-west-1", "denied", "eu-west-2"], catch=(ClientError,)
+        )
+        self.assertEqual(results[0], (["eu-west-1"], None))
+        self.assertIsNone(results[1][0])
+        self.assertIsInstance(results[1][1], ClientError)
+        self.assertEqual(results[2], (["eu-west-2"], None))
+
+    def test_map_raises_uncaught_errors(self):
+        def broken(item):
+            raise ValueError(item)
+
+        with self.assertRaises(ValueError):
+            BoundedExecutor(2).map(broken, [1, 2], catch=(ClientError,))
+
+    def test_map_bounds_concurrency(self):
+        lock = threading.Lock()
+        state = {"running": 0, "max": 0}
+
+        def track(item):
+            with lock:
+                state["running"] += 1
+                state["max"] = max(state["max"], state["running"])
+            time.sleep(0.01)
+            with lock:
+                state["running"] -= 1
+            return item
+
+        BoundedExecutor(2).map(track, range(8))
+        self.assertLessEqual(state["max"], 2)
+
+    def test_single_worker_runs_sequentially(self):
+        thread_ids = set()
+
+        def record(item):
+            thread_ids.add(threading.get_ident())
+            return item
+
+        BoundedExecutor(1).map(record, range(3))
+        self.assertEqual(thread_ids, {threading.get_ident()})
+
+    def test_workers_use_the_callers_api_usage_recorder(self):
+        recorder = ApiUsageRecorder()
+        with recording(recorder):
+            results = BoundedExecutor(4).map(
+                lambda item: get_current_recorder(), range(4)
+            )
+        self.assertEqual([result for result, _ in results], [recorder] * 4)
+        self.assertIsNone(get_current_recorder())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import os
+import tempfile
+import unittest
+
+from app import CloudSecurityWatch
+from chalicelib.claim_check import (
+    LocalClaimCheckStore,
+    check_in,
+    get_claim_check_store,
+)
+from chalicelib.utilities import Utilities
+
+
+class TestClaimCheck(unittest.TestCase):
+    """
+    Unit tests for storing large payloads by reference
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = CloudSecurityWatch("test_app")
+        cls.app.utilities = Utilities()
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = LocalClaimCheckStore(self.app, self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_small_payload_is_sent_inline(self):
+        self.assertIsNone(check_in(self.store, "audit/1.json", "{}", threshold=10))
+        self.assertEqual(os.listdir(self.directory.name), [])
+
+    def test_large_payload_is_stored(self):
+        body = '{"failed_resources": [' + ", ".join(["{}"] * 10) + "]}"
+        reference = check_in(self.store, "audit/1.json", body, threshold=10)
+        self.assertTrue(reference.startswith("file://"))
+        self.assertEqual(self.store.get(reference), body)
+
+    def test_no_store_is_sent_inline(self):
+        self.assertIsNone(check_in(None, "audit/1.json", "{" * 100, threshold=10))
+
+    def test_store_from_environment(self):
+        os.environ["CSW_CLAIM_CHECK_PATH"] = self.directory.name
+        try:
+            store = get_claim_check_store(self.app)
+        finally:
+            del os.environ["CSW_CLAIM_CHECK_PATH"]
+        self.assertIsInstance(store, LocalClaimCheckStore)
+
+    def test_reference_scheme_is_checked(self):
+        with self.assertRaises(ValueError):
+            self.store.get("s3://bucket/audit/1.json")
+
+
+if __name__ == "__main__":
+    unittest.main()
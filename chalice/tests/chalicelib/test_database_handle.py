@@ -0,0 +1,112 @@
+import unittest
+from unittest.mock import patch
+
+import peewee
+
+from app import CloudSecurityWatch
+from chalicelib import models
+from chalicelib.database_handle import AuditResourceWriter
+from fixtures.sqlite_schema import (
+    attach_public_schema,
+    build_resource_pair,
+    create_audit_resource_tables,
+)
+
+
+class TestAuditResourceWriter(unittest.TestCase):
+    """
+    Unit tests for the AuditResourceWriter bulk writer
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = CloudSecurityWatch("test_app")
+
+    def setUp(self):
+        self.db = peewee.SqliteDatabase(":memory:")
+        attach_public_schema(self.db)
+        create_audit_resource_tables(self.db)
+        self.models = [
+            models.AuditResource,
+            models.ResourceData,
+            models.ResourceCompliance,
+        ]
+
+    def tearDown(self):
+        self.db.close()
+
+    def test_flush_links_compliance_to_resources(self):
+        with self.db.bind_ctx(self.models):
+            writer = AuditResourceWriter(self.app)
+            for index in range(5):
+                writer.add(*build_resource_pair(index))
+            ids = writer.flush()
+
+            self.assertEqual(len(ids), 5)
+            self.assertEqual(writer.rows_written, 5)
+            self.assertEqual(writer.buffer, [])
+            for compliance in models.ResourceCompliance.select():
+                resource = models.AuditResource.get_by_id(
+                    compliance.audit_resource_id_id
+                )
+                self.assertEqual(resource.resource_id, compliance.resource_id)
+
+    def test_flush_matches_returned_ids_to_rows(self):
+        with self.db.bind_ctx(self.models), patch.object(
+            self.db, "returning_clause", True
+        ):
+            writer = AuditResourceWriter(self.app)
+            for index in range(5):
+                item, compliance = build_resource_pair(index)
+                # ResourceData.store fails on sqlite with RETURNING forced on
+                item["resource_data"] = None
+                writer.add(item, compliance)
+            ids = writer.flush()
+
+            self.assertEqual(
+                [models.AuditResource.get_by_id(id).resource_id for id in ids],
+                [f"sg-{index}" for index in range(5)],
+            )
+            for compliance in models.ResourceCompliance.select():
+                resource = models.AuditResource.get_by_id(
+                    compliance.audit_resource_id_id
+                )
+                self.assertEqual(resource.resource_id, compliance.resource_id)
+
+    def test_flush_stores_resource_data_out_of_row(self):
+        with self.db.bind_ctx(self.models):
+            writer = AuditResourceWriter(self.app)
+            for index in range(3):
+                item, compliance = build_resource_pair(index)
+                item["resource_data"] = '{"GroupId": "sg-%d"}' % (index % 2)
+                writer.add(item, compliance)
+            writer.flush()
+
+            # identical data is only stored once
+            self.assertEqual(models.ResourceData.select().count(), 2)
+            for resource in models.AuditResource.select():
+                self.assertIsNone(resource.resource_data)
+                self.assertEqual(
+                    resource.get_resource_data(),
+                    '{"GroupId": "sg-%s"}' % (int(resource.resource_id[3:]) % 2),
+                )
+
+    def test_flush_empty_buffer(self):
+        with self.db.bind_ctx(self.models):
+            writer = AuditResourceWriter(self.app)
+            self.assertEqual(writer.flush(), [])
+            self.assertEqual(models.AuditResource.select().count(), 0)
+
+    def test_add_flushes_at_max_rows(self):
+        with self.db.bind_ctx(self.models):
+            writer = AuditResourceWriter(self.app, max_rows=2)
+            for index in range(3):
+                writer.add(*build_resource_pair(index))
+            self.assertEqual(writer.rows_written, 2)
+            self.assertEqual(len(writer.buffer), 1)
+            writer.flush()
+            self.assertEqual(models.ResourceCompliance.select().count(), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
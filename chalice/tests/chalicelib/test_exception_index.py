@@ -0,0 +1,54 @@
+import unittest
+from datetime import datetime, timedelta
+
+from chalicelib.exception_index import ResourceExceptionIndex
+
+
+class TestResourceExceptionIndex(unittest.TestCase):
+    """
+    Unit tests for the ResourceExceptionIndex lookup
+    """
+
+    def setUp(self):
+        self.now = datetime(2019, 10, 1, 12, 0, 0)
+        self.index = ResourceExceptionIndex(self.now)
+        self.persistent_id = "AWS::EC2::SecurityGroup::eu-west-2::123456789012::test"
+
+    def test_add_active_exception(self):
+        exception = {"reason": "Test"}
+        added = self.index.add(
+            self.persistent_id,
+            exception,
+            self.now + timedelta(days=1),
+            self.now - timedelta(days=1),
+        )
+        self.assertTrue(added)
+        self.assertTrue(self.index.has_exception(self.persistent_id))
+        self.assertEqual(self.index.get(self.persistent_id), exception)
+        self.assertEqual(len(self.index), 1)
+
+    def test_expired_exception_is_ignored(self):
+        added = self.index.add(
+            self.persistent_id, {}, self.now - timedelta(days=1)
+        )
+        self.assertFalse(added)
+        self.assertIsNone(self.index.get(self.persistent_id))
+
+    def test_future_exception_is_ignored(self):
+        added = self.index.add(
+            self.persistent_id,
+            {},
+            self.now + timedelta(days=2),
+            self.now + timedelta(days=1),
+        )
+        self.assertFalse(added)
+        self.assertFalse(self.index.has_exception(self.persistent_id))
+
+    def test_missing_created_date_is_active(self):
+        self.index.add(self.persistent_id, {}, self.now + timedelta(days=1))
+        self.assertTrue(self.index.has_exception(self.persistent_id))
+        self.assertFalse(self.index.has_exception("AWS::EC2::SecurityGroup::other"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+import json
+import unittest
+from types import SimpleNamespace
+
+from chalicelib import messages
+
+
+class TestMessages(unittest.TestCase):
+    """
+    Unit tests for the compact audit stage messages
+    """
+
+    def setUp(self):
+        self.audit_criterion = SimpleNamespace(
+            id=2, account_audit_id_id=1, criterion_id_id=3
+        )
+
+    def test_audit_criterion_message_round_trip(self):
+        message = messages.audit_criterion_message(
+            self.audit_criterion, region="eu-west-2", processed=True
+        )
+        decoded = messages.decode(messages.encode(message))
+        self.assertEqual(
+            decoded,
+            {
+                "v": messages.MESSAGE_VERSION,
+                "audit_id": 1,
+                "audit_criterion_id": 2,
+                "criterion_id": 3,
+                "region": "eu-west-2",
+                "processed": True,
+            },
+        )
+
+    def test_audit_criteria_message_round_trip(self):
+        other = SimpleNamespace(id=4, account_audit_id_id=1, criterion_id_id=5)
+        message = messages.audit_criteria_message([self.audit_criterion, other])
+        decoded = messages.decode(messages.encode(message))
+        self.assertEqual(decoded["audit_id"], 1)
+        self.assertEqual(
+            decoded["audit_criteria"],
+            [
+                {"audit_criterion_id": 2, "criterion_id": 3},
+                {"audit_criterion_id": 4, "criterion_id": 5},
+            ],
+        )
+        self.assertNotIn("region", decoded)
+
+    def test_decode_legacy_audit_criterion(self):
+        legacy = {
+            "id": 2,
+            "account_audit_id": {"id": 1, "account_subscription_id": {"id": 5}},
+            "criterion_id": {"id": 3, "criteria_provider_id": {"id": 1}},
+            "processed": False,
+            "check_passed": True,
+        }
+        decoded = messages.decode(json.dumps(legacy))
+        self.assertEqual(decoded["audit_id"], 1)
+        self.assertEqual(decoded["audit_criterion_id"], 2)
+        self.assertEqual(decoded["criterion_id"], 3)
+        self.assertFalse(decoded["processed"])
+        self.assertTrue(decoded["check_passed"])
+
+    def test_decode_legacy_audit(self):
+        legacy = {"id": 1, "account_subscription_id": {"id": 5}}
+        self.assertEqual(messages.decode(json.dumps(legacy))["audit_id"], 1)
+
+    def test_decode_rejects_newer_version(self):
+        with self.assertRaises(ValueError):
+            messages.decode(json.dumps({"v": messages.MESSAGE_VERSION + 1}))
+
+
+if __name__ == "__main__":
+    unittest.main()
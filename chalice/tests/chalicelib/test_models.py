@@ -0,0 +1,318 @@
+import unittest
+from unittest.mock import patch
+
+import peewee
+
+from chalicelib import models
+from fixtures.sqlite_schema import (
+    attach_public_schema,
+    create_audit_criterion_tables,
+    create_audit_resource_tables,
+)
+
+
+class TestAuditCriterionFanIn(unittest.TestCase):
+    """
+    Unit tests for merging per region stats into an audit_criterion
+    """
+
+    def setUp(self):
+        self.db = peewee.SqliteDatabase(":memory:")
+        attach_public_schema(self.db)
+        create_audit_criterion_tables(self.db)
+        self.models = [models.AuditCriterion, models.AuditCriterionRegion]
+        self.original_db = models.AuditCriterion._meta.database
+        self.db.bind(self.models)
+        self.audit_criterion = models.AuditCriterion.create(
+            criterion_id=1, account_audit_id=1
+        )
+        self.audit_regions = [
+            models.AuditCriterionRegion.create(
+                audit_criterion_id=self.audit_criterion, region=region
+            )
+            for region in ["eu-west-1", "eu-west-2"]
+        ]
+
+    def tearDown(self):
+        self.original_db.bind(self.models)
+        self.db.close()
+
+    def report(self, audit_region, failed, processed=True):
+        audit_region.resources = 3
+        audit_region.tested = 3
+        audit_region.passed = 3 - failed
+        audit_region.failed = failed
+        audit_region.regions = 1
+        audit_region.processed = processed
+        audit_region.attempted = True
+        audit_region.check_passed = failed == 0
+        audit_region.save()
+
+    def test_waits_for_remaining_regions(self):
+        self.report(self.audit_regions[0], failed=0)
+        self.assertIsNone(self.audit_criterion.complete_from_regions("all"))
+        stored = models.AuditCriterion.get_by_id(self.audit_criterion.id)
+        self.assertFalse(stored.attempted)
+
+    def test_merges_region_stats(self):
+        self.report(self.audit_regions[0], failed=0)
+        self.report(self.audit_regions[1], failed=2, processed=False)
+        check_passed = self.audit_criterion.complete_from_regions("all")
+
+        self.assertFalse(check_passed)
+        stored = models.AuditCriterion.get_by_id(self.audit_criterion.id)
+        self.assertTrue(stored.attempted)
+        self.assertTrue(stored.processed)
+        self.assertEqual(stored.regions, 2)
+        self.assertEqual(stored.resources, 6)
+        self.assertEqual(stored.passed, 4)
+        self.assertEqual(stored.failed, 2)
+        self.assertEqual(self.audit_criterion.failed, 2)
+
+    def test_any_aggregation_passes_if_one_region_passes(self):
+        self.report(self.audit_regions[0], failed=0)
+        self.report(self.audit_regions[1], failed=2)
+        self.assertTrue(self.audit_criterion.complete_from_regions("any"))
+
+    def test_completes_only_once(self):
+        for audit_region in self.audit_regions:
+            self.report(audit_region, failed=0)
+        self.assertTrue(self.audit_criterion.complete_from_regions("all"))
+        # a redelivered or concurrent final region must not send a second message
+        self.assertIsNone(self.audit_criterion.complete_from_regions("all"))
+
+
+class TestAccountAuditCompletion(unittest.TestCase):
+    """
+    Unit tests for counting evaluated criteria against the audit
+    """
+
+    def setUp(self):
+        self.db = peewee.SqliteDatabase(":memory:")
+        attach_public_schema(self.db)
+        create_audit_criterion_tables(self.db)
+        self.models = [models.AccountAudit, models.AuditCriterion]
+        self.original_db = models.AccountAudit._meta.database
+        self.db.bind(self.models)
+        self.audit = models.AccountAudit.create(
+            account_subscription_id=1, active_criteria=3
+        )
+
+    def tearDown(self):
+        self.original_db.bind(self.models)
+        self.db.close()
+
+    def evaluate(self, processed=True, failed=0):
+        return models.AuditCriterion.create(
+            criterion_id=models.AuditCriterion.select().count() + 1,
+            account_audit_id=self.audit,
+            processed=processed,
+            attempted=True,
+            failed=failed,
+        )
+
+    def test_counts_until_complete(self):
+        audit_criteria = [
+            self.evaluate(),
+            self.evaluate(failed=4),
+            self.evaluate(processed=False),
+        ]
+        counts = [
+            models.AccountAudit.record_criterion_evaluated(audit_criterion)
+            for audit_criterion in audit_criteria
+        ]
+        self.assertEqual(counts, [(1, 3), (2, 3), (3, 3)])
+
+        audit = models.AccountAudit.get_by_id(self.audit.id)
+        self.assertEqual(audit.criteria_processed, 2)
+        self.assertEqual(audit.criteria_passed, 1)
+        self.assertEqual(audit.criteria_failed, 1)
+        self.assertEqual(audit.issues_found, 4)
+
+    def test_insert_rows_returns_ids_in_order(self):
+        for returning_clause in [False, True]:
+            with self.subTest(returning_clause=returning_clause), patch.object(
+                self.db, "returning_clause", returning_clause
+            ):
+                criterion_ids = [5, 7, 6] if returning_clause else [8, 10, 9]
+                ids = models.AuditCriterion.insert_rows(
+                    [
+                        {"account_audit_id": self.audit.id, "criterion_id": criterion_id}
+                        for criterion_id in criterion_ids
+                    ],
+                    ["criterion_id"],
+                )
+                self.assertEqual(len(ids), 3)
+                self.assertEqual(
+                    [
+                        models.AuditCriterion.get_by_id(audit_criterion_id).criterion_id_id
+                        for audit_criterion_id in ids
+                    ],
+                    criterion_ids,
+                )
+        self.assertEqual(models.AuditCriterion.insert_rows([], ["criterion_id"]), [])
+
+    def test_redelivered_criterion_is_not_counted(self):
+        audit_criterion = self.evaluate()
+        models.AccountAudit.record_criterion_evaluated(audit_criterion)
+        self.assertIsNone(
+            models.AccountAudit.record_criterion_evaluated(audit_criterion)
+        )
+        audit = models.AccountAudit.get_by_id(self.audit.id)
+        self.assertEqual(audit.criteria_attempted, 1)
+
+
+class TestAuditResourceUnchanged(unittest.TestCase):
+    """
+    Unit tests for finding the previous results of unchanged resources
+    """
+
+    def setUp(self):
+        self.db = peewee.SqliteDatabase(":memory:")
+        attach_public_schema(self.db)
+        create_audit_resource_tables(self.db)
+        self.models = [
+            models.AuditResource,
+            models.ResourceData,
+            models.ResourceCompliance,
+        ]
+        self.original_db = models.AuditResource._meta.database
+        self.db.bind(self.models)
+
+    def tearDown(self):
+        self.original_db.bind(self.models)
+        self.db.close()
+
+    def create_resource(self, persistent_id, resource_hash, status_id, reference=None):
+        resource = models.AuditResource.create(
+            criterion_id=1,
+            account_audit_id=1,
+            resource_id=persistent_id,
+            resource_persistent_id=persistent_id,
+            resource_data=None if reference else "{}",
+            resource_hash=resource_hash,
+            reference_audit_resource_id=reference,
+        )
+        models.ResourceCompliance.create(
+            audit_resource_id=resource.id,
+            annotation="failed" if status_id == 3 else None,
+            resource_type="AWS::EC2::SecurityGroup",
+            resource_id=persistent_id,
+            compliance_type="NON_COMPLIANT" if status_id == 3 else "COMPLIANT",
+            is_compliant=status_id != 3,
+            is_applicable=True,
+            status_id=status_id,
+        )
+        return resource
+
+    def test_get_unchanged_compliance(self):
+        failed = self.create_resource("a", "hash-a", 3)
+        self.create_resource("b", "hash-b", 4)
+        holder = self.create_resource("c", "hash-c", 2)
+        self.create_resource("c", "hash-c", 2, reference=holder.id)
+        items = [
+            {"resource_persistent_id": "a", "resource_hash": "hash-a"},
+            # passed by exception last time
+            {"resource_persistent_id": "b", "resource_hash": "hash-b"},
+            {"resource_persistent_id": "c", "resource_hash": "hash-c"},
+            # same content as a different resource
+            {"resource_persistent_id": "d", "resource_hash": "hash-a"},
+        ]
+
+        unchanged = models.AuditResource.get_unchanged_compliance(1, 1, items)
+
+        self.assertEqual(set(unchanged.keys()), {"a", "c"})
+        self.assertEqual(unchanged["a"][0], failed.id)
+        self.assertEqual(unchanged["a"][1]["status_id"], 3)
+        self.assertEqual(unchanged["a"][1]["annotation"], "failed")
+        # references point to the row holding the data
+        self.assertEqual(unchanged["c"][0], holder.id)
+        self.assertNotIn("annotation", unchanged["c"][1])
+
+    def test_other_audits_are_ignored(self):
+        self.create_resource("a", "hash-a", 3)
+        items = [{"resource_persistent_id": "a", "resource_hash": "hash-a"}]
+        self.assertEqual(
+            models.AuditResource.get_unchanged_compliance(2, 1, items), {}
+        )
+
+
+class TestResourceData(unittest.TestCase):
+    """
+    Unit tests for the compressed out of row resource_data
+    """
+
+    def setUp(self):
+        self.db = peewee.SqliteDatabase(":memory:")
+        attach_public_schema(self.db)
+        create_audit_resource_tables(self.db)
+        self.models = [models.AuditResource, models.ResourceData]
+        self.original_db = models.AuditResource._meta.database
+        self.db.bind(self.models)
+
+    def tearDown(self):
+        self.original_db.bind(self.models)
+        self.db.close()
+
+    def test_store_deduplicates_by_content(self):
+        first = models.ResourceData.store(['{"a": 1}', '{"b": 2}', '{"a": 1}'])
+        second = models.ResourceData.store(['{"b": 2}'])
+
+        self.assertEqual(first[0], first[2])
+        self.assertEqual(second, [first[1]])
+        self.assertEqual(models.ResourceData.select().count(), 2)
+        stored = models.ResourceData.get_by_id(first[1])
+        self.assertEqual(stored.get_data(), '{"b": 2}')
+
+    def test_get_resource_data(self):
+        [resource_data_id] = models.ResourceData.store(['{"a": 1}'])
+        stored = models.AuditResource.create(
+            criterion_id=1,
+            account_audit_id=1,
+            resource_id="a",
+            resource_data_id=resource_data_id,
+        )
+        reference = models.AuditResource.create(
+            criterion_id=1,
+            account_audit_id=2,
+            resource_id="a",
+            reference_audit_resource_id=stored.id,
+        )
+        legacy = models.AuditResource.create(
+            criterion_id=1, account_audit_id=1, resource_id="b", resource_data="{}"
+        )
+
+        self.assertEqual(stored.get_resource_data(), '{"a": 1}')
+        self.assertEqual(reference.get_resource_data(), '{"a": 1}')
+        self.assertEqual(legacy.get_resource_data(), "{}")
+
+
+class TestProcessedMessage(unittest.TestCase):
+    """
+    Unit tests for the SQS idempotency ledger
+    """
+
+    def setUp(self):
+        self.db = peewee.SqliteDatabase(":memory:")
+        self.db.execute_sql("ATTACH DATABASE ':memory:' AS public")
+        self.models = [models.ProcessedMessage]
+        self.original_db = models.ProcessedMessage._meta.database
+        self.db.bind(self.models)
+        self.db.create_tables(self.models)
+
+    def tearDown(self):
+        self.original_db.bind(self.models)
+        self.db.close()
+
+    def test_record_is_idempotent(self):
+        self.assertFalse(models.ProcessedMessage.is_processed("m1", "a"))
+        models.ProcessedMessage.record("m1", "a")
+        models.ProcessedMessage.record("m1", "a")
+
+        self.assertTrue(models.ProcessedMessage.is_processed("m1", "a"))
+        self.assertFalse(models.ProcessedMessage.is_processed("m1", "b"))
+        self.assertEqual(models.ProcessedMessage.select().count(), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+import os
+import unittest
+
+from app import CloudSecurityWatch
+from chalicelib.sqs_batch import SqsBatch, SqsBatchFailed
+from chalicelib.utilities import Utilities
+
+
+class FakeMessage:
+    def __init__(self, message_id):
+        self.message_id = message_id
+        self.receipt_handle = f"handle-{message_id}"
+
+    def to_dict(self):
+        return {"messageId": self.message_id}
+
+
+class FakeSqsClient:
+    def __init__(self):
+        self.deleted = []
+
+    def get_queue_url(self, queue_name):
+        return f"https://sqs/{queue_name}"
+
+    def delete_message_batch(self, queue_url, receipt_handles):
+        self.deleted.extend(receipt_handles)
+        return []
+
+
+class TestSqsBatch(unittest.TestCase):
+    """
+    Unit tests for per message failures in SQS batches
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = CloudSecurityWatch("test_app")
+        cls.app.utilities = Utilities()
+
+    def setUp(self):
+        self.sqs = FakeSqsClient()
+        self.events = [FakeMessage("a"), FakeMessage("b"), FakeMessage("c")]
+        self.batch = SqsBatch(self.app, self.sqs, "queue", self.events)
+
+    def tearDown(self):
+        os.environ.pop("CSW_SQS_BATCH_ITEM_FAILURES", None)
+
+    def process(self, failing):
+        for message in self.batch:
+            with self.batch.process(message):
+                if message.message_id in failing:
+                    raise ValueError(message.message_id)
+
+    def test_returns_default_when_all_succeed(self):
+        self.process(failing=[])
+        self.assertTrue(self.batch.get_response(True))
+        self.assertEqual(self.sqs.deleted, [])
+
+    def test_deletes_succeeded_messages_and_raises(self):
+        self.process(failing=["b"])
+        with self.assertRaises(SqsBatchFailed):
+            self.batch.get_response(True)
+        self.assertEqual(self.sqs.deleted, ["handle-a", "handle-c"])
+
+    def test_reports_batch_item_failures(self):
+        os.environ["CSW_SQS_BATCH_ITEM_FAILURES"] = "true"
+        self.process(failing=["b"])
+        response = self.batch.get_response(True)
+        self.assertEqual(response, {"batchItemFailures": [{"itemIdentifier": "b"}]})
+        self.assertEqual(self.sqs.deleted, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
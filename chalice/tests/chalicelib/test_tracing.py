@@ -0,0 +1,137 @@
+import json
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from time import time
+
+import peewee
+
+from app import CloudSecurityWatch
+from chalicelib import messages, models
+from chalicelib.tracing import LocalTraceExporter, Tracer
+from chalicelib.utilities import Utilities
+
+
+class TestTracer(unittest.TestCase):
+    """
+    Unit tests for the audit trace spans
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = CloudSecurityWatch("test_app")
+        cls.app.utilities = Utilities()
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.exporter = LocalTraceExporter(self.app, self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def read_spans(self, trace_id):
+        path = os.path.join(self.directory.name, f"{trace_id}.jsonl")
+        with open(path) as file:
+            return [json.loads(line) for line in file]
+
+    def test_trace_is_propagated_in_messages(self):
+        first = Tracer("account_audit_criteria", 1, exporter=self.exporter)
+        body = messages.encode(messages.audit_message(1), first.get_context())
+        trace = messages.decode(body)["trace"]
+        second = Tracer("account_evaluate_criteria", 1, trace, self.exporter)
+
+        self.assertEqual(second.trace_id, first.trace_id)
+        self.assertEqual(second.parent_span_id, first.span_id)
+        self.assertLessEqual(trace["enqueued_at"], time())
+
+    def test_spans_are_exported_on_finish(self):
+        trace = {"trace_id": "a" * 32, "span_id": "b" * 16, "enqueued_at": time() - 2}
+        tracer = Tracer("account_evaluate_criteria", 1, trace, self.exporter)
+        with tracer.span("evaluate", audit_criterion_id=2, region="eu-west-2"):
+            pass
+        tracer.finish()
+
+        spans = {span["name"]: span for span in self.read_spans("a" * 32)}
+        self.assertEqual(set(spans.keys()), {"queue_wait", "evaluate", "process"})
+        self.assertGreaterEqual(spans["queue_wait"]["duration_ms"], 2000)
+        self.assertEqual(spans["evaluate"]["audit_criterion_id"], 2)
+        self.assertEqual(spans["evaluate"]["parent_span_id"], tracer.span_id)
+        # the stage span is a child of the span which sent the message
+        self.assertEqual(spans["process"]["span_id"], tracer.span_id)
+        self.assertEqual(spans["process"]["parent_span_id"], "b" * 16)
+        self.assertEqual(tracer.spans, [])
+
+    def test_new_trace_without_context(self):
+        tracer = Tracer("audit_account_schedule", 1)
+        self.assertIsNone(tracer.parent_span_id)
+        self.assertEqual(len(tracer.trace_id), 32)
+        # nothing is exported without an exporter
+        tracer.finish()
+
+
+class TestAuditTraceSpan(unittest.TestCase):
+    """
+    Unit tests for the stage duration report
+    """
+
+    def setUp(self):
+        self.db = peewee.SqliteDatabase(":memory:")
+        self.db.execute_sql("ATTACH DATABASE ':memory:' AS public")
+        self.db.execute_sql(
+            """
+            CREATE TABLE public.audit_trace_span (
+                id INTEGER PRIMARY KEY,
+                trace_id TEXT,
+                span_id TEXT,
+                parent_span_id TEXT,
+                account_audit_id INTEGER,
+                audit_criterion_id INTEGER,
+                stage TEXT,
+                name TEXT,
+                region TEXT,
+                date_started TIMESTAMP,
+                duration_ms INTEGER
+            )
+            """
+        )
+        self.models = [models.AuditTraceSpan]
+        self.original_db = models.AuditTraceSpan._meta.database
+        self.db.bind(self.models)
+
+    def tearDown(self):
+        self.original_db.bind(self.models)
+        self.db.close()
+
+    def test_get_stage_durations(self):
+        started = datetime(2019, 8, 1, 12, 0, 0)
+        spans = [
+            ("account_evaluate_criteria", "queue_wait", 0, 1000),
+            ("account_evaluate_criteria", "evaluate", 1000, 500),
+            ("account_evaluate_criteria", "evaluate", 1000, 1500),
+            ("audit_evaluated_metric", "persist", 3000, 100),
+        ]
+        for stage, name, offset, duration in spans:
+            models.AuditTraceSpan.create(
+                trace_id="a" * 32,
+                span_id="b" * 16,
+                account_audit_id=1,
+                stage=stage,
+                name=name,
+                date_started=started + timedelta(milliseconds=offset),
+                duration_ms=duration,
+            )
+
+        report = models.AuditTraceSpan.get_stage_durations(1)
+
+        self.assertEqual(report["elapsed_ms"], 3100)
+        evaluate = report["stages"][1]
+        self.assertEqual(evaluate["name"], "evaluate")
+        self.assertEqual(evaluate["spans"], 2)
+        self.assertEqual(evaluate["duration_ms"], 2000)
+        self.assertEqual(evaluate["max_duration_ms"], 1500)
+        self.assertEqual(models.AuditTraceSpan.get_stage_durations(2)["stages"], [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,139 @@
+import unittest
+
+from app import CloudSecurityWatch
+from chalicelib.criteria.aws_support_s3_bucket_permissions import S3BucketReadAll
+from chalicelib.trusted_advisor import TrustedAdvisorOrchestrator
+
+
+class FakeSupportClient:
+    """
+    Stands in for GdsSupportClient recording the API calls made
+    """
+
+    def __init__(self, refreshable, statuses=None, flagged=None):
+        self.refreshable = refreshable
+        self.statuses = statuses or {}
+        self.flagged = flagged or {}
+        self.calls = []
+
+    def refresh_checks(self, session, check_ids):
+        self.calls.append(("refresh_checks", check_ids))
+        return {
+            check_id: {"checkId": check_id, "status": "enqueued"}
+            for check_id in check_ids
+            if check_id in self.refreshable
+        }
+
+    def describe_trusted_advisor_check_refresh_statuses(self, session, check_ids):
+        self.calls.append(("refresh_statuses", check_ids))
+        return {
+            check_id: {"checkId": check_id, "status": self.statuses[check_id]}
+            for check_id in check_ids
+        }
+
+    def describe_trusted_advisor_check_summaries(self, session, check_ids):
+        self.calls.append(("summaries", check_ids))
+        return {
+            check_id: {
+                "checkId": check_id,
+                "resourcesSummary": {"resourcesFlagged": self.flagged[check_id]},
+            }
+            for check_id in check_ids
+        }
+
+
+class TestTrustedAdvisorOrchestrator(unittest.TestCase):
+    """
+    Unit tests for polling TA refreshes without blocking
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = CloudSecurityWatch("test_app")
+
+    def setUp(self):
+        self.pending = {"Pfx0RwqBli": [1, 2, 3], "DqdJqYeRm5": [4], "12Fnkpl8Y5": [5]}
+        self.client = FakeSupportClient(
+            refreshable=["Pfx0RwqBli", "DqdJqYeRm5"],
+            statuses={"Pfx0RwqBli": "processing", "DqdJqYeRm5": "success"},
+            flagged={"Pfx0RwqBli": 2, "DqdJqYeRm5": 0, "12Fnkpl8Y5": 1},
+        )
+        self.orchestrator = TrustedAdvisorOrchestrator(
+            self.app, self.client, max_attempts=3
+        )
+
+    def test_start_requests_refreshes(self):
+        orchestration = self.orchestrator.start(None, 10, self.pending)
+        self.assertEqual(orchestration["account_audit_id"], 10)
+        self.assertEqual(orchestration["attempt"], 0)
+        self.assertEqual(orchestration["refreshable"], ["Pfx0RwqBli", "DqdJqYeRm5"])
+        self.assertEqual(len(self.client.calls), 1)
+
+    def test_poll_dispatches_fresh_checks(self):
+        orchestration = self.orchestrator.start(None, 10, self.pending)
+        ready, next_poll = self.orchestrator.poll(None, orchestration)
+
+        self.assertEqual(
+            ready,
+            {
+                "DqdJqYeRm5": {"refreshed": True, "flagged": 0},
+                "12Fnkpl8Y5": {"refreshed": True, "flagged": 1},
+            },
+        )
+        self.assertEqual(next_poll["pending"], {"Pfx0RwqBli": [1, 2, 3]})
+        self.assertEqual(next_poll["attempt"], 1)
+        # one statuses call and one summaries call for all the checks
+        self.assertEqual(
+            [call[0] for call in self.client.calls],
+            ["refresh_checks", "refresh_statuses", "summaries"],
+        )
+
+    def test_poll_gives_up_after_max_attempts(self):
+        orchestration = self.orchestrator.start(None, 10, self.pending)
+        orchestration["attempt"] = 2
+        ready, next_poll = self.orchestrator.poll(None, orchestration)
+
+        self.assertIsNone(next_poll)
+        self.assertEqual(ready["Pfx0RwqBli"], {"refreshed": False, "flagged": 2})
+
+
+class TestTrustedAdvisorSummary(unittest.TestCase):
+    """
+    Criteria dispatched by the orchestrator don't refresh the check
+    and skip the full result when nothing is flagged
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = CloudSecurityWatch("test_app")
+
+    def setUp(self):
+        self.calls = []
+        self.criterion = S3BucketReadAll(self.app)
+        self.criterion.client.refresh_check_with_wait = (
+            lambda session, check_id: self.calls.append("refresh")
+        )
+
+        def describe(session, **kwargs):
+            self.calls.append("result")
+            return {"flaggedResources": []}
+
+        self.criterion.client.describe_trusted_advisor_check_result = describe
+
+    def test_unorchestrated_criterion_refreshes(self):
+        self.criterion.get_data(None)
+        self.assertEqual(self.calls, ["refresh", "result"])
+
+    def test_nothing_flagged_skips_result(self):
+        self.criterion.set_trusted_advisor_summary({"refreshed": True, "flagged": 0})
+        self.assertEqual(self.criterion.get_data(None), [])
+        self.assertEqual(self.calls, [])
+
+    def test_flagged_fetches_result_without_refresh(self):
+        self.criterion.set_trusted_advisor_summary({"refreshed": True, "flagged": 1})
+        self.criterion.get_data(None)
+        self.assertEqual(self.calls, ["result"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from chalicelib.ttl_cache import TtlCache
+
+
+class TestTtlCache(unittest.TestCase):
+    """
+    Unit tests for the memory and file cache tiers
+    """
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = TtlCache(self.directory.name)
+        self.calls = 0
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def fetch(self):
+        self.calls += 1
+        return [{"RegionName": "eu-west-2"}]
+
+    def test_value_is_fetched_once(self):
+        first = self.cache.get("regions", self.fetch, 60)
+        second = self.cache.get("regions", self.fetch, 60)
+        self.assertEqual(first, second)
+        self.assertEqual(self.calls, 1)
+
+    def test_file_tier_survives_a_new_instance(self):
+        self.cache.get("regions", self.fetch, 60)
+        restarted = TtlCache(self.directory.name)
+        regions = restarted.get("regions", self.fetch, 60)
+        self.assertEqual(regions, [{"RegionName": "eu-west-2"}])
+        self.assertEqual(self.calls, 1)
+
+    def test_expired_values_are_fetched(self):
+        with mock.patch("chalicelib.ttl_cache.time", return_value=1000):
+            self.cache.get("regions", self.fetch, 60)
+        with mock.patch("chalicelib.ttl_cache.time", return_value=1061):
+            self.cache.get("regions", self.fetch, 60)
+        self.assertEqual(self.calls, 2)
+
+    def test_memory_only_values_are_not_written(self):
+        self.cache.get("secret", lambda: "value", 60, persist=False)
+        self.assertEqual(os.listdir(self.directory.name), [])
+
+    def test_none_is_not_cached(self):
+        self.cache.get("missing", lambda: None, 60)
+        self.assertEqual(self.cache.get("missing", lambda: "found", 60), "found")
+
+    def test_invalidate_removes_both_tiers(self):
+        self.cache.get("regions", self.fetch, 60)
+        self.cache.invalidate("regions")
+        self.assertEqual(os.listdir(self.directory.name), [])
+        self.cache.get("regions", self.fetch, 60)
+        self.assertEqual(self.calls, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -8,6 +8,7 @@ from datetime import datetime
 from chalicelib.utilities import Utilities
 from chalicelib.aws.gds_aws_client import GdsAwsClient
 from chalicelib.aws.gds_ec2_client import GdsEc2Client
+from chalicelib.exception_index import ResourceExceptionIndex
 from classes.kms_encrypter import KmsEncrypter
 
 
@@ -222,29 +223,28 @@ class AwsAudit:
     def load_exceptions(self):
         exceptions_json = self.utilities.read_file("config/exceptions.json")
         self.exceptions = self.utilities.from_json(exceptions_json)
+        self.exception_indexes = {}
 
-    def has_exception(self, check, resource):
-        now = datetime.now()
-        exceptions = self.exceptions
-        is_excepted = False
-        if exceptions is not None:
-            for entry in exceptions:
-                # does resource match
-                expires = self.utilities.parse_datetime(entry["date_expires"])
-                entry_persistent_id = (entry["resource_type"] + "::"
-                                       + entry["region"] + "::"
-                                       + str(entry["account"]) + "::"
-                                       + entry["resource_name"])
-
-                in_date = expires > now
+    def get_exception_index(self, check):
+        """
+        Build the exception index for this account and check once
+        and reuse it for every resource evaluated by the check
+        """
+        if check.title not in self.exception_indexes:
+            index = ResourceExceptionIndex()
+            for entry in self.exceptions or []:
                 is_this_account = self.audit["account"] == entry["account"]
                 is_this_check = entry["check"] == check.title
-                is_this_resource = entry_persistent_id == resource["resource_persistent_id"]
-                if (in_date
-                        and is_this_account
-                        and is_this_check
-                        and is_this_resource):
-                    # do something
-                    is_excepted = True
-
-        return is_excepted
+                if is_this_account and is_this_check:
+                    entry_persistent_id = (entry["resource_type"] + "::"
+                                           + entry["region"] + "::"
+                                           + str(entry["account"]) + "::"
+                                           + entry["resource_name"])
+                    expires = self.utilities.parse_datetime(entry["date_expires"])
+                    index.add(entry_persistent_id, entry, expires)
+            self.exception_indexes[check.title] = index
+        return self.exception_indexes[check.title]
+
+    def has_exception(self, check, resource):
+        index = self.get_exception_index(check)
+        return index.has_exception(resource["resource_persistent_id"])